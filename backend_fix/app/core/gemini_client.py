@@ -1,8 +1,18 @@
 # app/core/gemini_client.py
+import asyncio
 import logging
-from typing import Any, List
+import random
+import weakref
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 import google.generativeai as genai
+from google.api_core import exceptions as gexc
 from app.core.settings import settings
+from app.utils.cache import ResponseCache
+from app.utils.embedding_cache import QueryEmbeddingCache
 
 log = logging.getLogger("LearningBuddy.gemini_client")
 
@@ -20,6 +30,8 @@ else:
 
 EMBED_MODEL = settings.EMBED_MODEL
 CHAT_MODEL = settings.GEMINI_CHAT_MODEL
+# Passed to generate_content; part of the answer cache key
+GENERATION_CONFIG: Dict[str, Any] = {}
 
 def _extract_embedding(resp: Any) -> List[float]:
     # Many SDK return shapes; normalize to list[float]
@@ -40,55 +52,319 @@ def _extract_embedding(resp: Any) -> List[float]:
         pass
     raise RuntimeError("Unable to extract embedding vector from Gemini response.")
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    if not texts:
-        return []
-    # Try batch embed first
+# -----------------------------
+# BATCH EMBEDDING
+# batches run on a thread pool, throttled by a
+# token bucket and retried with exponential backoff
+# -----------------------------
+_RETRYABLE = (
+    gexc.ResourceExhausted,
+    gexc.TooManyRequests,
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.InternalServerError,
+    gexc.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+_EMBED_LIMITER = TokenBucket(
+    rate=settings.EMBED_REQUESTS_PER_MINUTE / 60.0,
+    capacity=max(settings.EMBED_WORKERS, 1),
+)
+
+# Throughput of the most recent embed_texts() run
+LAST_EMBED_STATS: Dict[str, float] = {}
+
+def _backoff_delay(attempt: int) -> float:
+    delay = min(settings.EMBED_BACKOFF_MAX, settings.EMBED_BACKOFF_BASE * (2 ** attempt))
+    return delay * (0.5 + random.random())  # jitter so workers don't retry in lockstep
+
+def _with_retry(fn: Callable[[], Any], what: str, max_retries: Optional[int] = None) -> Any:
+    retries = settings.EMBED_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except _RETRYABLE as e:
+            if attempt >= retries:
+                raise
+            delay = _backoff_delay(attempt)
+            log.warning("%s failed (%s); retry %d/%d in %.1fs", what, e, attempt + 1, retries, delay)
+            time.sleep(delay)
+
+def _embed_batch(batch: List[str], label: str) -> List[List[float]]:
+    def call(content):
+        def _once():
+            _EMBED_LIMITER.acquire()
+            return genai.embed_content(model=EMBED_MODEL, content=content)
+        return _with_retry(_once, label)
+
+    resp = call(batch)
     try:
-        resp = genai.embed_content(model=EMBED_MODEL, content=texts)
         emb = _extract_embedding(resp)
-        # If it's list-of-lists return as is
-        if isinstance(emb, list) and emb and isinstance(emb[0], (list, tuple)):
+        if isinstance(emb, list) and len(emb) == len(batch) and emb and isinstance(emb[0], (list, tuple)):
             return [list(v) for v in emb]
     except Exception as e:
-        log.debug("Batch embed attempt failed: %s", e)
+        log.debug("Batch embed response not usable: %s", e)
 
     # Fallback: per-item
     out = []
-    for t in texts:
+    for t in batch:
         try:
-            r = genai.embed_content(model=EMBED_MODEL, content=t)
-            out.append(_extract_embedding(r))
+            out.append(_extract_embedding(call(t)))
         except Exception as e:
             raise RuntimeError(f"embed_texts failed for item: {t[:80]}...: {e}")
     return out
 
+def embed_texts(
+    texts: List[str],
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    on_batch: Optional[Callable[[int, List[List[float]]], None]] = None,
+) -> List[List[float]]:
+    """
+    Embed texts in batches of `batch_size` on `workers` threads, throttled by
+    settings.EMBED_REQUESTS_PER_MINUTE. Transient errors are retried with
+    exponential backoff. `on_batch(start, vectors)` is called (from the calling
+    thread) as each batch finishes, so callers can checkpoint progress; when a
+    batch fails for good the remaining batches are cancelled and the error is
+    raised, leaving the finished batches already reported.
+    """
+    if not texts:
+        return []
+    batch_size = max(1, batch_size or settings.EMBED_BATCH_SIZE)
+    workers = max(1, workers or settings.EMBED_WORKERS)
+    starts = list(range(0, len(texts), batch_size))
+    results: List[Optional[List[List[float]]]] = [None] * len(starts)
+
+    started = time.perf_counter()
+    done_texts = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        futures = {
+            pool.submit(_embed_batch, texts[s:s + batch_size], f"embed batch {n + 1}/{len(starts)}"): n
+            for n, s in enumerate(starts)
+        }
+        try:
+            for fut in as_completed(futures):
+                n = futures[fut]
+                vectors = fut.result()
+                results[n] = vectors
+                done_texts += len(vectors)
+                if on_batch is not None:
+                    on_batch(starts[n], vectors)
+                elapsed = time.perf_counter() - started
+                log.info("Embedded %d/%d texts (%.1f texts/s)", done_texts, len(texts), done_texts / max(elapsed, 1e-9))
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+
+    elapsed = time.perf_counter() - started
+    LAST_EMBED_STATS.clear()
+    LAST_EMBED_STATS.update({
+        "texts": len(texts),
+        "batches": len(starts),
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(len(texts) / max(elapsed, 1e-9), 1),
+    })
+    log.info("embed_texts: %d texts in %d batches, %.1fs (%.1f texts/s)",
+             len(texts), len(starts), elapsed, LAST_EMBED_STATS["texts_per_second"])
+    return [v for batch in results for v in batch]
+
+# Answers of data-driven chat branches (see routers/chat.py)
+ANSWER_CACHE = ResponseCache(maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL)
+
+# Repeated questions skip the embed round-trip
+QUERY_CACHE = QueryEmbeddingCache(
+    maxsize=settings.QUERY_CACHE_SIZE,
+    db_path=Path(settings.EMB_DIR) / "query_cache.sqlite" if settings.QUERY_CACHE_DISK else None,
+)
+
 def embed_query(text: str) -> List[float]:
     if not text:
         return []
+    cached = QUERY_CACHE.get(text, EMBED_MODEL)
+    if cached is not None:
+        return cached
     try:
-        resp = genai.embed_content(model=EMBED_MODEL, content=text)
-        return _extract_embedding(resp)
+        # One quick retry only: this is on the request path
+        resp = _with_retry(lambda: genai.embed_content(model=EMBED_MODEL, content=text), "embed_query", max_retries=1)
+        vec = _extract_embedding(resp)
     except Exception as e:
         log.error("embed_query failed: %s", e)
         raise
+    QUERY_CACHE.put(text, EMBED_MODEL, vec)
+    return vec
+
+def _response_text(resp: Any) -> str:
+    # many SDK return object with .text
+    if hasattr(resp, "text"):
+        return resp.text
+    # dict-like fallbacks
+    if isinstance(resp, dict):
+        if "candidates" in resp and resp["candidates"]:
+            cand = resp["candidates"][0]
+            return cand.get("content") or cand.get("text") or str(cand)
+        if "output" in resp:
+            return str(resp["output"])
+    return str(resp)
 
 def generate_answer(prompt: str, max_tokens: int = 512) -> str:
     try:
         # Prefer the GenerativeModel API
         gen = genai.GenerativeModel(CHAT_MODEL)
-        resp = gen.generate_content(prompt)
-        # many SDK return object with .text
-        if hasattr(resp, "text"):
-            return resp.text
-        # dict-like fallbacks
-        if isinstance(resp, dict):
-            if "candidates" in resp and resp["candidates"]:
-                cand = resp["candidates"][0]
-                return cand.get("content") or cand.get("text") or str(cand)
-            if "output" in resp:
-                return str(resp["output"])
-        return str(resp)
+        resp = gen.generate_content(prompt, generation_config=GENERATION_CONFIG or None)
+        return _response_text(resp)
     except Exception as e:
         log.error("generate_answer failed: %s", e)
-        raise
\ No newline at end of file
+        raise
+
+# -----------------------------
+# ASYNC (request path)
+# awaitable variants for async endpoints; at most
+# GEMINI_MAX_CONCURRENCY calls are in flight per event loop
+# -----------------------------
+_ASYNC_LIMITS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _async_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _ASYNC_LIMITS.get(loop)
+    if sem is None:
+        sem = _ASYNC_LIMITS[loop] = asyncio.Semaphore(max(1, settings.GEMINI_MAX_CONCURRENCY))
+    return sem
+
+async def _with_retry_async(fn: Callable[[], Any], what: str, max_retries: Optional[int] = None) -> Any:
+    retries = settings.EMBED_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        try:
+            async with _async_limit():
+                return await fn()
+        except _RETRYABLE as e:
+            if attempt >= retries:
+                raise
+            delay = _backoff_delay(attempt)
+            log.warning("%s failed (%s); retry %d/%d in %.1fs", what, e, attempt + 1, retries, delay)
+            await asyncio.sleep(delay)
+
+async def embed_query_async(text: str) -> List[float]:
+    if not text:
+        return []
+    # Memory tier inline; the SQLite tier runs on a worker thread, off the event loop
+    cached = QUERY_CACHE.get_memory(text, EMBED_MODEL)
+    if cached is None:
+        cached = await asyncio.to_thread(QUERY_CACHE.get, text, EMBED_MODEL)
+    if cached is not None:
+        return cached
+    try:
+        resp = await _with_retry_async(
+            lambda: genai.embed_content_async(model=EMBED_MODEL, content=text), "embed_query", max_retries=1
+        )
+        vec = _extract_embedding(resp)
+    except Exception as e:
+        log.error("embed_query_async failed: %s", e)
+        raise
+    await asyncio.to_thread(QUERY_CACHE.put, text, EMBED_MODEL, vec)
+    return vec
+
+async def embed_queries_async(texts: List[str]) -> List[List[float]]:
+    """
+    Embed many questions: cached ones are reused, the rest (deduplicated) go
+    out in batched embed_content calls of EMBED_BATCH_SIZE texts each.
+    Returns one vector per text, in order ([] for empty texts).
+    """
+    out: List[Optional[List[float]]] = [QUERY_CACHE.get_memory(t, EMBED_MODEL) if t else [] for t in texts]
+    if any(v is None for v in out):
+        # Disk tier lookups on a worker thread, off the event loop
+        out = await asyncio.to_thread(
+            lambda: [QUERY_CACHE.get(t, EMBED_MODEL) if v is None else v for t, v in zip(texts, out)]
+        )
+    missing = list(dict.fromkeys(t for t, v in zip(texts, out) if v is None))
+    if not missing:
+        return out
+    size = max(1, settings.EMBED_BATCH_SIZE)
+    batches = [missing[s:s + size] for s in range(0, len(missing), size)]
+
+    async def embed(batch: List[str]) -> List[List[float]]:
+        resp = await _with_retry_async(
+            lambda: genai.embed_content_async(model=EMBED_MODEL, content=batch), "embed_queries", max_retries=1
+        )
+        vecs = _extract_embedding(resp)
+        if vecs and not isinstance(vecs[0], (list, tuple)):
+            vecs = [vecs]  # single text may come back as one flat vector
+        if len(vecs) != len(batch):
+            raise RuntimeError(f"embed_queries: got {len(vecs)} vectors for {len(batch)} texts")
+        return [list(v) for v in vecs]
+
+    try:
+        results = await asyncio.gather(*(embed(b) for b in batches))
+    except Exception as e:
+        log.error("embed_queries_async failed: %s", e)
+        raise
+    vec_by_text: Dict[str, List[float]] = {}
+    for batch, vecs in zip(batches, results):
+        vec_by_text.update(zip(batch, vecs))
+    await asyncio.to_thread(QUERY_CACHE.put_many, list(vec_by_text), EMBED_MODEL, list(vec_by_text.values()))
+    return [v if v is not None else vec_by_text[t] for t, v in zip(texts, out)]
+
+async def generate_answer_async(prompt: str, max_tokens: int = 512) -> str:
+    try:
+        gen = genai.GenerativeModel(CHAT_MODEL)
+        resp = await _with_retry_async(
+            lambda: gen.generate_content_async(prompt, generation_config=GENERATION_CONFIG or None),
+            "generate_answer",
+            max_retries=1,
+        )
+        return _response_text(resp)
+    except Exception as e:
+        log.error("generate_answer_async failed: %s", e)
+        raise
+
+async def stream_answer_async(prompt: str) -> AsyncIterator[str]:
+    """
+    Start a streaming completion and return an async iterator of text chunks.
+    Errors opening the stream are raised here, before any chunk is produced.
+    Reading the chunks holds a GEMINI_MAX_CONCURRENCY slot until the stream
+    ends or the iterator is closed (aclose(), e.g. on a client disconnect).
+    """
+    gen = genai.GenerativeModel(CHAT_MODEL)
+    resp = await _with_retry_async(
+        lambda: gen.generate_content_async(prompt, generation_config=GENERATION_CONFIG or None, stream=True),
+        "generate_answer_stream",
+        max_retries=1,
+    )
+
+    async def chunks():
+        # Released in the finally of `async with`, also when the reader stops early
+        async with _async_limit():
+            async for chunk in resp:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # chunk without text parts (e.g. only safety/finish info)
+                    continue
+                if text:
+                    yield text
+
+    return chunks()
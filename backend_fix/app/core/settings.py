@@ -7,6 +7,51 @@ class Settings(BaseSettings):
     GEMINI_CHAT_MODEL: str = "gemini-2.5-flash"   # Anda menyebut ingin gemini flash 2-5
     EMBED_MODEL: str = "models/text-embedding-004"
     EMB_DIR: str = "app/embeddings"
+    DATA_CHECK_INTERVAL: float = 5.0   # seconds between CSV mtime checks of the shared data store
+    # Batch embedding (KB builds)
+    EMBED_BATCH_SIZE: int = 100        # texts per embed_content call (API max is 100)
+    EMBED_WORKERS: int = 4             # concurrent embed requests
+    EMBED_REQUESTS_PER_MINUTE: float = 1200.0
+    EMBED_MAX_RETRIES: int = 5
+    EMBED_BACKOFF_BASE: float = 1.0    # seconds, doubled per retry
+    EMBED_BACKOFF_MAX: float = 30.0
+    EMBED_CHECKPOINT_BATCHES: int = 10 # flush the embedding cache every N finished batches
+    # Async Gemini calls (chat endpoints)
+    GEMINI_MAX_CONCURRENCY: int = 64   # in-flight calls per event loop; extra calls wait
+    # /chat/ask/batch
+    CHAT_BATCH_MAX_ITEMS: int = 100
+    CHAT_BATCH_CONCURRENCY: int = 8    # questions answered at the same time
+
+    # Query embedding cache (embed_query)
+    QUERY_CACHE_SIZE: int = 2048       # in-memory LRU entries; 0 disables the memory tier
+    QUERY_CACHE_DISK: bool = True      # also persist query vectors in EMB_DIR/query_cache.sqlite
+    # Chat answers for the progress/summary/skill branches
+    ANSWER_MODE: str = "llm"           # "llm" (Gemini) or "template" (local templates, no LLM call)
+    ANSWER_TEMPLATE_FALLBACK: bool = True  # use the template when Gemini fails in "llm" mode
+    # LLM answer cache (data-driven chat branches)
+    LLM_CACHE_SIZE: int = 1024         # cached answers; 0 disables
+    LLM_CACHE_TTL: float = 3600.0      # seconds an answer stays valid
+    # Course name resolution (StudentProgress has no course_id)
+    COURSE_MATCH_MIN_SCORE: float = 95.0  # fuzzy score (0..100) a non-exact name needs to join a course
+    # Course recommendations
+    RECOMMENDATIONS_PRECOMPUTED: bool = True  # serve data/recommendations.json while it is up to date
+    # KB retrieval
+    KB_BUILD_ON_STARTUP: bool = True   # load/build the KB in the background when the API starts
+    KB_BUILD_RETRY_INTERVAL: float = 300.0  # seconds before a failed background build may be retried
+    RETRIEVAL_INDEX: str = "exact"     # "exact" (brute force) or "ivf" (approximate, needs kb_ivf.npz)
+    IVF_NLIST: int = 0                 # IVF lists; 0 = about sqrt(n_docs)
+    IVF_NPROBE: int = 8                # lists scanned per query (higher = better recall, slower)
+    # RAG retrieval (chat fallback branch)
+    RETRIEVAL_MODE: str = "hybrid"     # "vector", "bm25" (local only) or "hybrid" (RRF of both)
+    BM25_MIN_COVERAGE: float = 0.75    # share of query terms a BM25-only hit must contain to be used
+    BM25_SKIP_EMBED_COVERAGE: float = 0.9  # hybrid: skip embed_query when the top BM25 hit covers this much
+    BM25_MIN_QUERY_TERMS: int = 2      # distinct query terms before BM25 coverage alone counts as relevant
+    # RAG context
+    RAG_CANDIDATES: int = 20           # nearest docs fetched before de-duplication
+    RAG_MIN_SCORE: float = 0.55        # cosine similarity a doc needs to be used as context
+    RAG_MMR_LAMBDA: float = 0.7        # 1.0 = pure relevance, lower = more diverse documents
+    RAG_DUP_THRESHOLD: float = 0.95    # docs this similar to an already chosen one are skipped
+    RAG_CONTEXT_TOKENS: int = 1500     # context budget (estimated at ~4 characters per token)
     LOG_LEVEL: str = "INFO"
 
     class Config:
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.settings import settings
@@ -7,11 +8,23 @@ from app.routers.dashboard import router as dashboard_router
 from app.routers.courses import router as courses_router
 from app.routers.recommend import router as recommend_router
 from app.routers.skill import router as skill_router
+from app.services.rag_service import start_kb_build
+from app.utils.data_loader import get_data_store
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse the CSVs once before serving so no request pays for it
+    get_data_store()
+    if settings.KB_BUILD_ON_STARTUP:
+        # Embeddings/BM25 load (or build) off the request path; see /chat/kb/status
+        start_kb_build()
+    yield
 
 app = FastAPI(
     title=settings.APP_NAME,
     version="1.0",
-    description="An AI-powered learning assistant."
+    description="An AI-powered learning assistant.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -1,26 +1,47 @@
 # app/routers/chat.py
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, AsyncIterator, Callable
+from functools import partial
 import numpy as np
+import asyncio
+import json
 import math
 import logging
+import time
 import traceback
 import pandas as pd
 
-from app.core.gemini_client import embed_query, generate_answer
+from app.core.settings import settings
+from app.core.gemini_client import (
+    embed_query_async,
+    embed_queries_async,
+    generate_answer_async,
+    stream_answer_async,
+    ANSWER_CACHE,
+    CHAT_MODEL,
+    GENERATION_CONFIG,
+    QUERY_CACHE,
+)
 from app.services.rag_service import (
     retrieve_similar,
-    get_kb,
-    init_kb,
-    search_progress_by_email,
-    get_course_info,
-    get_course_tutorials,
-    calculate_remaining_requirements,
+    retrieve_similar_batch,
+    get_lexical_kb,
+    hybrid_candidates,
+    kb_ready,
+    kb_status,
+    loaded_kb,
+    start_kb_build,
 )
 from app.services.smart_recommender import get_smart_recommendation
-from app.services.skill_analyzer import analyze_skill_weakness
-from app.services.skill_development_service import get_user_skills_development
+from app.services import answer_templates
+from app.services.intent_router import has_intent, route_intents
+from app.services.context_builder import build_context
+from app.services.user_context import UserContext
+from app.utils.bm25 import tokenize
 
 # Set up logging
 log = logging.getLogger("LearningBuddy.chat")
@@ -32,6 +53,9 @@ class AskReq(BaseModel):
     user_email: Optional[str] = None  # Primary identifier
     user_name: Optional[str] = None   # Deprecated, kept for backward compatibility
     interests: Optional[str] = None   # Comma-separated interests
+    answer_mode: Optional[str] = None # "llm" | "template"; default settings.ANSWER_MODE
+
+ANSWER_MODES = ("llm", "template")
 
 def sanitize_for_json(obj: Any) -> Any:
     """
@@ -49,150 +73,164 @@ def sanitize_for_json(obj: Any) -> Any:
         return None
     return obj
 
-def _clean_text(s: str) -> str:
-    return (s or "").strip().lower()
-
+# Keyword checks per intent; routing itself uses intent_router.route_intents
 def is_summary_question(q: str) -> bool:
     """
     Menangkap pertanyaan ringkasan belajar total.
     """
-    q = _clean_text(q)
-    keywords = [
-        "rangkum", "ringkasan", "summary",
-        "hasil belajar", "pencapaian", "report",
-        "laporan belajar", "apa saja yang sudah saya pelajari",
-        "kesimpulan belajar"
-    ]
-    return any(k in q for k in keywords)
+    return has_intent(q, "summary")
 
 def is_progress_question(q: str) -> bool:
-    q = _clean_text(q)
-    keywords = [
-        "progress", "progres", "perkembangan belajar",
-        "sampai dimana", "sampai di mana",
-        "berapa persen", "status belajar",
-        "kemajuan belajar", "sampai sejauh",
-        # variations for "current course"
-        "course saya", "kelas saya", "course yang saya ambil",
-        "kelas yang saya ambil", "sedang saya kerjakan",
-        "course yang saya kerjakan", "kelas yang saya kerjakan",
-        "course apa yang saya kerjakan", "course apa yang saya ambil",
-        "kelas apa yang saya ambil", "kelas apa yang saya kerjakan",
-    ]
-    return any(k in q for k in keywords)
+    return has_intent(q, "progress")
 
 def is_recommendation_question(q: str) -> bool:
-    q = _clean_text(q)
-    keywords = [
-        "rekomendasi", "rekomendasikan", "setelah ini belajar apa",
-        "apa yang harus saya pelajari", "next course", "lanjutan dari",
-        "course berikutnya", "roadmap belajar", "saran kursus",
-        "saran belajar", "apa yang harus dipelajari selanjutnya"
-    ]
-    return any(k in q for k in keywords)
+    return has_intent(q, "recommendation")
 
 def is_skill_weakness_question(q: str) -> bool:
     """
     Menangkap pertanyaan seputar skill, baik itu weakness (kelemahan)
     maupun strength (skill yang berkembang).
     """
-    q = _clean_text(q)
-    keywords = [
-        "skill", "kemampuan", "kelemahan", "weakness",
-        "apa yang kurang", "apa yang lemah",
-        "bagian mana yang kurang", "dimana yang kurang",
-        "apa yang harus diperbaiki", "apa yang perlu ditingkatkan",
-        "apa yang berkembang", "paling berkembang", "paling jago", 
-        "skill saya", "top skill", "kekuatan saya"
-    ]
-    return any(k in q for k in keywords)
+    return has_intent(q, "skill")
 
-@router.post("/ask")
-def ask(req: AskReq):
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters of the chat caches."""
+    return {"query_embedding": QUERY_CACHE.stats(), "llm_response": ANSWER_CACHE.stats()}
+
+@router.get("/kb/status")
+def kb_build_status():
+    """Readiness of the RAG knowledge base (built in the background)."""
+    return {**kb_status(), "retrieval_mode": settings.RETRIEVAL_MODE}
+
+class ChatPlan:
+    """
+    Satu kandidat jawaban /chat/ask: field response (`meta`) plus prompt untuk
+    LLM, atau `answer` yang sudah jadi. Kalau generate gagal, kandidat berikutnya
+    dicoba, kecuali `fatal` (error diteruskan sebagai HTTP 500).
+    Prompt yang `cacheable` (hanya dibangun dari data user) memakai ANSWER_CACHE,
+    dengan `data_version` dari UserContext yang dipakai membangunnya.
+    `template` merender jawaban yang sama tanpa LLM (answer_mode="template").
+    """
+
+    def __init__(self, meta: dict, prompt: Optional[str] = None, answer: Optional[str] = None,
+                 fatal: bool = False, error_detail: Optional[str] = None, cacheable: bool = False,
+                 template: Optional[Callable[[], str]] = None):
+        self.meta = meta
+        self.prompt = prompt
+        self.answer = answer
+        self.fatal = fatal
+        self.error_detail = error_detail
+        self.cacheable = cacheable
+        self.template = template
+        self.data_version: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        return self.meta.get("source", "?")
+
+    def response(self, answer: str, **extra) -> dict:
+        return sanitize_for_json({"answer": answer, **self.meta, **extra})
+
+    def template_meta(self) -> dict:
+        return {**self.meta, "answer_mode": "template"}
+
+    def cached_answer(self) -> Optional[str]:
+        if not self.cacheable or self.data_version is None:
+            return None
+        return ANSWER_CACHE.get(self.prompt, CHAT_MODEL, GENERATION_CONFIG,
+                                data_version=self.data_version, branch=self.source)
+
+    def remember(self, answer: str):
+        if self.cacheable and self.data_version is not None:
+            ANSWER_CACHE.put(self.prompt, CHAT_MODEL, answer, GENERATION_CONFIG, data_version=self.data_version)
+
+def _ask_question(req: AskReq) -> str:
     q = (req.question or "").strip()
     if not q:
         raise HTTPException(status_code=400, detail="question is required")
-
-    # Prioritize email over name
-    user_email = req.user_email or req.user_name
-    user_display_name = None
-    
-    log.info("Incoming ask: user_email=%s question=%s", user_email, q)
-
+    return q
+
+def _answer_mode(req: AskReq) -> str:
+    mode = (req.answer_mode or settings.ANSWER_MODE or "llm").strip().lower()
+    if mode not in ANSWER_MODES:
+        raise HTTPException(status_code=400, detail=f"answer_mode must be one of {', '.join(ANSWER_MODES)}")
+    return mode
+
+async def _recommendation_plans(req: AskReq, q: str, user: UserContext) -> AsyncIterator[ChatPlan]:
+    # --- 1) SMART RECOMMENDATION BRANCH ---
+    user_email = user.identifier
+    log.info("Matched branch: SMART RECOMMENDATION for user_email=%s", user_email)
     try:
-        # --- 1) SMART RECOMMENDATION BRANCH ---
-        if user_email and is_recommendation_question(q):
-            log.info("Matched branch: SMART RECOMMENDATION for user_email=%s", user_email)
-            try:
-                interests_list = (
-                    [i.strip() for i in req.interests.split(",") if i.strip()]
-                    if req.interests else []
-                )
-                recs = get_smart_recommendation(
-                    user_identifier=user_email,
-                    interests_override=interests_list,
-                    top_n=req.top_k or 5
-                )
-                
-                # Get user name for better UX
-                progress = search_progress_by_email(user_email)
-                user_display_name = progress.get("name") if progress else user_email
-                
-                # Format recommendations for LLM context
-                rec_text = "\n".join([
-                    f"- {r['course_name']} (level {r.get('course_level_str', '?')}, score {r.get('score', 0):.2f}) {r.get('reason','')}"
-                    for r in recs
-                ])
-                
-                prompt = f"""
+        interests_list = (
+            [i.strip() for i in req.interests.split(",") if i.strip()]
+            if req.interests else []
+        )
+        recs = await run_in_threadpool(
+            get_smart_recommendation,
+            user_identifier=user_email,
+            interests_override=interests_list,
+            top_n=req.top_k or 5,
+            user_rows=user.rows,
+        )
+
+        # Get user name for better UX
+        user_display_name = user.name if user.exists else user_email
+
+        # Format recommendations for LLM context
+        rec_text = "\n".join([
+            f"- {r['course_name']} (level {r.get('course_level_str', '?')}, score {r.get('score', 0):.2f}) {r.get('reason','')}"
+            for r in recs
+        ])
+
+        prompt = f"""
     Anda adalah Learning Buddy. Berikan penjelasan singkat (Bahasa Indonesia) atas rekomendasi berikut untuk {user_display_name}:
 
     {rec_text}
 
     Jelaskan alasan singkat tiap rekomendasi. Jika ada alasan spesifik (misal karena interest), sebutkan.
     """
-                ans = generate_answer(prompt)
-                return sanitize_for_json({
-                    "answer": ans,
-                    "source": "SmartRecommendation",
-                    "user": user_display_name,
-                    "user_email": user_email,
-                    "recommendations": recs
-                })
-            except Exception as e:
-                log.exception("Smart recommendation branch failed")
-                # Fallback to general RAG if rec fails
-                pass
+        yield ChatPlan({
+            "source": "SmartRecommendation",
+            "user": user_display_name,
+            "user_email": user_email,
+            "recommendations": recs
+        }, prompt=prompt, cacheable=True)
+    except Exception as e:
+        log.exception("Smart recommendation branch failed")
+        # Fallback to general RAG if rec fails
 
-        # --- 2) SUMMARY BRANCH (NEW) ---
-        if user_email and is_summary_question(q):
-            log.info("Matched branch: SUMMARY for user_email=%s", user_email)
-            try:
-                # Gather all data
-                progress = search_progress_by_email(user_email)
-                skills_data = get_user_skills_development(user_email)
-                
-                if not progress:
-                    ans = generate_answer(f"Tidak ada data progres untuk email {user_email}.")
-                    return sanitize_for_json({"answer": ans, "source": "Summary", "note": "No progress data"})
-
-                user_display_name = progress.get("name")
-                
-                # Progress Data
-                active_course = progress.get("course_name", "-")
-                is_graduated = str(progress.get("is_graduated")).strip() == "1"
-                status_course = "Selesai" if is_graduated else "Sedang Dipelajari"
-                
-                # Skill Data
-                most_developed = skills_data.get("most_developed")
-                most_developed_str = f"{most_developed['skill']} ({most_developed['proficiency_label']} - {most_developed.get('progress_percentage',0)}%)" if most_developed else "Belum terdeteksi"
-                
-                other_skills_list = skills_data.get("top_skills", [])[1:3]
-                other_skills_str = ", ".join([f"{s['skill']} ({s['proficiency_label']})" for s in other_skills_list])
-                if not other_skills_str:
-                    other_skills_str = "Belum terdeteksi"
-
-                prompt = f"""
+async def _summary_plans(req: AskReq, q: str, user: UserContext) -> AsyncIterator[ChatPlan]:
+    # --- 2) SUMMARY BRANCH (NEW) ---
+    user_email = user.identifier
+    log.info("Matched branch: SUMMARY for user_email=%s", user_email)
+    try:
+        # Gather all data
+        progress = user.progress
+        skills_data = await run_in_threadpool(lambda: user.skills)
+
+        if not progress:
+            yield ChatPlan({"source": "Summary", "note": "No progress data"},
+                           prompt=f"Tidak ada data progres untuk email {user_email}.", cacheable=True,
+                           template=partial(answer_templates.render_no_progress, user_email))
+        else:
+            user_display_name = progress.get("name")
+
+            # Progress Data
+            active_course = progress.get("course_name", "-")
+            is_graduated = str(progress.get("is_graduated")).strip() == "1"
+            status_course = "Selesai" if is_graduated else "Sedang Dipelajari"
+
+            # Skill Data
+            most_developed = skills_data.get("most_developed")
+            most_developed_str = f"{most_developed['skill']} ({most_developed['proficiency_label']} - {most_developed.get('progress_percentage',0)}%)" if most_developed else "Belum terdeteksi"
+
+            other_skills_list = skills_data.get("top_skills", [])[1:3]
+            other_skills_str = ", ".join([f"{s['skill']} ({s['proficiency_label']})" for s in other_skills_list])
+            if not other_skills_str:
+                other_skills_str = "Belum terdeteksi"
+
+            prompt = f"""
     Anda adalah Learning Buddy. Buat Rangkuman Hasil Belajar untuk user.
 
     DATA USER:
@@ -210,61 +248,62 @@ def ask(req: AskReq):
         - Skill Paling Berkembang: [Skill]
         - Skill Lainnya: [Skill A], [Skill B]"
     """
-                ans = generate_answer(prompt)
-                return sanitize_for_json({
-                    "answer": ans,
-                    "source": "Summary",
-                    "user": user_display_name,
-                    "data": {
-                        "progress": progress,
-                        "skills": skills_data
-                    }
-                })
-            except Exception as e:
-                log.exception("Summary branch failed")
-                pass
-
-        # --- 3) PROGRESS BRANCH ---
-        if user_email and is_progress_question(q):
-            log.info("Matched branch: PROGRESS for user_email=%s", user_email)
-            progress = search_progress_by_email(user_email)
-            
-            if not progress:
-                msg = (
-                    f"Halo kak, kami cek email '{user_email}' belum terdaftar di database kami. "
-                    "Silakan periksa kembali email yang digunakan."
-                )
-                return sanitize_for_json({"answer": msg, "source": "Generative", "note": "No progress data"})
-            
-            user_display_name = progress.get("name")
-            course_name = progress.get("course_name")
-            
-            try:
-                active = int(progress.get("active_tutorials") or 0)
-                completed = int(progress.get("completed_tutorials") or 0)
-                graduated = str(progress.get("is_graduated")).strip().lower() in ("1", "true", "yes")
-                
-                # Additional Course Info
-                course_info = get_course_info(course_name)
-                course_tutorials = get_course_tutorials(course_name)
-                requirements = calculate_remaining_requirements(progress, course_tutorials)
-                
-                percent = requirements.get("completion_percentage", 0)
-                remaining_tuts = requirements.get("remaining_tutorials", 0)
-                total_tuts = requirements.get("total_tutorials", 0)
-
-                # Construct prompt based on status
-                if graduated:
-                    prompt_text = f"Status: SUDAH LULUS.\nProgress: 100%."
-                else:
-                    prompt_text = (
-                        f"Status: BELUM LULUS.\n"
-                        f"Progress: {percent}%\n"
-                        f"Completed: {completed} / {total_tuts}\n"
-                        f"Sisa Tutorial: {remaining_tuts}\n"
-                    )
-
-                prompt = f"""
+            yield ChatPlan({
+                "source": "Summary",
+                "user": user_display_name,
+                "data": {
+                    "progress": progress,
+                    "skills": skills_data
+                }
+            }, prompt=prompt, cacheable=True, template=partial(
+                answer_templates.render_summary,
+                user_display_name, active_course, status_course, most_developed, other_skills_list,
+            ))
+    except Exception as e:
+        log.exception("Summary branch failed")
+
+async def _progress_plans(req: AskReq, q: str, user: UserContext) -> AsyncIterator[ChatPlan]:
+    # --- 3) PROGRESS BRANCH ---
+    user_email = user.identifier
+    log.info("Matched branch: PROGRESS for user_email=%s", user_email)
+    progress = user.progress
+
+    if not progress:
+        msg = (
+            f"Halo kak, kami cek email '{user_email}' belum terdaftar di database kami. "
+            "Silakan periksa kembali email yang digunakan."
+        )
+        yield ChatPlan({"source": "Generative", "note": "No progress data"}, answer=msg)
+        return
+
+    user_display_name = progress.get("name")
+    course_name = progress.get("course_name")
+
+    try:
+        active = int(progress.get("active_tutorials") or 0)
+        completed = int(progress.get("completed_tutorials") or 0)
+        graduated = str(progress.get("is_graduated")).strip().lower() in ("1", "true", "yes")
+
+        # Additional Course Info
+        course_info = user.course_info
+        requirements = user.requirements
+
+        percent = requirements.get("completion_percentage", 0)
+        remaining_tuts = requirements.get("remaining_tutorials", 0)
+        total_tuts = requirements.get("total_tutorials", 0)
+
+        # Construct prompt based on status
+        if graduated:
+            prompt_text = f"Status: SUDAH LULUS.\nProgress: 100%."
+        else:
+            prompt_text = (
+                f"Status: BELUM LULUS.\n"
+                f"Progress: {percent}%\n"
+                f"Completed: {completed} / {total_tuts}\n"
+                f"Sisa Tutorial: {remaining_tuts}\n"
+            )
+
+        prompt = f"""
     Anda adalah Learning Buddy. Jawab singkat, jelas, tidak bertele-tele.
     Nama User: {user_display_name}
     Course Saat Ini: {course_name}
@@ -277,51 +316,54 @@ def ask(req: AskReq):
     2. Laporkan status progres mereka.
     3. Berikan semangat atau saran singkat.
     """
-                ans = generate_answer(prompt)
-                return sanitize_for_json({
-                    "answer": ans,
-                    "source": "UserProgress",
-                    "user": user_display_name,
-                    "user_email": user_email,
-                    "progress_percent": percent,
-                    "course_info": course_info if course_info else None,
-                    "remaining": requirements
-                })
+        yield ChatPlan({
+            "source": "UserProgress",
+            "user": user_display_name,
+            "user_email": user_email,
+            "progress_percent": percent,
+            "course_info": course_info if course_info else None,
+            "remaining": requirements
+        }, prompt=prompt, cacheable=True, template=partial(
+            answer_templates.render_progress,
+            user_display_name, course_name, graduated, percent, completed, total_tuts, remaining_tuts, course_info,
+        ))
 
-            except Exception as e:
-                log.exception("Progress branch failed")
-                # Fallback to RAG
-                pass
-
-        # --- 4) SKILL WEAKNESS/STRENGTH BRANCH ---
-        if user_email and is_skill_weakness_question(q):
-            log.info("Matched branch: SKILL ANALYSIS for user_email=%s", user_email)
-            progress = search_progress_by_email(user_email)
-            if not progress:
-                ans = generate_answer(f"Tidak ada data progres untuk email {user_email}.")
-                return sanitize_for_json({"answer": ans, "source": "SkillAnalysis", "note": "No progress data"})
+    except Exception as e:
+        log.exception("Progress branch failed")
+        # Fallback to RAG
+
+async def _skill_plans(req: AskReq, q: str, user: UserContext) -> AsyncIterator[ChatPlan]:
+    # --- 4) SKILL WEAKNESS/STRENGTH BRANCH ---
+    user_email = user.identifier
+    log.info("Matched branch: SKILL ANALYSIS for user_email=%s", user_email)
+    progress = user.progress
+    if not progress:
+        yield ChatPlan({"source": "SkillAnalysis", "note": "No progress data"},
+                       prompt=f"Tidak ada data progres untuk email {user_email}.", fatal=True, cacheable=True,
+                       template=partial(answer_templates.render_no_progress, user_email))
+        return
+
+    user_display_name = progress.get("name")
 
-            user_display_name = progress.get("name")
-            
-            try:
-                # 3a. Get Qualitative Analysis (Habits, Scores)
-                qualitative_result = analyze_skill_weakness(progress)
-                
-                # 3b. Get Quantitative Skill Data (Specific Tech Skills)
-                tech_skills_data = get_user_skills_development(user_email)
-                
-                # Extract top developed skill
-                most_developed_str = "Belum ada skill spesifik yang terdeteksi."
-                if tech_skills_data.get("most_developed"):
-                    md = tech_skills_data["most_developed"]
-                    most_developed_str = f"{md['skill']} ({md['proficiency_label']} - {md['proficiency']}%)"
-                
-                # Extract top 3 skills list
-                top_skills = tech_skills_data.get("top_skills", [])
-                top_skills_str = ", ".join([f"{s['skill']} ({s['proficiency_label']} - {s['proficiency']}%)" for s in top_skills[:3]])
-
-                # Combine into prompt
-                prompt = f"""
+    try:
+        # 3a. Get Qualitative Analysis (Habits, Scores)
+        qualitative_result = user.weakness
+
+        # 3b. Get Quantitative Skill Data (Specific Tech Skills)
+        tech_skills_data = await run_in_threadpool(lambda: user.skills)
+
+        # Extract top developed skill
+        most_developed_str = "Belum ada skill spesifik yang terdeteksi."
+        if tech_skills_data.get("most_developed"):
+            md = tech_skills_data["most_developed"]
+            most_developed_str = f"{md['skill']} ({md['proficiency_label']} - {md['proficiency']}%)"
+
+        # Extract top 3 skills list
+        top_skills = tech_skills_data.get("top_skills", [])
+        top_skills_str = ", ".join([f"{s['skill']} ({s['proficiency_label']} - {s['proficiency']}%)" for s in top_skills[:3]])
+
+        # Combine into prompt
+        prompt = f"""
     Anda adalah Learning Buddy. Jawab pertanyaan user tentang skill mereka dengan kombinasi data kuantitatif dan kualitatif.
 
     DATA USER:
@@ -346,88 +388,376 @@ def ask(req: AskReq):
     "Halo [Nama], Skill yang paling berkembang saat ini adalah **[Skill]** dengan level **[Level]** ([%]%).
     Berdasarkan analisis kami, pemahaman konsepmu sudah cukup baik, namun perlu tingkatkan konsistensi belajarmu."
     """
-                ans = generate_answer(prompt)
-                return sanitize_for_json({
-                    "answer": ans,
-                    "source": "SkillAnalysis",
-                    "user": user_display_name,
-                    "analysis_qualitative": qualitative_result,
-                    "skills_quantitative": tech_skills_data
-                })
-            except Exception as e:
-                log.exception("Skill analysis branch failed")
-                pass
+        yield ChatPlan({
+            "source": "SkillAnalysis",
+            "user": user_display_name,
+            "analysis_qualitative": qualitative_result,
+            "skills_quantitative": tech_skills_data
+        }, prompt=prompt, cacheable=True, template=partial(
+            answer_templates.render_skill, user_display_name, q, qualitative_result, tech_skills_data,
+        ))
+    except Exception as e:
+        log.exception("Skill analysis branch failed")
 
-        # --- 5) RAG / GENERAL FALLBACK ---
-        log.info("Falling back to RAG/Generative pipeline for question: %s", q)
-        
-        # 5a. Init KB if needed
-        try:
-            init_kb(force_rebuild=False)
-        except Exception as e:
-            log.warning("KB init warning: %s", e)
+class Retrieval:
+    """
+    Kandidat retrieval satu pertanyaan untuk branch RAG. Tahap lokal (BM25) ada
+    di run_lexical(); tahap vector (embed + search) dikerjakan oleh
+    _fallback_plans, atau sekaligus untuk banyak pertanyaan oleh /ask/batch.
+    Selama KB vector belum siap (dibangun di background) retrieval memakai
+    BM25 saja (`degraded`).
+    """
 
-        # 5b. Embed & Search
+    def __init__(self, q: str, top_k: int):
+        self.q = q
+        self.top_k = top_k
+        self.n_candidates = max(top_k, settings.RAG_CANDIDATES)
+        self.mode = (settings.RETRIEVAL_MODE or "hybrid").lower()
+        self.degraded = False
+        self.lexical: List = []
+        self.sims: List = []
+        self.emb: Optional[np.ndarray] = None
+        self.docs: List[str] = []
+        self.vector_done = False
+        self.query_terms = len(set(tokenize(q)))
+
+    def run_lexical(self) -> "Retrieval":
+        # 5a. Never load/embed the KB on the request path: kick the background build
+        if self.mode != "bm25" and not kb_ready():
+            start_kb_build()
+            self.degraded = True
+
+        # 5b. Local BM25 search first: no network, and enough on its own when it
+        # covers the whole question
+        if self.mode != "vector" or self.degraded:
+            try:
+                lexical_kb = get_lexical_kb(build=False)
+                if lexical_kb is not None:
+                    bm25, self.docs, self.emb = lexical_kb
+                    self.lexical = bm25.search(self.q, top_k=self.n_candidates)
+            except Exception:
+                log.exception("BM25 search failed")
+        return self
+
+    @property
+    def needs_vector(self) -> bool:
+        if self.mode == "bm25" or self.degraded or self.vector_done:
+            return False
+        confident = (
+            bool(self.lexical)
+            and self.lexical[0][2] >= settings.BM25_SKIP_EMBED_COVERAGE
+            and self.query_terms >= settings.BM25_MIN_QUERY_TERMS  # one generic term is too weak to skip the vector search
+        )
+        return not confident
+
+    def set_vector(self, sims: List):
+        kb = loaded_kb()
+        if kb is not None:
+            self.emb, self.docs = kb.emb, kb.docs
+            self.sims = sims
+        self.vector_done = True
+
+    def candidates(self):
+        """(candidates, min_score, retrieval label) for build_context."""
+        if self.mode == "vector" and not self.degraded:
+            return self.sims, settings.RAG_MIN_SCORE, "vector"
+        # Fused ranking; the relevance gates are applied inside hybrid_candidates
+        fused = hybrid_candidates(
+            self.sims, self.lexical, settings.RAG_MIN_SCORE, settings.BM25_MIN_COVERAGE,
+            query_terms=self.query_terms, min_query_terms=settings.BM25_MIN_QUERY_TERMS,
+        )
+        return fused, 0.0, ("hybrid" if self.sims else "bm25")
+
+async def _fallback_plans(req: AskReq, q: str, user: Optional[UserContext],
+                          retrieval: Optional[Retrieval] = None) -> AsyncIterator[ChatPlan]:
+    # --- 5) RAG / GENERAL FALLBACK ---
+    log.info("Falling back to RAG/Generative pipeline for question: %s", q)
+
+    top_k = req.top_k or 3
+    r = retrieval or await run_in_threadpool(Retrieval(q, top_k).run_lexical)
+
+    # 5c. Embed & vector search (a wider candidate pool, narrowed by the context builder)
+    if r.needs_vector:
         try:
-            q_vec = embed_query(q)
-            sims = retrieve_similar(q_vec, top_k=(req.top_k or 3))
+            q_vec = await embed_query_async(q)
+            # Exact/IVF search runs on the threadpool, off the event loop
+            sims = await run_in_threadpool(retrieve_similar, q_vec, top_k=r.n_candidates)
+            r.set_vector(sims)
         except Exception:
             log.exception("Embedding/Search failed")
-            sims = []
-
-        retrieved_text = ""
-        top_score = 0.0
-        if sims:
-            top_idx, top_score = sims[0]
-            _, docs = get_kb()
-            if top_idx < len(docs):
-                retrieved_text = docs[top_idx]
-
-        # Threshold check for RAG context usage
-        if top_score >= 0.55 and retrieved_text:
-            prompt = f"""
+
+    candidates, min_score, retrieval_kind = r.candidates()
+    context, used_docs = "", []
+    if candidates:
+        context, used_docs = build_context(
+            r.emb, r.docs, candidates,
+            max_docs=top_k,
+            budget_tokens=settings.RAG_CONTEXT_TOKENS,
+            min_score=min_score,
+            lambda_=settings.RAG_MMR_LAMBDA,
+            dup_threshold=settings.RAG_DUP_THRESHOLD,
+        )
+
+    # Only documents above RAG_MIN_SCORE / BM25_MIN_COVERAGE end up in the context
+    if context:
+        # score: cosine of the top document, or its BM25 coverage without a vector search
+        cosine = dict(r.sims)
+        coverage = {i: c for i, _, c in r.lexical}
+        top = used_docs[0]["doc_index"]
+        prompt = f"""
     You are Learning Buddy assistant. Use the following context to answer user accurately.
 
     CONTEXT:
-    {retrieved_text}
+    {context}
 
     QUESTION:
     {q}
 
     Answer concisely and in Indonesian.
     """
-            try:
-                ans = generate_answer(prompt)
-                return sanitize_for_json({
-                    "answer": ans,
-                    "source": "RAG",
-                    "score": top_score,
-                    "retrieved_doc": retrieved_text
-                })
-            except Exception:
-                log.exception("RAG generation failed")
-
-        # 5c. Pure Generative Fallback
-        try:
-            # If we have user info but RAG failed, inject brief context
-            context_inject = ""
-            if user_email:
-                # Try to get minimal user name context
-                p = search_progress_by_email(user_email)
-                if p:
-                    context_inject = f"User Name: {p.get('name')}\n"
-
-            prompt = f"""
+        yield ChatPlan({
+            "source": "RAG",
+            "retrieval": retrieval_kind,
+            "degraded": r.degraded,
+            "score": cosine.get(top, coverage.get(top)),
+            "retrieved_doc": used_docs[0]["text"],
+            "retrieved_docs": used_docs,
+        }, prompt=prompt)
+
+    # 5d. Pure Generative Fallback (LLM failures are handled through ChatPlan.fatal)
+    # If we have user info but RAG failed, inject brief context
+    context_inject = ""
+    if user is not None:
+        # Try to get minimal user name context
+        if user.exists:
+            context_inject = f"User Name: {user.name}\n"
+
+    prompt = f"""
     You are Learning Buddy. {context_inject}
     The user asked: "{q}"
     Answer as a helpful assistant in Indonesian.
     """
-            ans = generate_answer(prompt)
-            return sanitize_for_json({"answer": ans, "source": "Generative", "score": None})
+    yield ChatPlan({"source": "Generative", "score": None}, prompt=prompt,
+                   fatal=True, error_detail="LLM generation failed")
+
+_BRANCHES = {
+    "recommendation": _recommendation_plans,
+    "summary": _summary_plans,
+    "progress": _progress_plans,
+    "skill": _skill_plans,
+}
+
+# UserContext parts each branch reads, on top of rows/progress
+_BRANCH_PARTS = {
+    "recommendation": (),
+    "summary": ("skills",),
+    "progress": ("course_info", "requirements"),
+    "skill": ("weakness", "skills"),
+}
+
+async def _plan_answers(req: AskReq, q: str, retrieval: Optional[Retrieval] = None) -> AsyncIterator[ChatPlan]:
+    """
+    Kandidat jawaban: branch data user sesuai skor intent (lihat intent_router),
+    lalu RAG / generative. Data user dan retrieval dikerjakan di sini; generate
+    LLM dilakukan oleh endpoint (/ask, /ask/stream atau /ask/batch).
+    `retrieval` berisi hasil retrieval yang sudah dihitung (batch).
+    """
+    # Prioritize email over name
+    user_email = req.user_email or req.user_name
+
+    log.info("Incoming ask: user_email=%s question=%s", user_email, q)
+
+    # Shared by every branch of this request
+    user = UserContext(user_email) if user_email else None
+    if user is not None:
+        intents = route_intents(q)
+        if intents:
+            log.info("Intents: %s", intents)
+        # The store check (and a reload after a data change), user index and
+        # catalog builds can take a while: load what the branches read in one
+        # threadpool call instead of on the event loop
+        parts = ["data_version", "rows", "progress"] + [p for i, _ in intents for p in _BRANCH_PARTS[i]]
+        data_version = None  # no LLM answer cache without it
+        try:
+            data_version = (await run_in_threadpool(user.load, parts)).data_version
+        except Exception:
+            log.exception("Loading user data failed")  # each branch handles its own failure
+        for intent, _score in intents:
+            async for plan in _BRANCHES[intent](req, q, user):
+                plan.data_version = data_version
+                yield plan
+
+    async for plan in _fallback_plans(req, q, user, retrieval):
+        yield plan
+
+
+async def _answer(req: AskReq, q: str, mode: str, retrieval: Optional[Retrieval] = None) -> dict:
+    async for plan in _plan_answers(req, q, retrieval):
+        if plan.answer is not None:
+            return plan.response(plan.answer)
+        if mode == "template" and plan.template is not None:
+            return plan.response(plan.template(), answer_mode="template")
+        cached = plan.cached_answer()
+        if cached is not None:
+            return plan.response(cached)
+        try:
+            ans = await generate_answer_async(plan.prompt)
         except Exception as e:
-            log.exception("Generative LLM failed")
-            raise HTTPException(status_code=500, detail="LLM generation failed")
-            
+            if plan.template is not None and settings.ANSWER_TEMPLATE_FALLBACK:
+                log.exception("%s generation failed; answering from template", plan.source)
+                return plan.response(plan.template(), answer_mode="template")
+            if plan.fatal:
+                log.exception("%s generation failed", plan.source)
+                raise HTTPException(status_code=500, detail=plan.error_detail or str(e))
+            log.exception("%s generation failed; trying next branch", plan.source)
+            continue
+        plan.remember(ans)
+        return plan.response(ans)
+
+@router.post("/ask")
+async def ask(req: AskReq):
+    q = _ask_question(req)
+    mode = _answer_mode(req)
+    try:
+        return await _answer(req, q, mode)
     except Exception as e:
         log.exception("Unhandled error in ask endpoint")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+class AskBatchReq(BaseModel):
+    items: List[AskReq]
+
+async def _vector_search_batch(retrievals: List[Retrieval]):
+    """Embed all questions in batched calls, then one matrix-matrix KB search."""
+    if not retrievals:
+        return
+    try:
+        vecs = await embed_queries_async([r.q for r in retrievals])
+        hits = await run_in_threadpool(
+            retrieve_similar_batch, np.asarray(vecs, dtype=np.float32), max(r.n_candidates for r in retrievals)
+        )
+    except Exception:
+        # Each question retries its own embedding in _fallback_plans
+        log.exception("Batch embedding/search failed")
+        return
+    for r, sims in zip(retrievals, hits):
+        r.set_vector(sims[:r.n_candidates])
+
+@router.post("/ask/batch")
+async def ask_batch(req: AskBatchReq):
+    """
+    Banyak pertanyaan /ask sekaligus. Pertanyaan yang langsung ke RAG di-embed
+    bersama (embed batch) dan dicari ke KB dengan satu perkalian matriks; generate
+    LLM berjalan paralel, maksimal settings.CHAT_BATCH_CONCURRENCY sekaligus.
+    Hasil urut sesuai items: {"status": 200, ...response /ask} atau
+    {"status": 4xx/5xx, "detail": "..."}.
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail="items is required")
+    if len(req.items) > settings.CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {settings.CHAT_BATCH_MAX_ITEMS} items per batch")
+    started = time.perf_counter()
+
+    prepared: List[Any] = []
+    for item in req.items:
+        try:
+            prepared.append((item, _ask_question(item), _answer_mode(item)))
+        except HTTPException as e:
+            prepared.append(e)
+
+    # Retrieval up front for questions without a user data branch; questions
+    # that fall through from a branch later still retrieve on their own
+    retrievals = {
+        i: Retrieval(p[1], p[0].top_k or 3)
+        for i, p in enumerate(prepared)
+        if not isinstance(p, HTTPException) and not ((p[0].user_email or p[0].user_name) and route_intents(p[1]))
+    }
+    if retrievals:
+        await run_in_threadpool(lambda: [r.run_lexical() for r in retrievals.values()])
+        await _vector_search_batch([r for r in retrievals.values() if r.needs_vector])
+
+    limit = asyncio.Semaphore(max(1, settings.CHAT_BATCH_CONCURRENCY))
+
+    async def answer_one(i: int, p: Any) -> dict:
+        if isinstance(p, HTTPException):
+            return {"status": p.status_code, "detail": p.detail}
+        item, q, mode = p
+        async with limit:
+            try:
+                return {"status": 200, **await _answer(item, q, mode, retrievals.get(i))}
+            except HTTPException as e:
+                return {"status": e.status_code, "detail": e.detail}
+            except Exception as e:
+                log.exception("Unhandled error in ask batch item %d", i)
+                return {"status": 500, "detail": str(e)}
+
+    results = await asyncio.gather(*(answer_one(i, p) for i, p in enumerate(prepared)))
+    log.info("ask batch: %d items (%d retrieved up front) in %.2fs",
+             len(results), len(retrievals), time.perf_counter() - started)
+    return {"count": len(results), "results": results}
+
+def _sse(event: str, data: Any) -> str:
+    payload = json.dumps(jsonable_encoder(sanitize_for_json(data)), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+@router.post("/ask/stream")
+async def ask_stream(req: AskReq):
+    """
+    Server-sent events version of /ask:
+      event: meta   -> field response selain "answer" (source, recommendations, retrieved_doc, score, ...)
+      event: token  -> {"text": "..."} potongan jawaban, berurutan
+      event: done   -> {}
+      event: error  -> {"detail": "..."} jika gagal
+    """
+    q = _ask_question(req)
+    mode = _answer_mode(req)
+
+    async def events():
+        try:
+            async for plan in _plan_answers(req, q):
+                meta, ready = plan.meta, plan.answer
+                if ready is None and mode == "template" and plan.template is not None:
+                    meta, ready = plan.template_meta(), plan.template()
+                if ready is None:
+                    ready = plan.cached_answer()
+                if ready is not None:
+                    yield _sse("meta", meta)
+                    yield _sse("token", {"text": ready})
+                    yield _sse("done", {})
+                    return
+                try:
+                    # Opened before "meta" so a failing branch can still fall through
+                    chunks = await stream_answer_async(plan.prompt)
+                except Exception as e:
+                    if plan.template is not None and settings.ANSWER_TEMPLATE_FALLBACK:
+                        log.exception("%s generation failed; answering from template", plan.source)
+                        yield _sse("meta", plan.template_meta())
+                        yield _sse("token", {"text": plan.template()})
+                        yield _sse("done", {})
+                        return
+                    if plan.fatal:
+                        log.exception("%s generation failed", plan.source)
+                        yield _sse("error", {"detail": plan.error_detail or str(e)})
+                        return
+                    log.exception("%s generation failed; trying next branch", plan.source)
+                    continue
+                yield _sse("meta", plan.meta)
+                parts = []
+                try:
+                    async for text in chunks:
+                        parts.append(text)
+                        yield _sse("token", {"text": text})
+                finally:
+                    await chunks.aclose()  # frees its Gemini concurrency slot on a disconnect too
+                plan.remember("".join(parts))
+                yield _sse("done", {})
+                return
+        except Exception as e:
+            log.exception("Unhandled error in ask stream")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,29 +1,22 @@
 import pandas as pd
 from fastapi import APIRouter, HTTPException
 from typing import List, Dict, Any
-import os
 import ast
+from app.utils.data_loader import get_data_store
 
 router = APIRouter()
 
-# Global cache for data (CSV Fallback)
+# Frames come from the shared data store (loaded once per data version)
 COURSES_DATA = None
 LP_ANSWERS_DATA = None
 TUTORIALS_DATA = None
 
 def load_data():
     global COURSES_DATA, LP_ANSWERS_DATA, TUTORIALS_DATA
-    base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    data_dir = os.path.join(base_path, "data")
-    
-    if COURSES_DATA is None:
-        COURSES_DATA = pd.read_csv(os.path.join(data_dir, "Courses_clean.csv"))
-    
-    if LP_ANSWERS_DATA is None:
-        LP_ANSWERS_DATA = pd.read_csv(os.path.join(data_dir, "LearningPathAnswer_clean.csv"))
-        
-    if TUTORIALS_DATA is None:
-        TUTORIALS_DATA = pd.read_csv(os.path.join(data_dir, "Tutorials_clean.csv"))
+    store = get_data_store()
+    COURSES_DATA = store.get("courses")
+    LP_ANSWERS_DATA = store.get("learning_path_answers")
+    TUTORIALS_DATA = store.get("tutorials")
 
 @router.get("/{course_id}")
 def get_course_detail(course_id: int):
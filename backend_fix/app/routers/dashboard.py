@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
-from app.utils.data_loader import load_all_data
+from app.utils.data_loader import get_course_resolver, get_data_store, load_all_data
+from app.services.user_context import UserContext
 import pandas as pd
 import math
 
@@ -17,17 +18,29 @@ async def get_all_users():
     users = sp[['name', 'email']].drop_duplicates(subset=['email']).sort_values(by='name').to_dict('records')
     return users
 
+def _course_info(store) -> list:
+    """Dashboard details per Courses row (built once per data version)."""
+    course_info = []
+    for row in store.get("courses").to_dict(orient="records"):
+        try:
+            total_hours_val = int(row.get('hours_to_study')) if pd.notna(row.get('hours_to_study')) else 0
+        except Exception:
+            try:
+                total_hours_val = int(float(row.get('hours_to_study', 0)))
+            except Exception:
+                total_hours_val = 0
+
+        course_info.append({
+            "id": row.get('course_id'),
+            "level": str(row.get('course_level_str')),
+            "total_hours": total_hours_val
+        })
+    return course_info
+
 @router.get("/{user_email}")
 async def get_dashboard_data(user_email: str):
-    data = load_all_data()
-    
     # 1. Get User Info & Progress
-    sp = data.get("student_progress", pd.DataFrame())
-    courses_df = data.get("courses", pd.DataFrame())
-    
-    # Normalize email for comparison
-    user_email_clean = user_email.strip().lower()
-    user_progress = sp[sp['email'].astype(str).str.strip().str.lower() == user_email_clean]
+    user_progress = UserContext(user_email).rows
     
     if user_progress.empty:
         # Return default structure for new/unknown user
@@ -46,26 +59,10 @@ async def get_dashboard_data(user_email: str):
     score_count = 0
     completed_count = 0
     
-    # Create a lookup for course details by name
-    # Note: StudentProgress has course_name, Courses has course_name. 
-    # Ideally we match by ID, but SP doesn't have course_id.
-    # Build lookup by normalized course name (case-insensitive)
-    course_info_map = {}
-    for _, row in courses_df.iterrows():
-        name_key = str(row.get('course_name', '')).strip().lower()
-        try:
-            total_hours_val = int(row.get('hours_to_study')) if pd.notna(row.get('hours_to_study')) else 0
-        except Exception:
-            try:
-                total_hours_val = int(float(row.get('hours_to_study', 0)))
-            except Exception:
-                total_hours_val = 0
-
-        course_info_map[name_key] = {
-            "id": row.get('course_id'),
-            "level": str(row.get('course_level_str')),
-            "total_hours": total_hours_val
-        }
+    # StudentProgress has no course_id: progress course names are joined
+    # through the name resolution table (Courses row -> details)
+    resolver = get_course_resolver()
+    course_info = get_data_store().derived("dashboard_course_info", _course_info)
         
     level_map = {
         "1": "Dasar",
@@ -78,11 +75,11 @@ async def get_dashboard_data(user_email: str):
     for _, row in user_progress.iterrows():
         c_name_raw = row.get('course_name', '')
         c_name = str(c_name_raw)
-        c_key = c_name.strip().lower()
+        course_row = resolver.row(c_name)
 
-        # Try exact normalized match; if not found, provide fallback entry so UI still shows course
-        if c_key in course_info_map:
-            c_info = course_info_map[c_key]
+        # Resolved course; if not found, provide fallback entry so UI still shows course
+        if course_row is not None and course_row < len(course_info):
+            c_info = course_info[course_row]
         else:
             # Fallback: unknown id/level, zero hours — still include the course to avoid hiding user's progress
             c_info = {"id": None, "level": "0", "total_hours": 0}
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from app.utils.data_loader import load_all_data
+from app.utils.data_loader import get_course_resolver, load_all_data, resolve_user
 import pandas as pd
 from typing import List, Dict, Any
 
@@ -26,24 +26,24 @@ def get_user_roadmap(user_email: str) -> Dict[str, Any]:
     data = load_all_data()
     
     # Load DataFrames
-    students = data.get("student_progress", pd.DataFrame())
     courses = data.get("courses", pd.DataFrame())
     lps = data.get("learning_paths", pd.DataFrame())
     
     # Get User Progress
-    user_email_clean = user_email.strip().lower()
-    user_progress = students[students["email"].astype(str).str.strip().str.lower() == user_email_clean]
+    user_progress = resolve_user(user_email)
     
+    # Progress course names resolved to course_id (StudentProgress has none)
+    resolver = get_course_resolver()
     completed_courses = set()
     in_progress_courses = set()
     
-    for _, row in user_progress.iterrows():
-        c_name = row.get("course_name")
-        if c_name:
-            if str(row.get("is_graduated")) == "1":
-                completed_courses.add(c_name)
+    for c_name, graduated in zip(user_progress.get("course_name", []), user_progress.get("is_graduated", [None] * len(user_progress))):
+        c_id = resolver.course_id(c_name)
+        if c_id is not None:
+            if str(graduated) == "1":
+                completed_courses.add(c_id)
             else:
-                in_progress_courses.add(c_name)
+                in_progress_courses.add(c_id)
     
     all_lps = []
     
@@ -65,9 +65,11 @@ def get_user_roadmap(user_email: str) -> Dict[str, Any]:
             # If in progress -> Sedang Mempelajari
             # If not started but previous is completed -> Terbuka (implied logic, but for now simplify)
             
-            if c_name in completed_courses:
+            # Same course under several learning paths shares one resolved id
+            c_id = resolver.course_id(c_name)
+            if c_id in completed_courses:
                 status = "Lulus"
-            elif c_name in in_progress_courses:
+            elif c_id in in_progress_courses:
                 status = "Sedang Mempelajari"
             else:
                 # Check if it's the first course or previous is completed
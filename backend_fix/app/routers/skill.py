@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException
-from typing import Optional
+from typing import List, Optional
+from pydantic import BaseModel
 import logging
 import pandas as pd
-from app.utils.data_loader import load_all_data
+from app.utils.data_loader import get_user_index, load_all_data
 from app.services.skill_analyzer import analyze_skill_weakness
-from app.services.skill_development_service import get_user_skills_development
-from app.services.career_service import match_career
+from app.services.user_context import UserContext
+from app.services.career_service import match_career, match_careers_for_users
+from app.services.skill_development_service import cohort_skill_summary
 
 log = logging.getLogger("LearningBuddy.skill")
 
@@ -21,44 +23,14 @@ def analyze_skill(identifier: str):
             raise HTTPException(status_code=404, detail="No student progress data available")
 
         ident = str(identifier).strip()
-        user_email = None
-        
-        if '@' in ident:
-            # treat as email
-            user_email_clean = ident.lower()
-            user_rows = sp[sp['email'].astype(str).str.strip().str.lower() == user_email_clean]
-            user_email = ident
-        else:
-            # treat as name
-            name_clean = ident.lower()
-            user_rows = sp[sp['name'].astype(str).str.strip().str.lower() == name_clean]
-            # Try to get email from matched rows
-            if not user_rows.empty:
-                user_email = user_rows.iloc[0].get('email')
-
-        if user_rows.empty:
+        # Email or name, both resolved through the user index
+        user = UserContext(ident)
+        if not user.exists:
             raise HTTPException(status_code=404, detail=f"No progress found for {ident}")
+        user_email = user.email
 
         # Aggregate values across rows for the student
-        def to_numeric_series(series):
-            return pd.to_numeric(series, errors='coerce')
-
-        completed = int(to_numeric_series(user_rows['completed_tutorials']).sum(min_count=1) or 0)
-        active = int(to_numeric_series(user_rows['active_tutorials']).sum(min_count=1) or 0)
-
-        # Use mean for scores if multiple rows, ensure no NaN
-        submission_rating_val = to_numeric_series(user_rows['submission_rating']).dropna().mean()
-        submission_rating = float(submission_rating_val) if not pd.isna(submission_rating_val) else 0.0
-        
-        exam_score_val = to_numeric_series(user_rows['exam_score']).dropna().mean()
-        exam_score = float(exam_score_val) if not pd.isna(exam_score_val) else 0.0
-
-        progress = {
-            "completed_tutorials": int(completed),
-            "active_tutorials": int(active),
-            "submission_rating": float(submission_rating),
-            "exam_score": float(exam_score),
-        }
+        progress = user.aggregate_progress
 
         analysis = analyze_skill_weakness(progress)
         
@@ -66,7 +38,7 @@ def analyze_skill(identifier: str):
         skill_development = {}
         if user_email:
             try:
-                skill_development = get_user_skills_development(user_email)
+                skill_development = user.skills
             except Exception as e:
                 log.warning("Could not fetch skill development: %s", e)
 
@@ -83,32 +55,35 @@ def analyze_skill(identifier: str):
         log.exception("Skill analysis failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cohort")
+def get_cohort_skills():
+    """
+    Skill analytics over all students: learners, average proficiency and
+    learners per proficiency label for every skill.
+    """
+    try:
+        skills = cohort_skill_summary()
+        return {"skills": skills}
+    except Exception as e:
+        log.exception("Cohort skill analytics failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/career/{identifier}")
 def get_career_matches(identifier: str):
     """
     Get career profile matches based on user skills.
     """
     try:
-        # 1. Reuse logic to get skill development
-        # (Ideally refactor to avoid duplication, but for now we call the service directly)
-        
+        # 1. Reuse the skill development of the user context
         # Resolve email
-        data = load_all_data()
-        sp = data.get("student_progress", pd.DataFrame())
         ident = identifier.strip()
-        user_email = ident # Assume email mostly
-        
-        if '@' not in ident:
-             # try to find email from name
-             name_clean = ident.lower()
-             user_rows = sp[sp['name'].astype(str).str.strip().str.lower() == name_clean]
-             if not user_rows.empty:
-                 user_email = user_rows.iloc[0].get('email')
+        user = UserContext(ident)
+        user_email = user.email or ident  # Assume email mostly
         
         if not user_email:
              raise HTTPException(status_code=404, detail="User not found")
 
-        skill_data = get_user_skills_development(user_email)
+        skill_data = user.skills
         user_skills = skill_data.get("skills", [])
         
         matches = match_career(user_skills)
@@ -121,3 +96,45 @@ def get_career_matches(identifier: str):
     except Exception as e:
         log.exception("Career matching failed")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class CareerBulkReq(BaseModel):
+    users: Optional[List[str]] = None  # emails or names; None = every student
+
+
+@router.post("/career/bulk")
+def get_career_matches_bulk(req: CareerBulkReq):
+    """
+    Career matches for many users in one call (advisor dashboards), scored
+    together from the all-users skill matrix. Same matches as /career/{identifier}.
+    """
+    try:
+        index = get_user_index()
+        frame = index.frame
+        if req.users is None:
+            # Every student, by email in first-seen order
+            identifiers = [str(frame.iloc[positions[0]]["email"]) for positions in index.by_email.values()
+                           if pd.notna(frame.iloc[positions[0]]["email"])]
+        else:
+            identifiers = [str(u).strip() for u in req.users]
+
+        # Names resolve to the email of their first row, like UserContext.email
+        emails = []
+        for ident in identifiers:
+            positions = index.positions(ident)
+            if "@" in ident or not positions:
+                emails.append(ident)
+            else:
+                email = frame.iloc[positions[0]].get("email")
+                # Rows without an email keep the identifier (NaN is not valid JSON)
+                emails.append(str(email) if pd.notna(email) and str(email).strip() else ident)
+
+        matches = match_careers_for_users(emails)
+        return {
+            "count": len(emails),
+            "results": [{"user": e, "matches": m} for e, m in zip(emails, matches)]
+        }
+
+    except Exception as e:
+        log.exception("Bulk career matching failed")
+        raise HTTPException(status_code=500, detail=str(e))
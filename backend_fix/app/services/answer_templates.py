@@ -0,0 +1,119 @@
+# app/services/answer_templates.py
+"""
+Template jawaban (tanpa LLM) untuk branch PROGRESS, SUMMARY dan SKILL di /chat/ask.
+Semua fakta berasal dari data user; variasi kalimat dipilih acak supaya
+jawaban tidak terasa kaku. Dipakai saat answer_mode="template", atau sebagai
+cadangan kalau Gemini gagal.
+"""
+import random
+from typing import Dict, List, Optional
+
+_rng = random.Random()
+
+_GREETINGS = ["Halo {name}!", "Hai {name}!", "Halo kak {name},", "Hai kak {name},"]
+_CHEERS = [
+    "Tetap semangat, sedikit demi sedikit lama-lama jadi bukit!",
+    "Pertahankan ritme belajarnya ya!",
+    "Terus konsisten, kamu pasti bisa!",
+    "Semangat terus belajarnya!",
+]
+_GRADUATED_CHEERS = [
+    "Selamat, kerja kerasmu terbayar! Saatnya lanjut ke materi berikutnya.",
+    "Keren! Jangan berhenti di sini, lanjutkan ke course berikutnya ya.",
+    "Mantap! Ilmunya bisa langsung dipraktikkan di proyek nyata.",
+]
+_STRENGTH_WORDS = ("berkembang", "jago", "kekuatan", "top skill", "skill saya")
+
+
+def _pick(options: List[str], **fmt) -> str:
+    return _rng.choice(options).format(**fmt)
+
+
+def _greet(name: Optional[str]) -> str:
+    return _pick(_GREETINGS, name=name or "kak").replace("kak kak", "kak")
+
+
+def _skill_str(skill: Dict, key: str = "proficiency") -> str:
+    return f"{skill['skill']} ({skill['proficiency_label']} - {skill.get(key, 0)}%)"
+
+
+def render_no_progress(user_email: str) -> str:
+    return _pick([
+        "Maaf, data progres untuk email {email} belum tersedia.",
+        "Kami belum menemukan data progres untuk email {email}.",
+    ], email=user_email)
+
+
+def render_progress(
+    name: Optional[str],
+    course_name: Optional[str],
+    graduated: bool,
+    percent: float,
+    completed: int,
+    total_tutorials: int,
+    remaining_tutorials: int,
+    course_info: Optional[Dict] = None,
+) -> str:
+    lines = [_greet(name)]
+    course = course_name or "-"
+    if graduated:
+        lines.append(f"Kamu sudah **lulus** dari course **{course}** (progress 100%).")
+        lines.append(_pick(_GRADUATED_CHEERS))
+        return "\n".join(lines)
+
+    lines.append(f"Saat ini kamu sedang mengerjakan **{course}** dengan progress **{percent}%**.")
+    if total_tutorials:
+        lines.append(f"- Tutorial selesai: {completed} dari {total_tutorials}")
+        lines.append(f"- Sisa tutorial: {remaining_tutorials}")
+    info = course_info or {}
+    if info.get("course_difficulty"):
+        lines.append(f"- Tingkat kesulitan: {info['course_difficulty']}")
+    if info.get("technologies"):
+        lines.append(f"- Teknologi: {info['technologies']}")
+    lines.append(_pick(_CHEERS))
+    return "\n".join(lines)
+
+
+def render_summary(
+    name: Optional[str],
+    active_course: Optional[str],
+    status_course: str,
+    most_developed: Optional[Dict],
+    other_skills: List[Dict],
+) -> str:
+    other = ", ".join(f"{s['skill']} ({s['proficiency_label']})" for s in other_skills) or "Belum terdeteksi"
+    top = _skill_str(most_developed, "progress_percentage") if most_developed else "Belum terdeteksi"
+    return "\n".join([
+        f"{_greet(name).rstrip('!,')}, berikut rangkuman hasil belajarmu:",
+        f"- Kursus Aktif: {active_course or '-'} ({status_course})",
+        f"- Skill Paling Berkembang: {top}",
+        f"- Skill Lainnya: {other}",
+        _pick(_CHEERS),
+    ])
+
+
+def render_skill(name: Optional[str], question: str, qualitative: Dict, skills_data: Dict) -> str:
+    most_developed = skills_data.get("most_developed")
+    top_skills = skills_data.get("top_skills", [])[:3]
+    strength = (
+        f"Skill yang paling berkembang saat ini adalah **{_skill_str(most_developed)}**."
+        if most_developed else "Belum ada skill spesifik yang terdeteksi."
+    )
+    weakness = [f"Tingkat kelemahan: **{qualitative['weakness_level']}**."]
+    weakness += [f"- {f}" for f in qualitative.get("findings", [])]
+    if qualitative.get("suggestions"):
+        weakness.append("Saran perbaikan:")
+        weakness += [f"- {s}" for s in qualitative["suggestions"]]
+
+    lines = [_greet(name)]
+    if any(w in (question or "").lower() for w in _STRENGTH_WORDS):
+        # Pertanyaan soal skill yang berkembang: jawab itu dulu
+        lines.append(strength)
+        if len(top_skills) > 1:
+            lines.append("Top skill lainnya: " + ", ".join(_skill_str(s) for s in top_skills[1:]) + ".")
+        lines += weakness
+    else:
+        lines += weakness
+        lines.append(strength)
+    lines.append(_pick(_CHEERS))
+    return "\n".join(lines)
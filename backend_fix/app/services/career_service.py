@@ -1,5 +1,11 @@
 # app/services/career_service.py
-from typing import List, Dict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.skill_development_service import get_skill_matrix
+from app.utils.data_loader import normalize_key
 
 # Defined Career Profiles and their required skills (weighted)
 CAREER_PROFILES = [
@@ -53,6 +59,67 @@ CAREER_PROFILES = [
     }
 ]
 
+class CareerMatrix:
+    """
+    CAREER_PROFILES compiled into a skills x roles weight matrix (1 where a
+    role requires the skill; skills are lowercase). Scoring a users x skills
+    proficiency matrix against every role is then two matrix products.
+    """
+
+    def __init__(self, profiles: List[Dict]):
+        self.profiles = profiles
+        self.skills = list(dict.fromkeys(s.lower() for p in profiles for s in p["required_skills"]))
+        self.skill_index = {skill: i for i, skill in enumerate(self.skills)}
+        self.weights = np.zeros((len(self.skills), len(profiles)), dtype=np.float64)
+        for r, profile in enumerate(profiles):
+            for skill in profile["required_skills"]:
+                self.weights[self.skill_index[skill.lower()], r] = 1.0
+        self.required = np.array([len(p["required_skills"]) for p in profiles], dtype=np.float64)
+
+    def columns(self, skill_names: List[str]) -> sparse.csr_matrix:
+        """Selection matrix from the given skill columns to this matrix's skills (case-insensitive)."""
+        rows = [i for i, name in enumerate(skill_names) if str(name).lower() in self.skill_index]
+        cols = [self.skill_index[str(skill_names[i]).lower()] for i in rows]
+        return sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(skill_names), len(self.skills))
+        )
+
+    def scores(self, proficiency) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        proficiency: users x skills (this matrix's skills, dense or sparse).
+        Returns (skills matched, match score) as users x roles arrays.
+        Score = 60% coverage of the required skills + 40% mean proficiency of
+        the matched ones (skills at 0% do not count as matched).
+        """
+        proficiency = sparse.csr_matrix(proficiency, dtype=np.float64)
+        proficiency.data = np.maximum(proficiency.data, 0.0)
+        matched = np.asarray((proficiency > 0).astype(np.float64) @ self.weights)
+        total = np.asarray(proficiency @ self.weights)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coverage_pct = (matched / self.required) * 100
+            avg_proficiency = np.where(matched > 0, total / matched, 0.0)
+        return matched, (coverage_pct * 0.6) + (avg_proficiency * 0.4)
+
+    def matches(self, matched: np.ndarray, score: np.ndarray) -> List[Dict]:
+        """One user's row of scores() as the match_career result."""
+        out = []
+        for r in np.flatnonzero((matched > 0) & (score > 10)):  # Filter out very low matches
+            profile = self.profiles[r]
+            out.append({
+                "role": profile["role"],
+                "description": profile["description"],
+                "match_score": int(score[r]),
+                "skills_matched": int(matched[r]),
+                "total_skills_required": int(self.required[r])
+            })
+        # Sort by score
+        out.sort(key=lambda x: x["match_score"], reverse=True)
+        return out
+
+
+CAREER_MATRIX = CareerMatrix(CAREER_PROFILES)
+
+
 def match_career(user_skills: List[Dict]) -> List[Dict]:
     """
     Match user skills to career profiles.
@@ -63,53 +130,25 @@ def match_career(user_skills: List[Dict]) -> List[Dict]:
     Returns:
         List of careers with 'match_percentage' sorted descending.
     """
-    matches = []
-    
-    # Create a quick lookup for user proficiency
-    user_skill_map = {s["skill"].lower(): s["proficiency"] for s in user_skills}
-    
-    for profile in CAREER_PROFILES:
-        role = profile["role"]
-        required = profile["required_skills"]
-        
-        # Calculate Match Score
-        # Logic: Score = (Sum of proficiencies for matching skills / Total max proficiency for all required skills) * 100
-        # This is a bit unique. Let's try:
-        # Score = (Matches Found / Total Required) * 50 + (Average Proficiency of Matches) * 0.5
-        
-        matches_found = 0
-        total_proficiency_sum = 0
-        
-        for req_skill in required:
-            key = req_skill.lower()
-            if key in user_skill_map:
-                proficiency = user_skill_map[key]
-                if proficiency > 0:
-                    matches_found += 1
-                    total_proficiency_sum += proficiency
-        
-        if matches_found == 0:
-            continue
-            
-        # 1. Coverage Score (How many of the required skills do you have?)
-        coverage_pct = (matches_found / len(required)) * 100
-        
-        # 2. Proficiency Score (How good are you at the skills you have?)
-        avg_proficiency = total_proficiency_sum / matches_found if matches_found > 0 else 0
-        
-        # Weighted Final Score: 60% Coverage, 40% Proficiency
-        final_score = (coverage_pct * 0.6) + (avg_proficiency * 0.4)
-        
-        if final_score > 10: # Filter out very low matches
-            matches.append({
-                "role": role,
-                "description": profile["description"],
-                "match_score": int(final_score),
-                "skills_matched": matches_found,
-                "total_skills_required": len(required)
-            })
-            
-    # Sort by score
-    matches.sort(key=lambda x: x["match_score"], reverse=True)
-    
-    return matches
+    # 1 x skills proficiency row (later entries win, case-insensitive)
+    row = np.zeros((1, len(CAREER_MATRIX.skills)))
+    for s in user_skills:
+        i = CAREER_MATRIX.skill_index.get(s["skill"].lower())
+        if i is not None:
+            row[0, i] = s["proficiency"]
+    matched, score = CAREER_MATRIX.scores(row)
+    return CAREER_MATRIX.matches(matched[0], score[0])
+
+
+def match_careers_for_users(emails: List[str]) -> List[List[Dict]]:
+    """
+    match_career for many users (StudentProgress emails) at once, from the
+    all-users SkillMatrix; unknown emails get no matches.
+    """
+    matrix = get_skill_matrix()
+    users = [matrix.user_index.get(normalize_key(e)) for e in emails]
+    known = [u for u in users if u is not None]
+    proficiency = matrix.proficiency[known] @ CAREER_MATRIX.columns(matrix.skills)
+    matched, score = CAREER_MATRIX.scores(proficiency)
+    row_of = {u: i for i, u in enumerate(known)}
+    return [CAREER_MATRIX.matches(matched[row_of[u]], score[row_of[u]]) if u is not None else [] for u in users]
@@ -0,0 +1,114 @@
+# app/services/context_builder.py
+"""
+Context builder untuk prompt RAG.
+
+Dari kandidat hasil retrieval (idx, score):
+  1. buang kandidat di bawah min_score,
+  2. pilih dokumen dengan MMR (Maximal Marginal Relevance) supaya dokumen yang
+     hampir sama (mis. doc MAPPING/TUTORIAL yang mirip) tidak terpilih berulang;
+     tanpa embeddings (retrieval BM25 saja) cukup buang teks yang identik,
+  3. masukkan ke dalam budget token (estimasi ~4 karakter per token).
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4
+DOC_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def mmr_select(
+    emb: np.ndarray,
+    candidates: Sequence[Tuple[int, float]],
+    k: int,
+    lambda_: float = 0.7,
+    dup_threshold: float = 0.95,
+) -> List[Tuple[int, float]]:
+    """
+    Pilih maksimal k kandidat dengan MMR:
+        lambda * relevance - (1 - lambda) * max similarity ke dokumen terpilih.
+    Kandidat dengan similarity >= dup_threshold ke dokumen terpilih dianggap duplikat.
+    `emb` berisi vektor KB yang sudah L2-normalized (cosine == dot product).
+    """
+    if not candidates or k <= 0:
+        return []
+    ids = np.array([i for i, _ in candidates], dtype=np.int64)
+    rel = np.array([s for _, s in candidates], dtype=np.float32)
+    vecs = np.asarray(emb[ids], dtype=np.float32)
+    pair_sim = vecs @ vecs.T
+
+    selected: List[int] = []
+    max_sim = np.full(len(ids), -np.inf, dtype=np.float32)
+    available = np.ones(len(ids), dtype=bool)
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        mmr = lambda_ * rel - (1.0 - lambda_) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, pair_sim[best])
+        available &= max_sim < dup_threshold
+    return [(int(ids[j]), float(rel[j])) for j in selected]
+
+
+def pack_documents(
+    docs: Sequence[str],
+    picked: Sequence[Tuple[int, float]],
+    budget_tokens: int,
+) -> List[Dict]:
+    """
+    Masukkan dokumen terpilih (berurutan) selama total token masih dalam budget.
+    Dokumen pertama dipotong bila sendirian sudah melebihi budget.
+    """
+    packed: List[Dict] = []
+    used = 0
+    sep_tokens = estimate_tokens(DOC_SEPARATOR)
+    for idx, score in picked:
+        text = docs[idx]
+        cost = estimate_tokens(text) + (sep_tokens if packed else 0)
+        if used + cost > budget_tokens:
+            if packed:
+                continue  # a shorter later document may still fit
+            text = text[: budget_tokens * CHARS_PER_TOKEN]
+            cost = estimate_tokens(text)
+        packed.append({"doc_index": idx, "score": score, "text": text})
+        used += cost
+    return packed
+
+
+def dedupe_select(docs: Sequence[str], candidates: Sequence[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+    """Top-k kandidat tanpa teks yang identik (dipakai bila embeddings tidak tersedia)."""
+    seen, picked = set(), []
+    for idx, score in candidates:
+        if len(picked) >= k:
+            break
+        if docs[idx] not in seen:
+            seen.add(docs[idx])
+            picked.append((idx, score))
+    return picked
+
+
+def build_context(
+    emb: Optional[np.ndarray],
+    docs: Sequence[str],
+    candidates: Sequence[Tuple[int, float]],
+    max_docs: int,
+    budget_tokens: int,
+    min_score: float = 0.55,
+    lambda_: float = 0.7,
+    dup_threshold: float = 0.95,
+) -> Tuple[str, List[Dict]]:
+    """Return (context text, dokumen yang dipakai [{doc_index, score, text}])."""
+    relevant = [(i, s) for i, s in candidates if s >= min_score and 0 <= i < len(docs)]
+    if emb is None:
+        picked = dedupe_select(docs, relevant, max_docs)
+    else:
+        picked = mmr_select(emb, relevant, max_docs, lambda_=lambda_, dup_threshold=dup_threshold)
+    packed = pack_documents(docs, picked, budget_tokens)
+    return DOC_SEPARATOR.join(d["text"] for d in packed), packed
@@ -0,0 +1,140 @@
+# app/services/intent_router.py
+"""
+Intent router untuk /chat/ask.
+
+Semua keyword dikompilasi menjadi satu regex, jadi pertanyaan cukup di-scan
+sekali. Keyword yang berada di dalam match yang lebih panjang untuk intent yang
+sama tidak dihitung lagi ("skill saya" tidak dihitung juga sebagai "skill"),
+tapi tetap dihitung untuk intent lain yang memiliki keyword tersebut.
+Skor intent = jumlah kata dari keyword yang cocok, sehingga frasa spesifik
+lebih berbobot daripada kata umum. Skor yang sama diurutkan menurut
+INTENT_PRIORITY (urutan branch lama).
+"""
+import re
+from typing import Dict, List, Tuple
+
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "recommendation": [
+        "rekomendasi", "rekomendasikan", "setelah ini belajar apa",
+        "apa yang harus saya pelajari", "next course", "lanjutan dari",
+        "course berikutnya", "roadmap belajar", "saran kursus",
+        "saran belajar", "apa yang harus dipelajari selanjutnya",
+    ],
+    # Pertanyaan ringkasan belajar total
+    "summary": [
+        "rangkum", "ringkasan", "summary",
+        "hasil belajar", "pencapaian", "report",
+        "laporan belajar", "apa saja yang sudah saya pelajari",
+        "kesimpulan belajar",
+    ],
+    "progress": [
+        "progress", "progres", "perkembangan belajar",
+        "sampai dimana", "sampai di mana",
+        "berapa persen", "status belajar",
+        "kemajuan belajar", "sampai sejauh",
+        # variations for "current course"
+        "course saya", "kelas saya", "course yang saya ambil",
+        "kelas yang saya ambil", "sedang saya kerjakan",
+        "course yang saya kerjakan", "kelas yang saya kerjakan",
+        "course apa yang saya kerjakan", "course apa yang saya ambil",
+        "kelas apa yang saya ambil", "kelas apa yang saya kerjakan",
+    ],
+    # Weakness (kelemahan) maupun strength (skill yang berkembang)
+    "skill": [
+        "skill", "kemampuan", "kelemahan", "weakness",
+        "apa yang kurang", "apa yang lemah",
+        "bagian mana yang kurang", "dimana yang kurang",
+        "apa yang harus diperbaiki", "apa yang perlu ditingkatkan",
+        "apa yang berkembang", "paling berkembang", "paling jago",
+        "skill saya", "top skill", "kekuatan saya",
+    ],
+}
+
+# Tie-break order (and the order /chat/ask used to try branches in)
+INTENT_PRIORITY: Tuple[str, ...] = ("recommendation", "summary", "progress", "skill")
+
+
+def _trie_pattern(words) -> str:
+    """
+    Regex alternation factored as a character trie: each position costs one
+    branch per character instead of one attempt per keyword. Optional tails
+    are greedy, so the longest keyword starting at a position wins (its
+    keyword prefixes are credited via IntentRouter.outputs).
+    """
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class IntentRouter:
+    def __init__(self, keywords: Dict[str, List[str]], priority: Tuple[str, ...] = ()):
+        self.keywords = keywords
+        self.priority = tuple(priority) + tuple(i for i in keywords if i not in priority)
+        self.owners: Dict[str, List[str]] = {}
+        for intent, words in keywords.items():
+            for w in words:
+                owners = self.owners.setdefault(w.lower(), [])
+                if intent not in owners:
+                    owners.append(intent)
+        # The lookahead lets matches overlap ("kelas apa yang saya ambil" and "apa yang ...")
+        self.pattern = re.compile(f"(?=({_trie_pattern(self.owners)}))")
+        # The regex only reports the longest keyword at each position; every
+        # keyword that is a prefix of it matched there too (Aho-Corasick output
+        # links). Per keyword: (intent, its longest keyword prefix), one per intent.
+        self.outputs: Dict[str, List[Tuple[str, str]]] = {}
+        for kw in self.owners:
+            outputs: List[Tuple[str, str]] = []
+            for end in range(len(kw), 0, -1):
+                for intent in self.owners.get(kw[:end], []):
+                    if all(intent != i for i, _ in outputs):
+                        outputs.append((intent, kw[:end]))
+            self.outputs[kw] = outputs
+
+    def scores(self, q: str) -> Dict[str, float]:
+        """Skor per intent (hanya intent yang cocok)."""
+        scores: Dict[str, float] = {}
+        covered: Dict[str, int] = {}  # intent -> end of its furthest match so far
+        for m in self.pattern.finditer(_clean_text(q)):
+            for intent, kw in self.outputs[m.group(1)]:
+                kw_end = m.start() + len(kw)
+                # Inside a longer match of the same intent: already counted
+                if kw_end <= covered.get(intent, -1):
+                    continue
+                covered[intent] = kw_end
+                scores[intent] = scores.get(intent, 0.0) + len(kw.split())
+        return scores
+
+    def route(self, q: str) -> List[Tuple[str, float]]:
+        """Intent yang cocok, urut dari skor tertinggi (seri: urutan prioritas)."""
+        return sorted(self.scores(q).items(), key=lambda kv: (-kv[1], self.priority.index(kv[0])))
+
+
+def _clean_text(s: str) -> str:
+    return (s or "").strip().lower()
+
+
+ROUTER = IntentRouter(INTENT_KEYWORDS, INTENT_PRIORITY)
+
+
+def intent_scores(q: str) -> Dict[str, float]:
+    return ROUTER.scores(q)
+
+
+def route_intents(q: str) -> List[Tuple[str, float]]:
+    return ROUTER.route(q)
+
+
+def has_intent(q: str, intent: str) -> bool:
+    return intent in ROUTER.scores(q)
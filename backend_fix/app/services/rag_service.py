@@ -1,44 +1,145 @@
 # app/services/rag_service.py
+import threading
+import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Tuple, Dict, List as TypedList
-from app.utils.vectorstore import build_or_load_vectorstore
-from app.utils.data_loader import build_learningbuddy_kb, load_student_progress, load_all_data
+from typing import Any, List, NamedTuple, Optional, Tuple, Dict, List as TypedList
+from app.core.settings import settings
+from app.utils.vectorstore import build_or_load_vectorstore, load_vectorstore, load_search_index
+from app.utils.data_loader import build_learningbuddy_kb, get_course_catalog, get_data_store, resolve_user_record
+from app.utils.bm25 import BM25Index, reciprocal_rank_fusion
 import logging
 
 log = logging.getLogger("LearningBuddy.rag_service")
 
-# Lazy loaded KB
-_KB_EMB = None
-_KB_DOCS = None
+class LoadedKB(NamedTuple):
+    emb: np.ndarray
+    docs: List[str]
+    index: Any
+    bm25: BM25Index
+
+# Published in one assignment, so readers never see a half-swapped KB
+_KB: Optional[LoadedKB] = None
+_KB_LOCK = threading.Lock()  # single flight: one load/build at a time
 
 def init_kb(force_rebuild: bool = False):
-    global _KB_EMB, _KB_DOCS
-    if _KB_EMB is not None and _KB_DOCS is not None and not force_rebuild:
-        return _KB_EMB, _KB_DOCS
-    texts = build_learningbuddy_kb()
-    emb, docs = build_or_load_vectorstore(texts, force_rebuild=force_rebuild)
-    _KB_EMB = emb
-    _KB_DOCS = docs
-    log.info("KB initialized: %d docs, emb shape=%s", len(docs), emb.shape)
-    return _KB_EMB, _KB_DOCS
+    """
+    Load the vector KB (embedding it first when nothing matching is on disk).
+    Blocking; concurrent callers wait for the running build instead of
+    starting their own. Request handlers use start_kb_build() instead.
+    """
+    global _KB
+    kb = _KB
+    if kb is not None and not force_rebuild:
+        return kb.emb, kb.docs
+    with _KB_LOCK:
+        if _KB is not None and not force_rebuild:
+            return _KB.emb, _KB.docs
+        data_version = get_data_store().version
+        saved = None if force_rebuild else load_vectorstore(data_version=data_version)
+        if saved is not None:
+            # Embeddings on disk match the current data: no need to rebuild the KB texts
+            emb, docs = saved
+        else:
+            texts = build_learningbuddy_kb()
+            emb, docs = build_or_load_vectorstore(texts, force_rebuild=force_rebuild, data_version=data_version)
+        index = load_search_index(emb)
+        _KB = LoadedKB(emb, docs, index, BM25Index(docs))
+        log.info("KB initialized: %d docs, emb shape=%s, index=%s", len(docs), emb.shape, index.kind)
+        return emb, docs
 
 def get_kb():
-    if _KB_EMB is None or _KB_DOCS is None:
+    """(emb, docs); blocks on init_kb() when the KB is not loaded (offline scripts)."""
+    kb = _KB
+    if kb is None:
         return init_kb(False)
-    return _KB_EMB, _KB_DOCS
+    return kb.emb, kb.docs
+
+def kb_ready() -> bool:
+    return _KB is not None
+
+def loaded_kb() -> Optional[LoadedKB]:
+    """The loaded KB, never blocking: None (and the background build started) until it is ready."""
+    kb = _KB
+    if kb is None:
+        start_kb_build()
+    return kb
+
+# -----------------------------
+# BACKGROUND KB BUILD
+# chat never loads/embeds the KB itself: it starts this
+# job and retrieves with BM25 only until the KB is ready
+# -----------------------------
+_BUILD_LOCK = threading.Lock()
+_BUILD_THREAD: Optional[threading.Thread] = None
+_BUILD_STATUS: Dict[str, Any] = {"state": "idle", "started_at": None, "finished_at": None, "error": None}
+
+def start_kb_build() -> bool:
+    """
+    Start loading/building the KB on a background thread. Returns False when
+    a build is already running, the KB is loaded or the last build failed
+    less than settings.KB_BUILD_RETRY_INTERVAL seconds ago. Rebuilding the
+    embeddings is an offline job (generate_vectors.py).
+    """
+    global _BUILD_THREAD
+    with _BUILD_LOCK:
+        if _BUILD_THREAD is not None and _BUILD_THREAD.is_alive():
+            return False
+        if _KB is not None:
+            return False
+        failed_at = _BUILD_STATUS["finished_at"] if _BUILD_STATUS["state"] == "failed" else None
+        if failed_at is not None and time.time() - failed_at < settings.KB_BUILD_RETRY_INTERVAL:
+            return False
+        _BUILD_STATUS.update(state="building", started_at=time.time(), finished_at=None, error=None)
+        _BUILD_THREAD = threading.Thread(target=_run_kb_build, name="kb-build", daemon=True)
+        _BUILD_THREAD.start()
+        return True
+
+def _run_kb_build():
+    try:
+        get_lexical_kb()  # BM25 first: degraded retrieval is available within seconds
+        init_kb()
+        state, error = "ready", None
+    except Exception as e:
+        log.exception("Background KB build failed")
+        state, error = "failed", str(e)
+    with _BUILD_LOCK:
+        _BUILD_STATUS.update(state=state, finished_at=time.time(), error=error)
+
+def kb_status() -> Dict[str, Any]:
+    kb = _KB
+    with _BUILD_LOCK:
+        status = dict(_BUILD_STATUS)
+    if kb is not None and status["state"] == "idle":
+        status["state"] = "ready"  # loaded synchronously (init_kb)
+    lexical = _LEXICAL
+    status.update(
+        ready=kb is not None,
+        lexical_ready=kb is not None or (lexical is not None and lexical[0] == get_data_store().version),
+        docs=len(kb.docs) if kb is not None else None,
+        index=kb.index.kind if kb is not None else None,
+    )
+    if status["started_at"] and status["finished_at"]:
+        status["seconds"] = round(status["finished_at"] - status["started_at"], 2)
+    return status
 
 def retrieve_similar(query_vec: np.ndarray, top_k: int = 3) -> List[Tuple[int, float]]:
     """
     query_vec may be 1D or 2D (vector). Returns list of (idx, score) sorted desc.
+    KB rows are L2-normalized, so cosine similarity is one dot product; the
+    search itself goes through the index chosen by settings.RETRIEVAL_INDEX
+    (exact or IVF). Empty while the KB is not loaded yet.
     """
-    emb, docs = get_kb()
+    kb = loaded_kb()  # one snapshot: a rebuild may swap _KB meanwhile
+    if kb is None:
+        log.warning("KB not loaded yet; no vector results.")
+        return []
+    emb = kb.emb
     if emb is None or emb.size == 0:
         # Avoid crashing if KB empty
         log.warning("KB embeddings empty or not initialized.")
         return []
         
-    q = np.array(query_vec, dtype=float)
+    q = np.array(query_vec, dtype=np.float32)
     if q.ndim == 2:
         if q.shape[0] != 1:
             q = q[0]
@@ -49,75 +150,122 @@ def retrieve_similar(query_vec: np.ndarray, top_k: int = 3) -> List[Tuple[int, f
         # Fallback for safety
         q = q.flatten()
         
-    sims = cosine_similarity(q.reshape(1, -1), emb)[0]
-    idxs = sims.argsort()[-top_k:][::-1]
-    return [(int(i), float(sims[i])) for i in idxs]
+    norm = np.linalg.norm(q)
+    if norm == 0:
+        return []
+    idxs, scores = kb.index.search(q / norm, max(1, int(top_k)))
+    return [(int(i), float(s)) for i, s in zip(idxs, scores)]
 
-def search_progress_by_email(user_email: str):
-    """Cari progres belajar berdasarkan email (identifier unik)"""
-    records = load_student_progress()
-    if not records:
-        return None
+def retrieve_similar_batch(query_vecs: np.ndarray, top_k: int = 3) -> List[List[Tuple[int, float]]]:
+    """
+    retrieve_similar for many queries at once: query_vecs is (m, dim) and all
+    rows are scored against the KB with one matrix-matrix product (exact index).
+    Returns one [(idx, score), ...] list per row, in row order.
+    """
+    kb = loaded_kb()
+    q = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+    if kb is None:
+        log.warning("KB not loaded yet; no vector results.")
+        return [[] for _ in range(q.shape[0])]
+    emb = kb.emb
+    if emb is None or emb.size == 0 or q.shape[0] == 0:
+        log.warning("KB embeddings empty or not initialized.")
+        return [[] for _ in range(q.shape[0])]
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    valid = norms[:, 0] > 0
+    results: List[List[Tuple[int, float]]] = [[] for _ in range(q.shape[0])]
+    hits = kb.index.search_batch(q[valid] / norms[valid], max(1, int(top_k)))
+    for row, (idxs, scores) in zip(np.flatnonzero(valid), hits):
+        results[row] = [(int(i), float(s)) for i, s in zip(idxs, scores)]
+    return results
 
-    user_email = user_email.lower().strip()
+# BM25 over the current KB texts while the vector KB is not loaded: (data version, index, docs)
+_LEXICAL: Optional[Tuple[str, BM25Index, List[str]]] = None
 
-    for row in records:
-        if str(row.get("email", "")).lower().strip() == user_email:
-            return row
+def get_lexical_kb(build: bool = True) -> Optional[Tuple[BM25Index, List[str], Optional[np.ndarray]]]:
+    """
+    (BM25 index, docs, embeddings or None). Uses the loaded vector KB so doc
+    indexes line up with the embeddings; without it (embeddings missing or
+    Gemini down) the KB texts of the current data version are indexed and
+    embeddings are None. With build=False nothing is built on the caller's
+    thread: None is returned (and the background build started) instead.
+    """
+    global _LEXICAL
+    kb = _KB
+    if kb is not None:
+        return kb.bm25, kb.docs, kb.emb
+    version = get_data_store().version
+    lexical = _LEXICAL
+    if lexical is not None and lexical[0] == version:
+        return lexical[1], lexical[2], None
+    if not build:
+        start_kb_build()
+        return None
+    texts = build_learningbuddy_kb()
+    bm25 = BM25Index(texts)
+    _LEXICAL = (version, bm25, texts)
+    return bm25, texts, None
+
+def hybrid_candidates(
+    sims: List[Tuple[int, float]],
+    lexical: List[Tuple[int, float, float]],
+    min_score: float,
+    min_coverage: float,
+    query_terms: int,
+    min_query_terms: int = 2,
+) -> List[Tuple[int, float]]:
+    """
+    Fuse vector hits (idx, cosine) and BM25 hits (idx, score, coverage) with
+    reciprocal rank fusion. A doc is kept when its cosine >= min_score or its
+    BM25 coverage >= min_coverage. Scores are RRF scaled so the best is 1.0.
+    Coverage alone only counts for queries with at least min_query_terms
+    distinct terms: one word ("hai") fully covers any doc that contains it.
+    """
+    cosine = dict(sims)
+    coverage = {i: c for i, _, c in lexical} if query_terms >= min_query_terms else {}
+    fused = reciprocal_rank_fusion([[i for i, _ in sims], [i for i, _, _ in lexical]])
+    kept = [(i, s) for i, s in fused if cosine.get(i, -1.0) >= min_score or coverage.get(i, 0.0) >= min_coverage]
+    if not kept:
+        return []
+    best = kept[0][1]
+    return [(i, s / best) for i, s in kept]
 
-    return None
+def search_progress_by_email(user_email: str):
+    """Cari progres belajar berdasarkan email (identifier unik)"""
+    return resolve_user_record(user_email)
 
 def get_course_info(course_name: str) -> Dict[str, str]:
     """
-    Ambil informasi course dari learning_path_answers (via data_loader).
+    Ambil informasi course dari learning_path_answers (via course catalog).
     Mengembalikan dict: summary, description, course_difficulty, technologies, course_type.
     """
     if not course_name:
         return {}
 
-    data = load_all_data()
-    lpa = data.get("learning_path_answers")
-    if lpa is None or lpa.empty:
+    course = get_course_catalog().get(str(course_name))
+    if not course or not course["has_info"]:
         return {}
 
-    course_key = str(course_name).strip().lower()
-    lpa = lpa.copy()
-    lpa["name_normalized"] = lpa["name"].astype(str).str.strip().str.lower()
-    row = lpa[lpa["name_normalized"] == course_key]
-    if row.empty:
-        return {}
-
-    r = row.iloc[0].fillna("")
     return {
-        "summary": str(r.get("summary", "")).strip(),
-        "description": str(r.get("description", "")).strip(),
-        "course_difficulty": str(r.get("course_difficulty", "")).strip(),
-        "technologies": str(r.get("technologies", "")).strip(),
-        "course_type": str(r.get("course_type", "")).strip(),
+        "summary": course["summary"],
+        "description": course["description"],
+        "course_difficulty": course["course_difficulty"],
+        "technologies": course["technologies"],
+        "course_type": course["course_type"],
     }
 
 def get_course_tutorials(course_name: str) -> TypedList[str]:
     """
-    Ambil daftar tutorial untuk course tertentu dari LP_CourseMapping_clean.csv.
-    Return list judul tutorial.
+    Ambil daftar tutorial untuk course tertentu dari LP_CourseMapping_clean.csv
+    (via course catalog). Return list judul tutorial.
     """
     if not course_name:
         return []
 
-    data = load_all_data()
-    mapping = data.get("lp_course_map")
-    if mapping is None or mapping.empty:
-        return []
-
-    course_key = str(course_name).strip().lower()
-    mapping = mapping.copy()
-    mapping["course_name_normalized"] = mapping["course_name"].astype(str).str.strip().str.lower()
-    rows = mapping[mapping["course_name_normalized"] == course_key]
-    if rows.empty:
+    course = get_course_catalog().get(str(course_name))
+    if not course:
         return []
-
-    tutorials = rows["tutorial_title"].fillna("").astype(str).tolist()
-    return [t for t in tutorials if t.strip()]
+    return list(course["tutorials"])
 
 def calculate_remaining_requirements(progress: dict, course_tutorials: TypedList[str]) -> Dict[str, float]:
     """
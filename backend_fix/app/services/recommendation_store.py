@@ -0,0 +1,180 @@
+# app/services/recommendation_store.py
+"""
+Precomputed recommendations (see precompute_recommendations.py).
+
+The artifact (data/recommendations.json) holds the top-N smart recommendations
+(smart_recommender) and roadmap recommendations (roadmap_service) of every
+user, computed in one batch pass. Entries reference the Courses catalog by row
+and SkillKeywords by position, so it stays small:
+
+  courses   -> [[course_name, course_level_str, hours_to_study], ...] per Courses row
+  keywords  -> SkillKeywords referenced by "reason"
+  groups    -> per distinct set of StudentProgress rows:
+               {"smart": [entry, ...], "roadmap": [course row, ...]}
+               entry = [course row] or [course row, score, [keyword, ...]]
+  by_email / by_name -> normalized identifier -> group
+  default   -> group for users without progress
+
+It is only used while the inputs it was computed from (StudentProgress,
+Courses, SkillKeywords) are unchanged; otherwise callers compute on the fly.
+"""
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.settings import settings
+from app.utils import snapshot
+from app.utils.data_loader import (
+    CSV_FILES,
+    DATA_DIR,
+    SNAPSHOT_DIR,
+    DataStore,
+    get_data_store,
+    get_user_index,
+    normalize_key,
+)
+
+log = logging.getLogger("LearningBuddy.recommendation_store")
+
+RECOMMENDATIONS_FILE = DATA_DIR / "recommendations.json"
+RECOMMENDATIONS_FORMAT_VERSION = 1
+INPUT_TABLES = ("student_progress", "courses", "skill_keywords")
+RECORD_KEYS = ("course_name", "course_level_str", "hours_to_study")
+
+
+def inputs_fingerprint() -> str:
+    """Content hash of the tables the recommendations are computed from."""
+    manifest = snapshot.read_manifest(SNAPSHOT_DIR) or {}
+    parts = []
+    for key in INPUT_TABLES:
+        path = DATA_DIR / CSV_FILES[key]
+        if path.exists():
+            parts.append(snapshot.file_sha256(path))
+        else:
+            # Snapshot-only deploy: the hash the table was compiled from
+            parts.append(manifest.get("tables", {}).get(key, {}).get("source", {}).get("sha256", "missing"))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def user_groups(store: DataStore) -> Tuple[List[Tuple[int, ...]], Dict[str, int], Dict[str, int]]:
+    """
+    Distinct StudentProgress row sets an identifier can resolve to (see
+    UserIndex): (groups, by_email -> group, by_name -> group).
+    """
+    index = get_user_index()
+    groups: List[Tuple[int, ...]] = []
+    group_of: Dict[Tuple[int, ...], int] = {}
+    lookups: List[Dict[str, int]] = []
+    for positions_by_key in (index.by_email, index.by_name):
+        lookup = {}
+        for key, positions in positions_by_key.items():
+            rows = tuple(positions)
+            if rows not in group_of:
+                group_of[rows] = len(groups)
+                groups.append(rows)
+            lookup[key] = group_of[rows]
+        lookups.append(lookup)
+    return groups, lookups[0], lookups[1]
+
+
+def save_recommendations(artifact: Dict[str, Any], path: Optional[Path] = None) -> Path:
+    path = Path(path or RECOMMENDATIONS_FILE)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(path)  # readers never see a half-written file
+    return path
+
+
+class PrecomputedRecommendations:
+    def __init__(self, artifact: Dict[str, Any]):
+        self.top_n = int(artifact["top_n"])
+        self.courses = artifact["courses"]
+        self.keywords = artifact["keywords"]
+        self.groups = artifact["groups"]
+        self.by_email = artifact["by_email"]
+        self.by_name = artifact["by_name"]
+        self.default = artifact["default"]
+
+    def _group(self, identifier: Any) -> Dict[str, Any]:
+        # Same lookup order as UserIndex.positions
+        key = normalize_key(identifier or "")
+        lookups = (self.by_email, self.by_name) if "@" in key else (self.by_name, self.by_email)
+        for lookup in lookups:
+            if key in lookup:
+                return self.groups[lookup[key]]
+        return self.default
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        return dict(zip(RECORD_KEYS, self.courses[row]))
+
+    def smart(self, identifier: Any, top_n: int) -> Optional[List[Dict[str, Any]]]:
+        if top_n > self.top_n:
+            return None
+        out = []
+        for entry in self._group(identifier)["smart"][:top_n]:
+            record = self._record(entry[0])
+            if len(entry) > 1:
+                _, score, keywords = entry
+                reason = f"Matches interest: {', '.join(self.keywords[k] for k in keywords)}" if keywords else None
+                record.update(score=score, reason=reason)
+            out.append(record)
+        return out
+
+    def roadmap(self, identifier: Any, top_n: int) -> Optional[List[Dict[str, Any]]]:
+        if top_n > self.top_n:
+            return None
+        return [self._record(row) for row in self._group(identifier)["roadmap"][:top_n]]
+
+
+_LOADED: Dict[str, Any] = {"key": None, "value": None}
+
+
+def _load(path: Path) -> Optional[PrecomputedRecommendations]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+    except Exception as e:
+        log.warning("Unreadable recommendations artifact %s: %s", path, e)
+        return None
+    if artifact.get("format_version") != RECOMMENDATIONS_FORMAT_VERSION:
+        log.warning("Ignoring %s: format version %s", path, artifact.get("format_version"))
+        return None
+    if artifact.get("fingerprint") != inputs_fingerprint():
+        log.warning("Recommendations in %s are stale; re-run precompute_recommendations.py", path)
+        return None
+    log.info("Loaded precomputed recommendations: %d groups (created %s)",
+             len(artifact["groups"]), artifact.get("created_at"))
+    return PrecomputedRecommendations(artifact)
+
+
+def get_precomputed() -> Optional[PrecomputedRecommendations]:
+    """
+    The artifact, or None when disabled, missing or stale. Re-validated when the
+    data version or the file changes (a nightly job can replace it while the
+    API runs).
+    """
+    if not settings.RECOMMENDATIONS_PRECOMPUTED:
+        return None
+    try:
+        mtime = RECOMMENDATIONS_FILE.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = (get_data_store().version, mtime)
+    if _LOADED["key"] != key:
+        _LOADED.update(key=key, value=_load(RECOMMENDATIONS_FILE))
+    return _LOADED["value"]
+
+
+def new_artifact(top_n: int, courses: List[List[Any]], keywords: List[str]) -> Dict[str, Any]:
+    return {
+        "format_version": RECOMMENDATIONS_FORMAT_VERSION,
+        "fingerprint": inputs_fingerprint(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "top_n": top_n,
+        "courses": courses,
+        "keywords": keywords,
+    }
@@ -1,12 +1,19 @@
 # app/services/roadmap_service.py
 
+from typing import Dict, List, Tuple
+
 import pandas as pd
 from rapidfuzz import process, fuzz
-from app.utils.data_loader import load_all_data
+from app.services.recommendation_store import get_precomputed
+from app.utils.data_loader import DataStore, get_course_resolver, get_data_store, load_all_data, resolve_user
 import logging
 
 log = logging.getLogger("LearningBuddy.roadmap")
 
+# Roadmap only needs a nearby course to pick a level, so it accepts looser
+# matches than joins (settings.COURSE_MATCH_MIN_SCORE)
+ROADMAP_MATCH_MIN_SCORE = 70
+
 def fuzzy_match_course(user_course: str, course_list: list):
     """
     Fuzzy matching antara nama mata kuliah user dan course resmi.
@@ -35,7 +42,7 @@ def fuzzy_match_course(user_course: str, course_list: list):
     match, score, idx = result
 
     # Ambang batas skor similarity agar tidak asal match
-    if score < 70:  
+    if score < ROADMAP_MATCH_MIN_SCORE:
         return None
 
     return course_list[idx]
@@ -61,10 +68,32 @@ def recommend_courses_for_user(user_email: str, top_n: int = 3):
         log.warning("courses CSV missing column: course_name")
         return []
 
-    # Normalisasi email
-    user_email_clean = user_email.strip().lower()
-    students["email_clean"] = students["email"].astype(str).str.strip().str.lower()
+    precomputed = get_precomputed()
+    cached = precomputed.roadmap(user_email, top_n) if precomputed is not None else None
+    if cached is not None:
+        return cached
+
+    # Cleaned once per data version (shared, read-only)
+    courses = get_data_store().derived("roadmap_catalog", _roadmap_catalog_from_store)
+
+    # Ambil user row by email
+    user_row = resolve_user(user_email)
+
+    if user_row.empty:
+        # Jika user baru/tidak ada progress, sarankan level terendah (biasanya Level 1)
+        final = courses
+    else:
+        # Ambil last known course dari user
+        final = roadmap_after(courses, user_row.iloc[0].get("course_name", ""))
 
+    cols = ["course_name", "course_level_str", "hours_to_study"]
+    return final.head(top_n)[cols].to_dict(orient="records")
+
+
+def roadmap_catalog(courses: pd.DataFrame) -> pd.DataFrame:
+    """Courses unik yang punya level, urut level (index asli dipertahankan)."""
+    # Frames from the data store are shared; work on a copy
+    courses = courses.copy()
     courses["course_name_clean"] = (
         courses["course_name"].astype(str).str.strip().str.lower()
     )
@@ -80,35 +109,28 @@ def recommend_courses_for_user(user_email: str, top_n: int = 3):
     courses = courses.dropna(subset=["course_level_str"])
 
     # Sort by course level
-    courses = courses.sort_values("course_level_str").reset_index(drop=True)
+    return courses.sort_values("course_level_str")
 
-    # Ambil user row by email
-    user_row = students[students["email_clean"] == user_email_clean]
 
-    if user_row.empty:
-        # Jika user baru/tidak ada progress, sarankan level terendah (biasanya Level 1)
-        return courses.head(top_n)[
-            ["course_name", "course_level_str", "hours_to_study"]
-        ].to_dict(orient="records")
+def _roadmap_catalog_from_store(store: DataStore) -> pd.DataFrame:
+    return roadmap_catalog(store.get("courses"))
 
-    # Ambil last known course dari user
-    raw_course_name = str(user_row.iloc[0].get("course_name", "")).strip()
+
+def roadmap_after(courses: pd.DataFrame, user_course) -> pd.DataFrame:
+    """Course berikutnya (urut) setelah course user; courses dari roadmap_catalog."""
+    raw_course_name = str(user_course).strip()
 
     # Jika progress kosong
     if raw_course_name.lower() in ["", "nan", "-", "none"]:
-        return courses.head(top_n)[
-            ["course_name", "course_level_str", "hours_to_study"]
-        ].to_dict(orient="records")
+        return courses
 
     # Fuzzy match untuk mencocokkan course name user dengan database courses
-    official_names = courses["course_name"].astype(str).tolist()
-    matched_course = fuzzy_match_course(raw_course_name, official_names)
+    # (tabel resolusi, dihitung sekali per versi data)
+    matched_course = get_course_resolver().canonical_name(raw_course_name, min_score=ROADMAP_MATCH_MIN_SCORE)
 
     if matched_course is None:
         # Fallback jika tidak match: just recommend top beginner courses
-        return courses.head(top_n)[
-            ["course_name", "course_level_str", "hours_to_study"]
-        ].to_dict(orient="records")
+        return courses
 
     user_course_row = courses[courses["course_name"] == matched_course]
 
@@ -125,9 +147,28 @@ def recommend_courses_for_user(user_email: str, top_n: int = 3):
         # Jika sudah level max, rekomendasikan course lain di level yang sama atau semua sisa course
         candidates = courses[courses["course_name"] != matched_course]
 
-    final = candidates.head(top_n)
+    return candidates
 
-    cols = ["course_name", "course_level_str", "hours_to_study"]
-    final = final[cols]
 
-    return final.to_dict(orient="records")
\ No newline at end of file
+def precompute_roadmap_recommendations(store: DataStore, groups: List[Tuple[int, ...]], top_n: int):
+    """
+    recommend_courses_for_user for every user group: the roadmap only depends
+    on the course name of the group's first row, so each distinct name is
+    fuzzy-matched once. Returns (Courses rows per group, rows for unknown users).
+    """
+    students = store.get("student_progress")
+    source = store.get("courses")
+    courses = store.derived("roadmap_catalog", _roadmap_catalog_from_store)
+
+    def rows(frame: pd.DataFrame) -> List[int]:
+        return source.index.get_indexer(frame.head(top_n).index).tolist()
+
+    by_course: Dict[str, List[int]] = {}
+    out = []
+    for members in groups:
+        user_course = students.iloc[members[0]].get("course_name", "")
+        key = str(user_course).strip()
+        if key not in by_course:
+            by_course[key] = rows(roadmap_after(courses, key))
+        out.append(by_course[key])
+    return out, rows(courses)
@@ -1,7 +1,19 @@
 # app/services/skill_development_service.py
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-from typing import Dict, List
-from app.utils.data_loader import load_all_data
+from scipy import sparse
+from app.core.settings import settings
+from app.utils.data_loader import (
+    DataStore,
+    get_course_resolver,
+    get_data_store,
+    get_user_index,
+    normalize_key,
+    resolve_user,
+)
 import logging
 
 log = logging.getLogger("LearningBuddy.skill_development")
@@ -179,26 +191,171 @@ def get_skill_proficiency_label(percentage: int) -> str:
         return "Expert"
 
 
+_SKILL_MAP_KEYS = {normalize_key(name): name for name in COURSE_SKILL_MAP}
+
+
+def skill_map_names(rows: pd.DataFrame) -> List[Optional[str]]:
+    """
+    COURSE_SKILL_MAP key per StudentProgress row, None for unmapped courses.
+    A name that is not a key (after normalize_key) goes through the shared
+    course resolver first, so spelling/spacing variants still find their skills.
+    """
+    if "course_name" not in rows.columns:
+        return [None] * len(rows)
+    resolver = get_course_resolver()
+    mapped: Dict[str, Optional[str]] = {}
+    for name in rows["course_name"].astype(str).str.strip().unique().tolist():
+        key = _SKILL_MAP_KEYS.get(normalize_key(name))
+        if key is None:
+            canonical = resolver.canonical_name(name, min_score=settings.COURSE_MATCH_MIN_SCORE)
+            key = None if canonical is None else _SKILL_MAP_KEYS.get(normalize_key(canonical))
+        mapped[name] = key
+    return [mapped[name] for name in rows["course_name"].astype(str).str.strip().tolist()]
+
+
 def get_user_skills_development(user_email: str) -> Dict:
     """
     Analyze user's skill development based on courses taken.
     Returns dummy data mapped to actual course progress.
     """
-    data = load_all_data()
-    sp = data.get("student_progress", pd.DataFrame())
-    
-    if sp.empty:
-        return {
-            "user_email": user_email,
-            "skills": [],
-            "most_developed": None,
-            "top_skills": []
-        }
-    
-    # Get user's courses
-    user_email_clean = user_email.strip().lower()
-    user_rows = sp[sp['email'].astype(str).str.strip().str.lower() == user_email_clean]
-    
+    return skills_development_from_rows(user_email, resolve_user(user_email))
+
+
+def course_progress_percentage(rows: pd.DataFrame) -> np.ndarray:
+    """
+    Progress per StudentProgress row: completed / active tutorials in percent
+    (0..100, floored; missing or zero active counts as 1), 100 when graduated.
+    """
+    n = len(rows)
+
+    def numeric(col: str, default: float) -> np.ndarray:
+        if col not in rows.columns:
+            return np.full(n, default)
+        values = pd.to_numeric(rows[col], errors="coerce").to_numpy(dtype=np.float64)
+        return np.where(np.isnan(values), default, values)
+
+    active = numeric("active_tutorials", 1.0)
+    active = np.maximum(np.where(active == 0, 1.0, active), 1.0)
+    completed = np.maximum(numeric("completed_tutorials", 0.0), 0.0)
+    progress = np.minimum((completed / active * 100).astype(np.int64), 100)
+    if "is_graduated" in rows.columns:
+        progress[rows["is_graduated"].astype(str).to_numpy() == "1"] = 100
+    return progress
+
+
+class SkillMatrix:
+    """
+    Skill proficiency of the whole StudentProgress table, built once per data
+    version: a course x skill incidence matrix (COURSE_SKILL_MAP) times the
+    progress of every row gives, per user (email) and skill, the number of
+    courses teaching it and their summed progress. A skill's proficiency is
+    the mean progress of those courses, so it does not depend on row order.
+    """
+
+    def __init__(self, student_progress: pd.DataFrame, by_email: Dict[str, List[int]]):
+        self.course_names = list(COURSE_SKILL_MAP)
+        self.course_index = {name: i for i, name in enumerate(self.course_names)}
+        self.skills = list(dict.fromkeys(skill for skills in COURSE_SKILL_MAP.values() for skill in skills))
+        self.skill_index = {skill: i for i, skill in enumerate(self.skills)}
+        rows, cols = [], []
+        for c, skills in enumerate(COURSE_SKILL_MAP.values()):
+            for skill in dict.fromkeys(skills):
+                rows.append(c)
+                cols.append(self.skill_index[skill])
+        self.course_skills = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(self.course_names), len(self.skills))
+        )
+
+        # users x rows, then users x skills
+        self.emails = list(by_email)
+        self.user_index = {email: u for u, email in enumerate(self.emails)}
+        members = [(u, p) for u, email in enumerate(self.emails) for p in by_email[email]]
+        users = sparse.csr_matrix(
+            (np.ones(len(members), dtype=np.int32), ([u for u, _ in members], [p for _, p in members])),
+            shape=(len(self.emails), len(student_progress)),
+        )
+        row_skills, progress = self.row_skills(student_progress)
+        self.courses = (users @ row_skills).tocsr()                                # courses per skill
+        self.progress_sum = (users @ row_skills.multiply(progress[:, None])).tocsr()  # summed progress
+
+    @classmethod
+    def from_store(cls, store: DataStore) -> "SkillMatrix":
+        matrix = cls(store.get("student_progress"), get_user_index().by_email)
+        log.info("Skill matrix: %d users x %d skills", *matrix.courses.shape)
+        return matrix
+
+    def row_skills(self, rows: pd.DataFrame) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """(rows x skills incidence, progress per row); a row selection of course_skills."""
+        course = np.array([self.course_index.get(name, -1) for name in skill_map_names(rows)], dtype=np.int64)
+        mapped = np.flatnonzero(course >= 0)
+        pick = sparse.csr_matrix(
+            (np.ones(len(mapped), dtype=np.int32), (mapped, course[mapped])),
+            shape=(len(rows), len(self.course_names)),
+        )
+        return (pick @ self.course_skills).tocsr(), course_progress_percentage(rows)
+
+    @cached_property
+    def proficiency(self) -> sparse.csr_matrix:
+        """
+        users x skills proficiency (mean progress, floored). Only skills a user
+        has courses for are stored, learned skills at 0% as explicit zeros.
+        """
+        users, skills = self.courses.nonzero()
+        sums = np.asarray(self.progress_sum[users, skills]).ravel()
+        mean = np.floor(sums / np.asarray(self.courses[users, skills]).ravel())
+        return sparse.csr_matrix((mean, (users, skills)), shape=self.courses.shape)
+
+
+def _user_proficiency(matrix: SkillMatrix, user_email: str, user_rows: pd.DataFrame) -> Dict[str, int]:
+    """
+    Skill -> proficiency for a user: the user's row of SkillMatrix.proficiency.
+    Rows that are not one matrix user (no email, or a name shared by several
+    emails) use the same product over just those rows.
+    """
+    emails = user_rows["email"].tolist() if "email" in user_rows.columns else []
+    keys = [normalize_key(user_email)]
+    if len(set(emails)) == 1 and pd.notna(emails[0]):
+        keys.append(normalize_key(emails[0]))  # rows of a single email, identified by name
+    u = next((matrix.user_index[k] for k in keys if k in matrix.user_index), None)
+    if u is not None:
+        row = matrix.proficiency[u]
+        return {matrix.skills[s]: int(p) for s, p in zip(row.indices, row.data)}
+    row_skills, progress = matrix.row_skills(user_rows)
+    courses = np.asarray(row_skills.sum(axis=0)).ravel()
+    totals = row_skills.T @ progress
+    return {matrix.skills[s]: int(totals[s] // courses[s]) for s in np.flatnonzero(courses)}
+
+
+_LEVEL_BOUNDS = np.array(list(SKILL_PROFICIENCY_LEVELS)[1:])
+
+
+def get_skill_matrix() -> SkillMatrix:
+    return get_data_store().derived("skill_matrix", SkillMatrix.from_store)
+
+
+def cohort_skill_summary() -> List[Dict]:
+    """Per skill over all users: learners, mean proficiency and users per proficiency label."""
+    matrix = get_skill_matrix()
+    proficiency = matrix.proficiency.tocsc()  # column slices per skill
+    summary = []
+    for s, skill in enumerate(matrix.skills):
+        per_user = proficiency.data[proficiency.indptr[s]:proficiency.indptr[s + 1]]
+        if per_user.size == 0:
+            continue
+        # Same bands as get_skill_proficiency_label
+        labels = np.bincount(np.searchsorted(_LEVEL_BOUNDS, per_user, side="right"), minlength=len(_LEVEL_BOUNDS) + 1)
+        summary.append({
+            "skill": skill,
+            "learners": int(per_user.size),
+            "average_proficiency": round(float(per_user.mean()), 1),
+            "proficiency_labels": dict(zip(SKILL_PROFICIENCY_LEVELS.values(), labels.tolist())),
+        })
+    summary.sort(key=lambda x: (-x["learners"], -x["average_proficiency"]))
+    return summary
+
+
+def skills_development_from_rows(user_email: str, user_rows: pd.DataFrame) -> Dict:
+    """get_user_skills_development for StudentProgress rows that are already resolved."""
     if user_rows.empty:
         return {
             "user_email": user_email,
@@ -206,91 +363,42 @@ def get_user_skills_development(user_email: str) -> Dict:
             "most_developed": None,
             "top_skills": []
         }
-    
-    # Aggregate skill proficiency from courses
-    skill_proficiency = {}
-    course_count = 0
-    
-    for _, row in user_rows.iterrows():
-        course_name = str(row.get('course_name', '')).strip()
-        
-        # Get skills from course mapping
-        course_skills = COURSE_SKILL_MAP.get(course_name, [])
-        
-        # Calculate course progress percentage
-        try:
-            active = float(row.get('active_tutorials', 1)) or 1
-            completed = float(row.get('completed_tutorials', 0)) or 0
-            
-            # Check for NaN and replace with defaults
-            if pd.isna(active):
-                active = 1
-            if pd.isna(completed):
-                completed = 0
-            
-            active = max(float(active), 1)
-            completed = max(float(completed), 0)
-            
-            progress_pct = min(int((completed / active) * 100), 100) if active > 0 else 0
-        except Exception:
-            progress_pct = 0
-        
-        # If course completed/graduated, set to 100%
-        is_graduated = str(row.get('is_graduated')) == "1"
-        if is_graduated:
-            progress_pct = 100
-        
-        course_count += 1
-        
-        # Aggregate skills
-        for skill in course_skills:
-            if skill not in skill_proficiency:
-                skill_proficiency[skill] = {
-                    "proficiency": 0,
-                    "courses": [],
-                    "progress_percentage": 0
-                }
-            
-            # Average proficiency across courses (weighted)
-            current = skill_proficiency[skill]["proficiency"]
-            new_proficiency = int((float(current) + float(progress_pct)) / 2)
-            skill_proficiency[skill]["proficiency"] = new_proficiency
-            skill_proficiency[skill]["progress_percentage"] = progress_pct
-            skill_proficiency[skill]["courses"].append({
-                "course_name": course_name,
-                "progress": progress_pct,
+
+    proficiency_by_skill = _user_proficiency(get_skill_matrix(), user_email, user_rows)
+    progress = course_progress_percentage(user_rows)
+    graduated = (user_rows["is_graduated"].astype(str) == "1").tolist() if "is_graduated" in user_rows.columns \
+        else [False] * len(user_rows)
+    names = user_rows["course_name"].astype(str).str.strip().tolist() if "course_name" in user_rows.columns \
+        else [""] * len(user_rows)
+
+    # Skills in order of first appearance, each with its courses (row order)
+    skill_courses: Dict[str, List[Dict]] = {}
+    for name, mapped, pct, is_graduated in zip(names, skill_map_names(user_rows), progress.tolist(), graduated):
+        for skill in COURSE_SKILL_MAP.get(mapped, []):
+            skill_courses.setdefault(skill, []).append({
+                "course_name": name,
+                "progress": pct,
                 "status": "Lulus" if is_graduated else "Sedang Dipelajari"
             })
-    
-    # Convert to list and sort by proficiency
+
     skills_list = []
-    for skill, data in skill_proficiency.items():
-        try:
-            prof_val = data.get("proficiency", 0)
-            # Ensure it's an integer and handle NaN
-            if pd.isna(prof_val):
-                proficiency = 0
-            else:
-                proficiency = int(prof_val)
-            
-            skills_list.append({
-                "skill": skill,
-                "proficiency": proficiency,
-                "proficiency_label": get_skill_proficiency_label(proficiency),
-                "courses": data.get("courses", [])
-            })
-        except Exception as e:
-            log.warning("Error processing skill %s: %s", skill, e)
-            continue
-    
+    for skill, skill_course_list in skill_courses.items():
+        proficiency = proficiency_by_skill.get(skill, 0)
+        skills_list.append({
+            "skill": skill,
+            "proficiency": proficiency,
+            "proficiency_label": get_skill_proficiency_label(proficiency),
+            "courses": skill_course_list
+        })
+
     skills_list.sort(key=lambda x: x["proficiency"], reverse=True)
-    
+
     most_developed = skills_list[0] if skills_list else None
     top_skills = skills_list[:5]  # Top 5 skills
-    
+
     return {
         "user_email": user_email,
-        "total_courses": course_count,
+        "total_courses": len(user_rows),
         "skills": skills_list,
         "most_developed": most_developed,
         "top_skills": top_skills
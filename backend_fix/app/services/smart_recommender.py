@@ -1,21 +1,112 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
 import pandas as pd
-from app.utils.data_loader import load_all_data
+from scipy import sparse
+from app.services.recommendation_store import get_precomputed
+from app.utils.data_loader import CourseNameResolver, DataStore, get_course_resolver, get_data_store, normalize_key, resolve_user
 import logging
 
 log = logging.getLogger("LearningBuddy.smart_recommender")
 
 
-def get_smart_recommendation(user_identifier: str, top_n: int = 5, interests_override: list | None = None):
+class CourseKeywordMatrix:
+    """
+    Sparse course x keyword incidence matrix, built once per data version:
+    entry (c, k) is 1 when SkillKeywords entry k occurs in course name c
+    (lowercase substring, the rule the recommender has always used). Rows are
+    every distinct course name of Courses and StudentProgress, so deriving
+    interests from a history and scoring candidates are row selections and
+    sparse products instead of keyword x course loops.
+    """
+
+    def __init__(self, courses: pd.DataFrame, keywords: List[str], history_names: List[str]):
+        self.courses = courses
+        self.stripped_names = courses["course_name"].astype(str).str.strip()
+        self.keywords = list(dict.fromkeys(keywords))
+        self.keyword_index = {kw: i for i, kw in enumerate(self.keywords)}
+
+        names = list(dict.fromkeys(normalize_key(n) for n in list(self.stripped_names) + history_names))
+        self.name_index: Dict[str, int] = {n: i for i, n in enumerate(names)}
+        rows, cols = [], []
+        for r, name in enumerate(names):
+            for c, kw in enumerate(self.keywords):
+                if kw in name:
+                    rows.append(r)
+                    cols.append(c)
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(names), len(self.keywords))
+        )
+
+    @classmethod
+    def from_store(cls, store: DataStore) -> "CourseKeywordMatrix":
+        courses = store.get("courses").copy()
+        courses["course_level_str"] = pd.to_numeric(courses["course_level_str"], errors="coerce")
+        kw_df = store.get("skill_keywords")
+        keywords = []
+        if not kw_df.empty and "keyword" in kw_df.columns:
+            keywords = [str(k).strip().lower() for k in kw_df["keyword"].fillna("") if str(k).strip()]
+        sp = store.get("student_progress")
+        # astype(str) keeps missing names as "nan", like the per-user history below
+        history = sp["course_name"].astype(str).tolist() if "course_name" in sp.columns else []
+        index = cls(courses, keywords, history)
+        log.info("Course keyword matrix: %d courses x %d keywords, %d matches",
+                 index.matrix.shape[0], index.matrix.shape[1], index.matrix.nnz)
+        return index
+
+    def _rows(self, names: List[str]) -> sparse.csr_matrix:
+        """Incidence rows for course names; names outside the catalog are matched on the fly."""
+        keys = [normalize_key(n) for n in names]
+        known = [self.name_index.get(k) for k in keys]
+        if all(i is not None for i in known):
+            return self.matrix[known]
+        rows, cols = [], []
+        for r, (key, i) in enumerate(zip(keys, known)):
+            hits = self.matrix.indices[self.matrix.indptr[i]:self.matrix.indptr[i + 1]] if i is not None else \
+                [c for c, kw in enumerate(self.keywords) if kw in key]
+            rows += [r] * len(hits)
+            cols += list(hits)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(keys), len(self.keywords))
+        )
+
+    def keywords_in(self, names: List[str]) -> List[str]:
+        """Keywords occurring in any of the course names (SkillKeywords order)."""
+        if not names:
+            return []
+        present = np.flatnonzero(np.asarray(self._rows(names).sum(axis=0)).ravel())
+        return [self.keywords[c] for c in present]
+
+    def match(self, names: List[str], interests: List[str]) -> List[List[str]]:
+        """Per course name, the interests it contains (interests order)."""
+        if not names:
+            return []
+        known = [kw for kw in interests if kw in self.keyword_index]
+        extra = [kw for kw in interests if kw not in self.keyword_index]  # free-text overrides
+        picked = self._rows(names)[:, [self.keyword_index[kw] for kw in known]].tocsr()
+        out = []
+        for r, name in enumerate(names):
+            hits = set(picked.indices[picked.indptr[r]:picked.indptr[r + 1]].tolist())
+            key = normalize_key(name)
+            out.append([kw for i, kw in enumerate(known) if i in hits] + [kw for kw in extra if kw in key])
+        return out
+
+
+def get_smart_recommendation(
+    user_identifier: str,
+    top_n: int = 5,
+    interests_override: list | None = None,
+    user_rows: pd.DataFrame | None = None,
+):
     """Return smart course recommendations for a user.
 
-    The function accepts either a user name or an email address. If the
-    provided identifier looks like an email (contains '@'), it will match
-    against the `email` column in StudentProgress. Otherwise it matches by
-    `name` (case-insensitive).
+    The function accepts either a user name or an email address; both are
+    resolved (case-insensitive) through the shared StudentProgress user index.
+    Pass `user_rows` when the caller already resolved the user.
     """
-    data = load_all_data()
-    students = data.get("student_progress", pd.DataFrame())
-    courses = data.get("courses", pd.DataFrame())
+    store = get_data_store()
+    students = store.get("student_progress")
+    courses = store.get("courses")
 
     if students.empty or "name" not in students.columns:
         raise ValueError("StudentProgress CSV missing or malformed.")
@@ -23,25 +114,20 @@ def get_smart_recommendation(user_identifier: str, top_n: int = 5, interests_ove
     if courses.empty or "course_level_str" not in courses.columns:
         raise ValueError("Courses CSV missing required fields.")
 
-    # Normalize and create helper columns
     identifier = str(user_identifier or "").strip()
-    is_email = "@" in identifier and "." in identifier.split("@")[-1]
-
-    students["name_clean"] = students["name"].astype(str).str.strip().str.lower()
-    students["email_clean"] = students.get("email", "").astype(str).str.strip().str.lower()
+    if not interests_override:
+        # Nightly batch (precompute_recommendations.py), while its inputs are unchanged
+        precomputed = get_precomputed()
+        cached = precomputed.smart(identifier, top_n) if precomputed is not None else None
+        if cached is not None:
+            return cached
 
-    if is_email:
-        key = identifier.lower()
-        user_row = students[students["email_clean"] == key]
-        log.debug("Matching recommender by email: %s -> %d rows", key, len(user_row))
-    else:
-        key = identifier.lower()
-        user_row = students[students["name_clean"] == key]
-        log.debug("Matching recommender by name: %s -> %d rows", key, len(user_row))
+    user_row = resolve_user(identifier) if user_rows is None else user_rows
+    log.debug("Matching recommender: %s -> %d rows", identifier, len(user_row))
 
-    # Ensure courses have numeric level for sorting
-    courses = courses.copy()
-    courses["course_level_str"] = pd.to_numeric(courses["course_level_str"], errors="coerce")
+    index = store.derived("course_keyword_matrix", CourseKeywordMatrix.from_store)
+    # Courses with a numeric level for sorting (built once per data version)
+    courses = index.courses
 
     # No history -> beginner roadmap
     if user_row.empty:
@@ -52,72 +138,122 @@ def get_smart_recommendation(user_identifier: str, top_n: int = 5, interests_ove
     latest = user_row.iloc[-1]
     last_taken = str(latest.get("course_name", "")).strip()
 
-    # Try to find last course in catalog (compare stripped strings)
-    last_course_row = courses[courses["course_name"].astype(str).str.strip() == last_taken]
+    # Find last course in catalog (course name resolution table)
+    last_course_row = get_course_resolver().row(last_taken)
 
-    if last_course_row.empty:
+    if last_course_row is None:
         # If unmatched, fallback to entry courses
         return courses.sort_values("course_level_str").head(top_n)[["course_name", "course_level_str", "hours_to_study"]].to_dict(orient="records")
 
-    last_level = int(last_course_row.iloc[0]["course_level_str"])
+    last_level = int(courses.iloc[last_course_row]["course_level_str"])
 
     # Recommend 1–2 levels ahead
     candidates = courses[
         (courses["course_level_str"] > last_level) &
         (courses["course_level_str"] <= last_level + 2)
     ].sort_values("course_level_str")
+
     # If an interests override is provided, use it. Otherwise derive interests
-    data = load_all_data()
-    skill_kw_df = data.get("skill_keywords", pd.DataFrame())
-    keywords = []
-    if not skill_kw_df.empty and "keyword" in skill_kw_df.columns:
-        keywords = [str(k).strip().lower() for k in skill_kw_df["keyword"].fillna("") if str(k).strip()]
-
-    # Derive interests from student's course history (all rows for that student)
-    derived_interests = set()
+    # from the student's course history (all rows for that student): every
+    # SkillKeywords entry found in one of those course names
     if interests_override:
-        derived_interests = set([i.strip().lower() for i in interests_override if i and i.strip()])
+        interests = list(dict.fromkeys(i.strip().lower() for i in interests_override if i and i.strip()))
     else:
-        history_courses = [str(c).strip().lower() for c in user_row.get("course_name", []) if str(c).strip()]
-        for kw in keywords:
-            for cname in history_courses:
-                if kw in cname:
-                    derived_interests.add(kw)
-                    break
+        history = [str(c) for c in user_row.get("course_name", []) if str(c).strip()]
+        interests = index.keywords_in(history)
 
     # If no derived interests, fall back to returning candidates as before
-    if not derived_interests:
+    if not interests:
         return candidates.head(top_n)[["course_name", "course_level_str", "hours_to_study"]].to_dict(orient="records")
 
     # Score candidates by how many interest keywords they match
-    def score_candidate(row):
-        name = str(row.get("course_name", "")).lower()
-        matches = [kw for kw in derived_interests if kw in name]
-        return len(matches), matches
-
-    scored = []
-    for _, r in candidates.iterrows():
-        count, matches = score_candidate(r)
-        scored.append((count, matches, r))
+    matches = index.match(candidates["course_name"].tolist(), interests)
+    counts = [len(m) for m in matches]
 
-    # Sort by match count desc, then by level asc
-    scored_sorted = sorted(scored, key=lambda t: (-t[0], t[2].get("course_level_str", 0)))
+    # Sort by match count desc, then by level asc (stable, like the candidate order)
+    levels = candidates["course_level_str"].tolist()
+    order = sorted(range(len(candidates)), key=lambda i: (-counts[i], levels[i]))
 
+    records = candidates[["course_name", "course_level_str", "hours_to_study"]].to_dict(orient="records")
     results = []
-    for count, matches, row in scored_sorted:
+    for i in order:
         reason = None
         score = 0.0
-        if count > 0:
-            reason = f"Matches interest: {', '.join(matches)}"
+        if counts[i] > 0:
+            reason = f"Matches interest: {', '.join(matches[i])}"
             # simple score: proportion of matched keywords (capped to 1.0)
-            score = min(1.0, count / max(1, len(derived_interests)))
-        results.append({
-            "course_name": row.get("course_name"),
-            "course_level_str": row.get("course_level_str"),
-            "hours_to_study": row.get("hours_to_study"),
-            "score": score,
-            "reason": reason,
-        })
+            score = min(1.0, counts[i] / max(1, len(interests)))
+        results.append({**records[i], "score": score, "reason": reason})
 
     # Return top_n, prioritizing matched items; if not enough matched, next items will have score 0
     return results[:top_n]
+
+
+def precompute_smart_recommendations(store: DataStore, groups: List[Tuple[int, ...]], top_n: int):
+    """
+    get_smart_recommendation (without interests override) for every user group
+    in one pass: groups x history-names incidence times the course x keyword
+    matrix gives every group's interests, and interests times the catalog rows
+    gives the match counts of every course for every group.
+    Returns (entries per group, entries for unknown users, keywords); an entry
+    is [course row] or [course row, score, [keyword positions]] (see
+    recommendation_store).
+    """
+    index = store.derived("course_keyword_matrix", CourseKeywordMatrix.from_store)
+    courses = index.courses
+    levels = courses["course_level_str"].to_numpy()
+
+    def positions(frame: pd.DataFrame) -> List[int]:
+        return courses.index.get_indexer(frame.index).tolist()
+
+    entry_courses = [[c] for c in positions(courses.sort_values("course_level_str").head(top_n))]
+
+    # Candidate rows per last level, selected and sorted exactly like the per-request path
+    windows: Dict[int, List[int]] = {}
+
+    def window(last_level: int) -> List[int]:
+        if last_level not in windows:
+            windows[last_level] = positions(courses[
+                (courses["course_level_str"] > last_level) &
+                (courses["course_level_str"] <= last_level + 2)
+            ].sort_values("course_level_str"))
+        return windows[last_level]
+
+    resolver = store.derived("course_resolver", CourseNameResolver.from_store)
+    catalog = index.matrix[[index.name_index[normalize_key(n)] for n in index.stripped_names]]
+
+    names = store.get("student_progress")["course_name"].astype(str).tolist()
+    rows, cols = [], []
+    for g, members in enumerate(groups):
+        for p in members:
+            if names[p].strip():
+                rows.append(g)
+                cols.append(index.name_index[normalize_key(names[p])])
+    history = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                shape=(len(groups), index.matrix.shape[0]))
+    interests = ((history @ index.matrix) > 0).astype(np.int32).tocsr()  # groups x keywords
+    n_interests = np.asarray(interests.sum(axis=1)).ravel()
+    counts = (interests @ catalog.T).toarray()                          # groups x courses
+
+    out = []
+    for g, members in enumerate(groups):
+        last = resolver.row(names[members[-1]])
+        if last is None:
+            out.append(entry_courses)
+            continue
+        candidates = window(int(levels[last]))
+        if n_interests[g] == 0:
+            out.append([[c] for c in candidates[:top_n]])
+            continue
+        # Match count desc, then level asc (stable, like the candidate order)
+        ranked = sorted(candidates, key=lambda c: (-counts[g, c], levels[c]))[:top_n]
+        g_keywords = set(interests.indices[interests.indptr[g]:interests.indptr[g + 1]].tolist())
+        entries = []
+        for c in ranked:
+            if counts[g, c] > 0:
+                matched = sorted(g_keywords.intersection(catalog.indices[catalog.indptr[c]:catalog.indptr[c + 1]].tolist()))
+                entries.append([c, min(1.0, float(counts[g, c]) / max(1, int(n_interests[g]))), matched])
+            else:
+                entries.append([c, 0.0, []])
+        out.append(entries)
+    return out, entry_courses, index.keywords
@@ -0,0 +1,113 @@
+# app/services/user_context.py
+"""
+Data satu user untuk satu request.
+
+Setiap bagian (baris progres, info course, jumlah tutorial, skill, analisis
+kelemahan) dimuat saat pertama dipakai lalu disimpan di objek ini, jadi
+branch chat yang gagal dan lanjut ke branch berikutnya, atau router yang
+butuh beberapa bagian sekaligus, tidak me-resolve user yang sama dua kali.
+Jangan simpan UserContext lebih lama dari satu request: data bisa berubah.
+Kode async memanggil load() di threadpool supaya reload data / build index
+tidak berjalan di event loop.
+"""
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from app.services.rag_service import calculate_remaining_requirements, get_course_info, get_course_tutorials
+from app.services.skill_analyzer import analyze_skill_weakness
+from app.services.skill_development_service import skills_development_from_rows
+from app.utils.data_loader import get_data_store, resolve_user
+
+
+class UserContext:
+    def __init__(self, identifier: Optional[str]):
+        self.identifier = str(identifier or "").strip()
+
+    def load(self, parts: Iterable[str]) -> "UserContext":
+        """Muat beberapa bagian sekaligus (mis. dalam satu panggilan threadpool)."""
+        for part in dict.fromkeys(parts):
+            getattr(self, part)
+        return self
+
+    @cached_property
+    def data_version(self) -> str:
+        """Versi DataStore saat data user dimuat (kunci cache jawaban LLM)."""
+        return get_data_store().version
+
+    @cached_property
+    def rows(self) -> pd.DataFrame:
+        """Semua baris StudentProgress user (email atau nama)."""
+        return resolve_user(self.identifier)
+
+    @property
+    def exists(self) -> bool:
+        return not self.rows.empty
+
+    @cached_property
+    def progress(self) -> Optional[Dict[str, Any]]:
+        """Baris progres pertama sebagai dict (sama dengan search_progress_by_email)."""
+        if self.rows.empty:
+            return None
+        return self.rows.iloc[:1].to_dict(orient="records")[0]
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.progress.get("name") if self.progress else None
+
+    @cached_property
+    def email(self) -> Optional[str]:
+        if "@" in self.identifier:
+            return self.identifier
+        return self.progress.get("email") if self.progress else None
+
+    @cached_property
+    def email_rows(self) -> pd.DataFrame:
+        """Baris milik email user; beda dengan rows bila nama dipakai oleh beberapa email."""
+        if "@" in self.identifier or not self.email:
+            return self.rows
+        return resolve_user(self.email)
+
+    @property
+    def course_name(self) -> Optional[str]:
+        return self.progress.get("course_name") if self.progress else None
+
+    @cached_property
+    def course_info(self) -> Dict[str, str]:
+        return get_course_info(self.course_name)
+
+    @cached_property
+    def course_tutorials(self) -> List[str]:
+        return get_course_tutorials(self.course_name)
+
+    @cached_property
+    def requirements(self) -> Dict[str, float]:
+        return calculate_remaining_requirements(self.progress or {}, self.course_tutorials)
+
+    @cached_property
+    def skills(self) -> Dict:
+        """Skill development (lihat get_user_skills_development)."""
+        return skills_development_from_rows(self.email or self.identifier, self.email_rows)
+
+    @cached_property
+    def weakness(self) -> Dict:
+        """Analisis kelemahan dari baris progres pertama (dipakai chat)."""
+        return analyze_skill_weakness(self.progress or {})
+
+    @cached_property
+    def aggregate_progress(self) -> Dict[str, Any]:
+        """Tutorial dijumlah, nilai dirata-rata dari semua baris user (dipakai /skill/analyze)."""
+        def numeric(col: str) -> pd.Series:
+            if col not in self.rows.columns:
+                return pd.Series(dtype=float)
+            return pd.to_numeric(self.rows[col], errors="coerce")
+
+        submission_rating = numeric("submission_rating").dropna().mean()
+        exam_score = numeric("exam_score").dropna().mean()
+        return {
+            "completed_tutorials": int(numeric("completed_tutorials").sum(min_count=1) or 0),
+            "active_tutorials": int(numeric("active_tutorials").sum(min_count=1) or 0),
+            "submission_rating": float(submission_rating) if not pd.isna(submission_rating) else 0.0,
+            "exam_score": float(exam_score) if not pd.isna(exam_score) else 0.0,
+        }
@@ -0,0 +1,197 @@
+# app/utils/ann_index.py
+"""
+Search indexes over the L2-normalized KB matrix (cosine == dot product).
+
+  ExactIndex -> brute-force dot product + argpartition
+  IVFIndex   -> inverted file: spherical k-means centroids, each query only
+                scores the vectors of its `nprobe` closest lists
+
+Both expose search(query, top_k) -> (ids, scores), best first, and
+search_batch(queries, top_k) -> [(ids, scores), ...] for a (m, dim) matrix of
+queries. Which one retrieve_similar uses is chosen with settings.RETRIEVAL_INDEX.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("LearningBuddy.ann_index")
+
+IVF_FORMAT_VERSION = 1
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    top_k = min(top_k, scores.shape[-1])
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, top_k - 1)[:top_k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, emb: np.ndarray):
+        self.emb = emb
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.emb @ query
+        idx = _top_k(scores, top_k)
+        return idx, scores[idx]
+
+    def search_batch(self, queries: np.ndarray, top_k: int, chunk: int = 256) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """One matrix-matrix product per `chunk` queries (bounds the (chunk, n) score matrix)."""
+        out: List[Tuple[np.ndarray, np.ndarray]] = []
+        top_k = min(top_k, self.emb.shape[0])
+        for start in range(0, queries.shape[0], chunk):
+            scores = queries[start:start + chunk] @ self.emb.T
+            if top_k <= 0:
+                out += [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * scores.shape[0]
+                continue
+            idx = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            top = np.take_along_axis(scores, idx, axis=1)
+            order = np.argsort(-top, axis=1)
+            idx = np.take_along_axis(idx, order, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            out += list(zip(idx, top))
+        return out
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, emb: np.ndarray, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray, nprobe: int = 8):
+        self.emb = emb
+        self.centroids = centroids  # (nlist, dim), normalized
+        self.offsets = offsets      # (nlist + 1,), list i is ids[offsets[i]:offsets[i+1]]
+        self.ids = ids              # (n,), doc ids grouped by list
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    # -----------------------------
+    # build
+    # -----------------------------
+    @staticmethod
+    def _assign(emb: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        out = np.empty(emb.shape[0], dtype=np.int32)
+        for start in range(0, emb.shape[0], chunk):
+            out[start:start + chunk] = np.argmax(emb[start:start + chunk] @ centroids.T, axis=1)
+        return out
+
+    @classmethod
+    def build(
+        cls,
+        emb: np.ndarray,
+        nlist: Optional[int] = None,
+        iters: int = 20,
+        train_size: Optional[int] = None,
+        seed: int = 0,
+        nprobe: int = 8,
+    ) -> "IVFIndex":
+        """Spherical k-means on (a sample of) the rows, then bucket every row by nearest centroid."""
+        n = emb.shape[0]
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over an empty matrix.")
+        nlist = int(nlist or max(1, round(np.sqrt(n))))
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(seed)
+        train_size = train_size or min(n, 256 * nlist)
+        train = np.asarray(emb[rng.choice(n, size=min(train_size, n), replace=False)], dtype=np.float32)
+
+        started = time.perf_counter()
+        centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random training points
+                sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        assign = cls._assign(emb, centroids)
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        log.info("IVF index: %d vectors into %d lists in %.1fs", n, nlist, time.perf_counter() - started)
+        return cls(emb, centroids, offsets, ids, nprobe=nprobe)
+
+    # -----------------------------
+    # search
+    # -----------------------------
+    def search(self, query: np.ndarray, top_k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        return self._search_lists(query, _top_k(self.centroids @ query, nprobe), top_k)
+
+    def search_batch(self, queries: np.ndarray, top_k: int, nprobe: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Centroid scores of all queries in one product; each query then scans its own lists."""
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        centroid_scores = queries @ self.centroids.T
+        return [self._search_lists(q, _top_k(cs, nprobe), top_k) for q, cs in zip(queries, centroid_scores)]
+
+    def _search_lists(self, query: np.ndarray, lists: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = np.concatenate([self.ids[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        if candidates.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.emb[candidates] @ query
+        best = _top_k(scores, top_k)
+        return candidates[best], scores[best]
+
+    # -----------------------------
+    # persistence
+    # -----------------------------
+    def save(self, path: Path, fingerprint: str = ""):
+        np.savez(
+            path,
+            format_version=np.array(IVF_FORMAT_VERSION),
+            fingerprint=np.array(fingerprint),
+            centroids=self.centroids,
+            offsets=self.offsets,
+            ids=self.ids,
+        )
+
+    @classmethod
+    def load(cls, path: Path, emb: np.ndarray, fingerprint: str = "", nprobe: int = 8) -> Optional["IVFIndex"]:
+        """Load a saved index; None when missing or built for a different KB."""
+        if not Path(path).exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                if int(z["format_version"]) != IVF_FORMAT_VERSION or str(z["fingerprint"]) != fingerprint:
+                    log.warning("IVF index %s is stale; rebuild it with generate_vectors.py", path)
+                    return None
+                index = cls(emb, z["centroids"], z["offsets"], z["ids"], nprobe=nprobe)
+        except Exception as e:
+            log.warning("Failed loading IVF index %s: %s", path, e)
+            return None
+        if index.ids.shape[0] != emb.shape[0]:
+            log.warning("IVF index %s covers %d vectors, KB has %d", path, index.ids.shape[0], emb.shape[0])
+            return None
+        return index
+
+
+def recall_at_k(index, emb: np.ndarray, queries: np.ndarray, k: int = 10) -> float:
+    """Mean fraction of the exact top-k that `index` also returns."""
+    exact = ExactIndex(emb)
+    hits = 0
+    for q in queries:
+        truth = set(exact.search(q, k)[0].tolist())
+        hits += len(truth & set(index.search(q, k)[0].tolist()))
+    return hits / max(1, k * len(queries))
+
+
+def sample_queries(emb: np.ndarray, n: int = 200, noise: float = 0.05, seed: int = 1) -> np.ndarray:
+    """Perturbed KB rows, used as stand-in queries when measuring recall."""
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(emb[rng.choice(emb.shape[0], size=min(n, emb.shape[0]), replace=False)], dtype=np.float32)
+    rows = rows + rng.standard_normal(rows.shape).astype(np.float32) * noise / np.sqrt(rows.shape[1])
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
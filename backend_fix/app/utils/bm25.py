@@ -0,0 +1,117 @@
+# app/utils/bm25.py
+"""
+In-process BM25 retrieval over the KB documents (no network).
+
+Tokenizer: lowercase, alphanumeric tokens, Indonesian/English stopwords
+removed, and a light Indonesian suffix stemmer (particles -lah/-kah/-pun,
+possessives -ku/-mu/-nya, derivational -kan/-an). Prefixes are left alone:
+the KB is full of English tech terms (terraform, memory) that prefix rules
+would mangle.
+
+The index is a sparse term x doc matrix of precomputed BM25 weights, so a
+query is one sparse row sum.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:\.[0-9a-z]+)*[+#]*")
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda apa apakah atau bagaimana bagi bahwa banyak
+belum berapa bisa boleh buat cara dalam dan dari dengan di dia dong ini itu
+jadi jika juga kak kalau kami kamu kan karena ke kenapa ketika kita lagi lah
+mana masih mau mengapa menjadi mereka nya oleh pada para saja sama sampai
+saya sebagai sedang sekarang seperti setelah siapa sudah supaya tapi tentang
+tidak tolong untuk yang ya
+a an and are as at be by can do for from how i in is it me my of on or please
+the this to what which with you your
+""".split())
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+_SUFFIXES = ("kan", "an")
+
+
+def stem_id(word: str) -> str:
+    """Light Indonesian suffix stemmer (keeps at least 4 characters)."""
+    for group in (_PARTICLES, _POSSESSIVES, _SUFFIXES):
+        for suf in group:
+            if word.endswith(suf) and len(word) - len(suf) >= 4:
+                word = word[: -len(suf)]
+                break
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem_id(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, docs: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(docs)
+        self.vocab: Dict[str, int] = {}
+        rows, cols, tfs = [], [], []
+        lengths = np.zeros(self.n_docs, dtype=np.float32)
+        for d, text in enumerate(docs):
+            counts = Counter(tokenize(text))
+            lengths[d] = sum(counts.values())
+            for term, tf in counts.items():
+                rows.append(self.vocab.setdefault(term, len(self.vocab)))
+                cols.append(d)
+                tfs.append(tf)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        df = np.bincount(rows, minlength=len(self.vocab)).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(lengths.mean()) if self.n_docs else 0.0
+        norm = k1 * (1.0 - b + b * lengths[cols] / max(avgdl, 1e-9))
+        weights = self.idf[rows] * tfs * (k1 + 1.0) / (tfs + norm)
+        # term x doc; CSR rows are contiguous per term
+        self.weights = sparse.csr_matrix((weights, (rows, cols)), shape=(len(self.vocab), self.n_docs))
+
+    def _query_terms(self, query: str) -> Tuple[np.ndarray, np.ndarray, int]:
+        counts = Counter(tokenize(query))
+        known = [t for t in counts if t in self.vocab]
+        terms = np.fromiter((self.vocab[t] for t in known), dtype=np.int32, count=len(known))
+        qtf = np.fromiter((counts[t] for t in known), dtype=np.float32, count=len(known))
+        return terms, qtf, len(counts) - len(known)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float, float]]:
+        """
+        Best documents as (idx, bm25 score, coverage), best first. coverage is
+        the idf-weighted share of the query terms found in the doc (0..1);
+        terms that appear in no document count with the highest idf.
+        """
+        terms, qtf, n_unknown = self._query_terms(query)
+        if terms.size == 0 or self.n_docs == 0:
+            return []
+        sub = self.weights[terms]
+        scores = np.asarray(sub.T @ qtf).ravel()
+        top_k = min(top_k, int((scores > 0).sum()))
+        if top_k <= 0:
+            return []
+        idx = np.argpartition(-scores, top_k - 1)[:top_k]
+        idx = idx[np.argsort(-scores[idx])]
+
+        present = (sub[:, idx] > 0).toarray()            # terms x top docs
+        term_idf = self.idf[terms]
+        unknown_idf = n_unknown * float(np.log1p((self.n_docs + 0.5) / 0.5))
+        coverage = (term_idf @ present) / max(float(term_idf.sum()) + unknown_idf, 1e-9)
+        return [(int(i), float(scores[i]), float(c)) for i, c in zip(idx, coverage)]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """RRF: score(d) = sum over rankings of 1 / (k + rank). Best first."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: -kv[1])
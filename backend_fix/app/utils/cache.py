@@ -0,0 +1,136 @@
+# app/utils/cache.py
+"""
+Small thread-safe in-memory caches with hit/miss counters.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+log = logging.getLogger("LearningBuddy.cache")
+
+
+class LRUCache:
+    """
+    Bounded LRU mapping. Entries older than `ttl` seconds (if given) count as
+    misses and are dropped on access.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class ResponseCache:
+    """
+    Cache of generated LLM answers keyed on sha256(model, generation config,
+    prompt), bounded by size and TTL. Entries belong to one data version:
+    seeing a different version clears the cache. Hits/misses are also counted
+    per branch label.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 3600.0):
+        self.lru = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.data_version: Optional[str] = None
+        self.invalidations = 0
+        self._branches: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt: str, model: str, config: Optional[Dict] = None) -> str:
+        payload = json.dumps({"model": model, "config": config or {}, "prompt": prompt},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _use_version(self, data_version: Optional[str]):
+        with self._lock:
+            if data_version == self.data_version:
+                return
+            if self.data_version is not None:
+                log.info("Data version %s -> %s: clearing %d cached answers",
+                         self.data_version, data_version, len(self.lru))
+                self.invalidations += 1
+            self.lru.clear()
+            self.data_version = data_version
+
+    def get(self, prompt: str, model: str, config: Optional[Dict] = None,
+            data_version: Optional[str] = None, branch: str = "default") -> Optional[str]:
+        self._use_version(data_version)
+        value = self.lru.get(self.key(prompt, model, config))
+        with self._lock:
+            counts = self._branches.setdefault(branch, {"hits": 0, "misses": 0})
+            counts["hits" if value is not None else "misses"] += 1
+        return value
+
+    def put(self, prompt: str, model: str, answer: str, config: Optional[Dict] = None,
+            data_version: Optional[str] = None):
+        # An answer generated from data that changed meanwhile is not kept
+        if data_version != self.data_version or not answer:
+            return
+        self.lru.put(self.key(prompt, model, config), answer)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            branches = {
+                name: {**c, "hit_rate": round(c["hits"] / (c["hits"] + c["misses"]), 4) if c["hits"] + c["misses"] else 0.0}
+                for name, c in self._branches.items()
+            }
+        return {
+            **self.lru.stats(),
+            "ttl": self.lru.ttl,
+            "data_version": self.data_version,
+            "invalidations": self.invalidations,
+            "branches": branches,
+        }
@@ -1,12 +1,21 @@
 # app/utils/data_loader.py
 from pathlib import Path
 import pandas as pd
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
 import logging
 import os
+import threading
+import time
+import numpy as np
+from rapidfuzz import fuzz, process
+from app.core.settings import settings
+from app.utils import snapshot
 
 log = logging.getLogger("LearningBuddy.data_loader")
 DATA_DIR = Path("data")
+# Compiled columnar copy of the CSVs (see compile_data.py)
+SNAPSHOT_DIR = DATA_DIR / "snapshot"
 
 CSV_FILES = {
     "course_levels": "CourseLevel_clean.csv",
@@ -37,20 +46,218 @@ def _read_csv(key: str) -> pd.DataFrame:
             log.error("Second attempt failed reading %s: %s", p, e2)
             return pd.DataFrame()
 
+def _load_frames() -> Dict[str, pd.DataFrame]:
+    """
+    Load every table, memory-mapping it from the compiled snapshot when the
+    snapshot is up to date with its CSV and parsing the CSV otherwise.
+    """
+    manifest = snapshot.read_manifest(SNAPSHOT_DIR)
+    tables = manifest.get("tables", {}) if manifest else {}
+    frames = {}
+    stale = []
+    for key, fname in CSV_FILES.items():
+        table = tables.get(key)
+        if table is not None and snapshot.is_table_current(table, DATA_DIR / fname):
+            try:
+                frames[key] = snapshot.read_table(SNAPSHOT_DIR, table)
+                continue
+            except Exception as e:
+                log.warning("Failed to load %s from snapshot: %s", key, e)
+        if manifest:
+            stale.append(key)
+        frames[key] = _read_csv(key)
+    if stale:
+        log.warning("Snapshot is stale for %s; parsed CSV instead (re-run compile_data.py)", ", ".join(stale))
+    return frames
+
+def compile_snapshot(out_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Parse every CSV once and write the compiled snapshot. Standalone arrays
+    in DATA_DIR (*.npy) are versioned alongside the tables.
+    """
+    out_dir = out_dir or SNAPSHOT_DIR
+    frames = {k: _read_csv(k) for k in CSV_FILES.keys()}
+    sources = {k: DATA_DIR / fname for k, fname in CSV_FILES.items()}
+    arrays = {p.stem: np.load(p, allow_pickle=False) for p in sorted(DATA_DIR.glob("*.npy"))}
+    return snapshot.write_snapshot(frames, sources, out_dir, arrays=arrays)
+
+def load_snapshot_array(name: str) -> Optional[np.ndarray]:
+    """Memory-mapped array from the snapshot, falling back to DATA_DIR/<name>.npy."""
+    arr = snapshot.load_array(SNAPSHOT_DIR, name)
+    if arr is None and (DATA_DIR / f"{name}.npy").exists():
+        arr = np.load(DATA_DIR / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+    return arr
+
+# -----------------------------
+# SHARED DATA STORE
+# CSVs are parsed once per data version and the
+# same frames are handed to every router/service.
+# -----------------------------
+class DataStore:
+    """
+    Read-only snapshot of every CSV in DATA_DIR.
+
+    Frames are shared between requests, so callers must never mutate them
+    in place (use .copy() / .assign() to derive new frames). Anything that is
+    expensive to derive from the frames can be memoized per data version
+    with `derived()`; a new DataStore (and thus a fresh cache) is created
+    whenever the files on disk change.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], signature: Tuple):
+        self._frames = frames
+        self.signature = signature
+        self.version = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:12]
+        self.loaded_at = time.time()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.RLock()  # builders may depend on other derived values
+
+    def get(self, key: str) -> pd.DataFrame:
+        frame = self._frames.get(key)
+        return frame if frame is not None else pd.DataFrame()
+
+    def as_dict(self) -> Dict[str, pd.DataFrame]:
+        # New dict each call so callers can't swap out shared entries
+        return dict(self._frames)
+
+    def derived(self, name: str, builder: Callable[["DataStore"], Any]) -> Any:
+        """Return builder(self), computed at most once for this data version."""
+        if name in self._derived:
+            return self._derived[name]
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self)
+            return self._derived[name]
+
+_STORE: Optional[DataStore] = None
+_STORE_LOCK = threading.Lock()
+_LAST_CHECK = 0.0
+
+def _data_signature() -> Tuple:
+    """(file, mtime_ns, size) for every CSV and the snapshot manifest."""
+    sig = []
+    for fname in CSV_FILES.values():
+        try:
+            st = (DATA_DIR / fname).stat()
+            sig.append((fname, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((fname, None, None))
+    sig.append(snapshot.manifest_signature(SNAPSHOT_DIR))
+    return tuple(sig)
+
+def get_data_store(force_reload: bool = False) -> DataStore:
+    """
+    Return the process-wide DataStore, (re)loading it when the CSVs changed.
+    File stats are re-checked at most every settings.DATA_CHECK_INTERVAL seconds.
+    """
+    global _STORE, _LAST_CHECK
+    store = _STORE
+    now = time.monotonic()
+    if store is not None and not force_reload and now - _LAST_CHECK < settings.DATA_CHECK_INTERVAL:
+        return store
+
+    signature = _data_signature()
+    if store is not None and not force_reload and store.signature == signature:
+        _LAST_CHECK = now
+        return store
+
+    with _STORE_LOCK:
+        # Another thread may have reloaded while we waited for the lock
+        if _STORE is not None and not force_reload and _STORE.signature == signature:
+            _LAST_CHECK = now
+            return _STORE
+        started = time.perf_counter()
+        frames = _load_frames()
+        _STORE = DataStore(frames, signature)
+        _LAST_CHECK = time.monotonic()
+        log.info(
+            "Data store loaded: version=%s (%d tables) in %.0f ms",
+            _STORE.version, len(frames), (time.perf_counter() - started) * 1000,
+        )
+        return _STORE
+
 def load_all_data() -> Dict[str, pd.DataFrame]:
-    """Return a dict of dataframes for each known CSV."""
-    return {k: _read_csv(k) for k in CSV_FILES.keys()}
+    """Return a dict of dataframes for each known CSV (shared, read-only)."""
+    return get_data_store().as_dict()
+
+# -----------------------------
+# USER IDENTITY INDEX
+# normalized email / name -> StudentProgress row positions
+# -----------------------------
+def normalize_key(value: Any) -> str:
+    """Normalization used for every email/name/course-name comparison."""
+    return str(value).strip().lower()
+
+_EMPTY_KEYS = {"", "nan", "none"}
+
+def _positions_by_key(column: pd.Series) -> Dict[str, List[int]]:
+    keys = column.astype(str).str.strip().str.lower()
+    index: Dict[str, List[int]] = {}
+    for pos, key in enumerate(keys.tolist()):
+        if key in _EMPTY_KEYS:
+            continue
+        index.setdefault(key, []).append(pos)
+    return index
+
+class UserIndex:
+    """
+    Precomputed lookup from normalized email and normalized name to row
+    positions in the StudentProgress frame (rows kept in file order).
+    """
+
+    def __init__(self, student_progress: pd.DataFrame):
+        self.frame = student_progress
+        cols = student_progress.columns
+        self.by_email = _positions_by_key(student_progress["email"]) if "email" in cols else {}
+        self.by_name = _positions_by_key(student_progress["name"]) if "name" in cols else {}
+
+    @classmethod
+    def from_store(cls, store: "DataStore") -> "UserIndex":
+        return cls(store.get("student_progress"))
+
+    def positions(self, identifier: Any) -> List[int]:
+        """Row positions for an email or a name; emails are tried first when the identifier has an '@'."""
+        key = normalize_key(identifier or "")
+        if key in _EMPTY_KEYS:
+            return []
+        lookups = (self.by_email, self.by_name) if "@" in key else (self.by_name, self.by_email)
+        for lookup in lookups:
+            if key in lookup:
+                return lookup[key]
+        return []
+
+    def rows(self, identifier: Any) -> pd.DataFrame:
+        return self.frame.iloc[self.positions(identifier)]
+
+def get_user_index() -> UserIndex:
+    return get_data_store().derived("user_index", UserIndex.from_store)
+
+def resolve_user(identifier: Any) -> pd.DataFrame:
+    """
+    Return all StudentProgress rows for a user identified by email or name
+    (case/whitespace-insensitive). Empty frame when the user is unknown.
+    """
+    return get_user_index().rows(identifier)
+
+def resolve_user_record(identifier: Any) -> Optional[Dict[str, Any]]:
+    """First StudentProgress row of the user as a plain dict, or None."""
+    rows = resolve_user(identifier)
+    if rows.empty:
+        return None
+    return rows.iloc[:1].to_dict(orient="records")[0]
 
 def get_enriched_courses() -> pd.DataFrame:
     """
     Merge Courses dengan LearningPathAnswer dan CourseLevel untuk mendapatkan
     informasi course yang lebih lengkap.
-    Returns enriched courses dataframe.
+    Returns enriched courses dataframe (built once per data version, read-only).
     """
-    data = load_all_data()
-    courses = data.get("courses", pd.DataFrame())
-    lpa = data.get("learning_path_answers", pd.DataFrame())
-    course_levels = data.get("course_levels", pd.DataFrame())
+    return get_data_store().derived("enriched_courses", _build_enriched_courses)
+
+def _build_enriched_courses(store: DataStore) -> pd.DataFrame:
+    courses = store.get("courses")
+    lpa = store.get("learning_path_answers")
+    course_levels = store.get("course_levels")
     
     if courses.empty:
         log.warning("Courses dataframe is empty")
@@ -104,10 +311,313 @@ def get_enriched_courses() -> pd.DataFrame:
     log.info(f"Enriched courses: {len(enriched)} courses with merged data")
     return enriched
 
+# -----------------------------
+# COURSE CATALOG
+# enriched course records keyed by course_id
+# and by normalized course name
+# -----------------------------
+COURSE_INFO_FIELDS = ("summary", "description", "course_difficulty", "technologies", "course_type")
+
+def _clean_str(value: Any) -> str:
+    return "" if pd.isna(value) else str(value).strip()
+
+class CourseCatalog:
+    """
+    Lookup tables over the enriched course data. Each record is a plain dict:
+      course_id, course_name, learning_path_id, course_level_str,
+      course_level_name, hours_to_study, summary, description,
+      course_difficulty, technologies, course_type, has_info, tutorials
+    `has_info` tells whether LearningPathAnswer had a row for the course and
+    `tutorials` lists the LP_CourseMapping tutorial titles.
+    Names that only exist in LearningPathAnswer / LP_CourseMapping get a
+    record with course_id=None so name lookups cover every source.
+    Records are shared; treat them as read-only.
+    """
+
+    def __init__(self, by_id: Dict[int, Dict[str, Any]], by_name: Dict[str, Dict[str, Any]]):
+        self.by_id = by_id
+        self.by_name = by_name
+
+    def get(self, course: Any) -> Optional[Dict[str, Any]]:
+        """Look a course up by integer id or by (case-insensitive) name."""
+        if isinstance(course, (int, np.integer)) and not isinstance(course, bool):
+            return self.by_id.get(int(course))
+        if course is None:
+            return None
+        return self.by_name.get(normalize_key(course))
+
+    @classmethod
+    def from_store(cls, store: DataStore) -> "CourseCatalog":
+        lpa = store.get("learning_path_answers")
+        mapping = store.get("lp_course_map")
+
+        info_by_name: Dict[str, Dict[str, str]] = {}
+        if not lpa.empty and "name" in lpa.columns:
+            keys = lpa["name"].astype(str).str.strip().str.lower().tolist()
+            fields = {f: lpa[f].tolist() if f in lpa.columns else [""] * len(lpa) for f in COURSE_INFO_FIELDS}
+            for i, key in enumerate(keys):
+                # First LearningPathAnswer row wins, like the old per-request filter
+                if key not in info_by_name:
+                    info_by_name[key] = {f: _clean_str(fields[f][i]) for f in COURSE_INFO_FIELDS}
+
+        tutorials_by_name: Dict[str, List[str]] = {}
+        mapping_names: Dict[str, Any] = {}
+        if not mapping.empty and {"course_name", "tutorial_title"} <= set(mapping.columns):
+            names = mapping["course_name"].tolist()
+            keys = mapping["course_name"].astype(str).str.strip().str.lower().tolist()
+            titles = mapping["tutorial_title"].fillna("").astype(str).tolist()
+            for name, key, title in zip(names, keys, titles):
+                bucket = tutorials_by_name.setdefault(key, [])
+                mapping_names.setdefault(key, name)
+                if title.strip():
+                    bucket.append(title)
+
+        def record(course_name: Any, key: str, **base: Any) -> Dict[str, Any]:
+            info = info_by_name.get(key)
+            rec = {
+                "course_id": None,
+                "course_name": course_name,
+                "learning_path_id": None,
+                "course_level_str": None,
+                "course_level_name": None,
+                "hours_to_study": None,
+            }
+            rec.update(base)
+            rec.update(info or {f: "" for f in COURSE_INFO_FIELDS})
+            rec["has_info"] = info is not None
+            rec["tutorials"] = tutorials_by_name.get(key, [])
+            return rec
+
+        by_id: Dict[int, Dict[str, Any]] = {}
+        by_name: Dict[str, Dict[str, Any]] = {}
+        enriched = store.derived("enriched_courses", _build_enriched_courses)
+        if not enriched.empty:
+            level_names = enriched["course_level_name"] if "course_level_name" in enriched.columns else pd.Series(None, index=enriched.index)
+            for row, level_name in zip(enriched.to_dict(orient="records"), level_names.tolist()):
+                key = normalize_key(row.get("course_name", ""))
+                rec = record(
+                    row.get("course_name"), key,
+                    course_id=int(row["course_id"]),
+                    learning_path_id=row.get("learning_path_id"),
+                    course_level_str=row.get("course_level_str"),
+                    course_level_name=None if pd.isna(level_name) else level_name,
+                    hours_to_study=row.get("hours_to_study"),
+                )
+                by_id[rec["course_id"]] = rec
+                by_name.setdefault(key, rec)
+
+        if not lpa.empty and "name" in lpa.columns:
+            for name in lpa["name"].tolist():
+                key = normalize_key(name)
+                if key not in by_name:
+                    by_name[key] = record(name, key)
+        for key, name in mapping_names.items():
+            if key not in by_name:
+                by_name[key] = record(name, key)
+
+        log.info("Course catalog: %d courses by id, %d names", len(by_id), len(by_name))
+        return cls(by_id, by_name)
+
+def get_course_catalog() -> CourseCatalog:
+    """Enriched course records keyed by course_id and normalized name (per data version)."""
+    return get_data_store().derived("course_catalog", CourseCatalog.from_store)
+
+class CourseNameResolver:
+    """
+    Course name -> Courses row / course_id. StudentProgress has no course_id,
+    so joins go through this table instead of exact name comparisons.
+
+    Built once per data version: names equal to a Courses name after
+    normalize_key resolve exactly (first Courses row wins); every other
+    distinct StudentProgress course name gets its best Courses match and
+    score from one rapidfuzz cdist (token_sort_ratio, 0..100). Callers pick
+    the score they accept (default COURSE_MATCH_MIN_SCORE); names outside
+    the table are matched on the fly.
+    """
+
+    def __init__(self, courses: pd.DataFrame, names: List[Any]):
+        self.names = courses["course_name"].astype(str).tolist() if "course_name" in courses.columns else []
+        self.ids = [int(i) for i in courses["course_id"]] if "course_id" in courses.columns else [None] * len(self.names)
+        self.keys = [normalize_key(n) for n in self.names]
+        self.exact: Dict[str, int] = {}
+        for row, key in enumerate(self.keys):
+            self.exact.setdefault(key, row)
+
+        unmatched = list(dict.fromkeys(
+            key for key in (normalize_key(n) for n in names) if key not in self.exact and key not in _EMPTY_KEYS
+        ))
+        self.fuzzy: Dict[str, Tuple[int, float]] = {}
+        if unmatched and self.keys:
+            scores = process.cdist(unmatched, self.keys, scorer=fuzz.token_sort_ratio, workers=-1)
+            best = scores.argmax(axis=1)
+            for key, row, score in zip(unmatched, best.tolist(), scores[np.arange(len(unmatched)), best].tolist()):
+                self.fuzzy[key] = (row, float(score))
+
+    @classmethod
+    def from_store(cls, store: DataStore) -> "CourseNameResolver":
+        sp = store.get("student_progress")
+        names = sp["course_name"].tolist() if "course_name" in sp.columns else []
+        resolver = cls(store.get("courses"), names)
+        log.info("Course name resolver: %d catalog names, %d fuzzy-matched progress names",
+                 len(resolver.exact), len(resolver.fuzzy))
+        return resolver
+
+    def best(self, name: Any) -> Optional[Tuple[int, float]]:
+        """(Courses row, score) of the closest catalog name, or None."""
+        key = normalize_key(name if name is not None else "")
+        if key in self.exact:
+            return self.exact[key], 100.0
+        if key in _EMPTY_KEYS or not self.keys:
+            return None
+        if key in self.fuzzy:
+            return self.fuzzy[key]
+        _, score, row = process.extractOne(key, self.keys, scorer=fuzz.token_sort_ratio)
+        return row, float(score)
+
+    def row(self, name: Any, min_score: Optional[float] = None) -> Optional[int]:
+        """Courses row position for a course name, None below min_score."""
+        hit = self.best(name)
+        threshold = settings.COURSE_MATCH_MIN_SCORE if min_score is None else min_score
+        if hit is None or hit[1] < threshold:
+            return None
+        return hit[0]
+
+    def course_id(self, name: Any, min_score: Optional[float] = None) -> Optional[int]:
+        row = self.row(name, min_score)
+        return None if row is None else self.ids[row]
+
+    def canonical_name(self, name: Any, min_score: Optional[float] = None) -> Optional[str]:
+        """Catalog spelling of a course name."""
+        row = self.row(name, min_score)
+        return None if row is None else self.names[row]
+
+def get_course_resolver() -> CourseNameResolver:
+    """Course name resolution table (per data version)."""
+    return get_data_store().derived("course_resolver", CourseNameResolver.from_store)
+
 # -----------------------------
 # BUILD KB: per-user documents +
 # global docs for courses/tutorials etc.
+# Each section turns a slice of rows into
+# (doc_id, doc_type, text) with column-wise
+# string ops instead of iterrows().
 # -----------------------------
+KB_CHUNK_SIZE = 1000
+KbDocument = Tuple[str, str, str]
+
+def _text_col(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column as str with NaN -> "" (missing column -> all ""), like fillna("").astype(str)."""
+    if name not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    s = df[name]
+    return s.astype(object).where(s.notna(), "").astype(str)
+
+def _join_non_empty(parts: List[pd.Series], sep: str = " | ") -> pd.Series:
+    """Row-wise sep.join of the parts that are not blank."""
+    acc = pd.Series("", index=parts[0].index, dtype=object)
+    for part in parts:
+        acc = acc + (part + sep).where(part.str.strip() != "", "")
+    return acc.where(acc == "", acc.str[:-len(sep)])
+
+def _section_docs(doc_type: str, texts: pd.Series, keep: Optional[pd.Series] = None) -> List[KbDocument]:
+    if keep is not None:
+        texts = texts[keep]
+    prefix = doc_type.lower()
+    return [(f"{prefix}:{i}", doc_type, t) for i, t in zip(texts.index.tolist(), texts.tolist())]
+
+def _course_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    name = _text_col(rows, "course_name")
+    course_text = _join_non_empty([
+        name,
+        _text_col(rows, "course_level_str"),
+        _text_col(rows, "course_level_name"),  # From CourseLevel merge
+        _text_col(rows, "hours_to_study"),
+        _text_col(rows, "summary"),  # From LearningPathAnswer merge
+        _text_col(rows, "course_difficulty"),  # From LearningPathAnswer merge
+        _text_col(rows, "technologies"),  # From LearningPathAnswer merge
+    ])
+    # Truncate very long descriptions to avoid huge documents
+    description = _text_col(rows, "description").str.strip()
+    description = description.where(description.str.len() <= 1000, description.str[:1000] + "...")
+
+    desc_text = "COURSE_DESC: " + name + " | " + description
+
+    # Keep each course's description right after its COURSE doc
+    docs: List[KbDocument] = []
+    for i, c_text, has_c, d_text, has_d in zip(
+        rows.index.tolist(), ("COURSE: " + course_text).tolist(), (course_text != "").tolist(),
+        desc_text.tolist(), (description != "").tolist(),
+    ):
+        if has_c:
+            docs.append((f"course:{i}", "COURSE", c_text))
+        if has_d:
+            docs.append((f"course_desc:{i}", "COURSE_DESC", d_text))
+    return docs
+
+def _mapping_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    text = "MAPPING: " + _text_col(rows, "learning_path_name") + " | " + _text_col(rows, "course_name") + " | " + _text_col(rows, "tutorial_title")
+    return _section_docs("MAPPING", text)
+
+def _tutorial_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    title = _text_col(rows, "tutorial_title")
+    return _section_docs("TUTORIAL", "TUTORIAL: " + title, title.str.strip() != "")
+
+def _interest_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    return _section_docs("Q_INTEREST", "Q_INTEREST: " + _text_col(rows, "question_desc") + " | " + _text_col(rows, "option_text"))
+
+def _tech_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    return _section_docs("Q_TECH", "Q_TECH: " + _text_col(rows, "question_desc") + " | " + _text_col(rows, "tech_category"))
+
+def _user_docs(rows: pd.DataFrame) -> List[KbDocument]:
+    # create per-user doc with fields that can be used by RAG
+    name = _text_col(rows, "name").str.strip()
+    text = (
+        "USER: " + name
+        + " | CURRENT_COURSE: " + _text_col(rows, "course_name")
+        + " | COMPLETED_TUTORIALS: " + _text_col(rows, "completed_tutorials")
+        + " | ACTIVE_TUTORIALS: " + _text_col(rows, "active_tutorials")
+        + " | IS_GRADUATED: " + _text_col(rows, "is_graduated")
+        + " | EXAM_SCORE: " + _text_col(rows, "exam_score")
+        + " | SKILLS_STRONG: To be computed"
+        + " | SKILLS_WEAK: To be computed"
+        + " | INSIGHTS: To be computed by ML"
+    )
+    return _section_docs("USER", text, name != "")
+
+def iter_kb_documents(chunk_size: int = KB_CHUNK_SIZE) -> Iterator[List[KbDocument]]:
+    """
+    Stream the KB as chunks of (doc_id, doc_type, text), in the same order as
+    build_learningbuddy_kb(). Only one slice of source rows is turned into
+    text at a time, so consumers (e.g. the embedder) can start early and
+    memory stays flat as the catalog grows. doc_id is "<type>:<source row>".
+    """
+    store = get_data_store()
+    sections = [
+        # GLOBAL: courses (use enriched version with merged data)
+        (get_enriched_courses(), _course_docs),
+        # GLOBAL: tutorials mapping
+        (store.get("lp_course_map"), _mapping_docs),
+        # GLOBAL: tutorials
+        (store.get("tutorials"), _tutorial_docs),
+        # QUESTIONS datasets (useful for quiz/eval)
+        (store.get("current_interest"), _interest_docs),
+        (store.get("current_tech"), _tech_docs),
+        # PER-USER: student progress -> create a rich user doc for each student
+        (store.get("student_progress"), _user_docs),
+    ]
+    chunk: List[KbDocument] = []
+    for frame, build in sections:
+        for start in range(0, len(frame), chunk_size):
+            for doc_id, doc_type, text in build(frame.iloc[start:start + chunk_size]):
+                text = text.strip()
+                if text:
+                    chunk.append((doc_id, doc_type, text))
+            while len(chunk) >= chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+    if chunk:
+        yield chunk
+
 def build_learningbuddy_kb() -> List[str]:
     """
     Build KB texts from CSVs:
@@ -116,92 +626,7 @@ def build_learningbuddy_kb() -> List[str]:
       - per-user student progress docs (rich)
     Returns list[str] (documents).
     """
-    data = load_all_data()
-    docs: List[str] = []
-
-    # GLOBAL: courses (use enriched version with merged data)
-    # Note: LearningPathAnswer data is now merged into courses, so we don't need separate COURSE_META
-    courses = get_enriched_courses()
-    if not courses.empty:
-        for _, r in courses.fillna("").astype(str).iterrows():
-            # Build course document with enriched information
-            course_parts = [
-                r.get("course_name", ""),
-                r.get("course_level_str", ""),
-                r.get("course_level_name", ""),  # From CourseLevel merge
-                str(r.get("hours_to_study", "")),
-                r.get("summary", ""),  # From LearningPathAnswer merge
-                r.get("course_difficulty", ""),  # From LearningPathAnswer merge
-                r.get("technologies", ""),  # From LearningPathAnswer merge
-            ]
-            # Filter empty parts
-            course_text = " | ".join([p for p in course_parts if p.strip()])
-            if course_text:
-                docs.append(f"COURSE: {course_text}")
-            
-            # Also add description separately if available (can be long)
-            description = r.get("description", "").strip()
-            if description:
-                # Truncate very long descriptions to avoid huge documents
-                if len(description) > 1000:
-                    description = description[:1000] + "..."
-                docs.append(f"COURSE_DESC: {r.get('course_name', '')} | {description}")
-
-    # GLOBAL: tutorials mapping
-    mapping = data.get("lp_course_map", pd.DataFrame())
-    if not mapping.empty:
-        for _, r in mapping.fillna("").astype(str).iterrows():
-            docs.append("MAPPING: " + " | ".join([r.get("learning_path_name",""), r.get("course_name",""), r.get("tutorial_title","")]))
-
-    # GLOBAL: tutorials
-    tutorials = data.get("tutorials", pd.DataFrame())
-    if not tutorials.empty:
-        for _, r in tutorials.fillna("").astype(str).iterrows():
-            t = r.get("tutorial_title","")
-            if t.strip():
-                docs.append("TUTORIAL: " + t)
-
-    # QUESTIONS datasets (useful for quiz/eval)
-    ci = data.get("current_interest", pd.DataFrame())
-    if not ci.empty:
-        for _, r in ci.fillna("").astype(str).iterrows():
-            docs.append("Q_INTEREST: " + " | ".join([r.get("question_desc",""), r.get("option_text","")]))
-
-    ct = data.get("current_tech", pd.DataFrame())
-    if not ct.empty:
-        for _, r in ct.fillna("").astype(str).iterrows():
-            docs.append("Q_TECH: " + " | ".join([r.get("question_desc",""), r.get("tech_category","")]))
-
-    # PER-USER: student progress -> create a rich user doc for each student
-    sp = data.get("student_progress", pd.DataFrame())
-    if not sp.empty:
-        # normalize columns we expect (coerce missing)
-        sp = sp.fillna("")
-        for _, r in sp.astype(str).iterrows():
-            name = r.get("name","").strip()
-            if not name:
-                continue
-            course = r.get("course_name","")
-            completed = r.get("completed_tutorials","")
-            active = r.get("active_tutorials","")
-            graduated = r.get("is_graduated","")
-            exam_score = r.get("exam_score","")
-            # create per-user doc with fields that can be used by RAG
-            doc = [
-                f"USER: {name}",
-                f"CURRENT_COURSE: {course}",
-                f"COMPLETED_TUTORIALS: {completed}",
-                f"ACTIVE_TUTORIALS: {active}",
-                f"IS_GRADUATED: {graduated}",
-                f"EXAM_SCORE: {exam_score}",
-                "SKILLS_STRONG: To be computed",
-                "SKILLS_WEAK: To be computed",
-                "INSIGHTS: To be computed by ML"
-            ]
-            docs.append(" | ".join([d for d in doc if d]))
-    # final cleanup and return
-    docs = [d.strip() for d in docs if d and d.strip()]
-    return docs
+    return [text for chunk in iter_kb_documents(chunk_size=1 << 20) for _, _, text in chunk]
 
 # -----------------------------
 # Backwards-compatible alias:
@@ -218,7 +643,7 @@ def load_all_data_texts() -> List[str]:
 def load_student_progress(path: str = None):
     """Return list of dict records from student progress CSV."""
     if path is None:
-        path = str(DATA_DIR / "StudentProgress_clean.csv")
+        return get_data_store().get("student_progress").to_dict(orient="records")
     if not os.path.exists(path):
         return []
     try:
@@ -0,0 +1,235 @@
+# app/utils/embedding_cache.py
+"""
+Content-addressed, persistent cache of document embeddings.
+
+Every vector is stored under sha256(embed model + text), so a KB rebuild
+only has to embed documents whose text (or the embedding model) changed.
+On disk the cache is a set of append-only shards in CACHE_DIR:
+  shard-<n>.npy        -> float32 matrix, one row per key
+  shard-<n>.keys.json  -> list of keys, same order as the rows
+New vectors are appended as a new shard (cheap checkpoints while a build
+is running); compact() rewrites everything that is still referenced into
+a single shard.
+
+QueryEmbeddingCache is the request-path counterpart for embed_query: an
+in-memory LRU of question vectors with an optional SQLite tier that
+survives restarts.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.utils.cache import LRUCache
+
+log = logging.getLogger("LearningBuddy.embedding_cache")
+
+
+def embedding_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    # -----------------------------
+    # persistence
+    # -----------------------------
+    def _shards(self) -> List[Path]:
+        return sorted(self.cache_dir.glob("shard-*.npy"), key=lambda p: int(p.stem.split("-")[1]))
+
+    def _load(self):
+        if not self.cache_dir.exists():
+            return
+        for shard in self._shards():
+            keys_file = shard.with_name(shard.stem + ".keys.json")
+            try:
+                arr = np.load(shard, allow_pickle=False)
+                with open(keys_file, "r", encoding="utf-8") as f:
+                    keys = json.load(f)
+                if arr.ndim != 2 or len(keys) != arr.shape[0]:
+                    raise ValueError(f"shape {arr.shape} does not match {len(keys)} keys")
+            except Exception as e:
+                # A shard interrupted mid-write is simply re-embedded later
+                log.warning("Skipping unreadable cache shard %s: %s", shard.name, e)
+                continue
+            for key, vec in zip(keys, arr):
+                self._vectors[key] = vec
+        log.info("Embedding cache: %d vectors loaded from %s", len(self._vectors), self.cache_dir)
+
+    def _write_shard(self, index: int, keys: List[str], arr: np.ndarray):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        shard = self.cache_dir / f"shard-{index}.npy"
+        keys_file = self.cache_dir / f"shard-{index}.keys.json"
+        # keys first: a shard whose .npy is missing is ignored on load. Each file
+        # is written to a .tmp and moved into place, so neither is ever partial
+        tmp = keys_file.with_name(keys_file.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(keys, f)
+        tmp.replace(keys_file)
+        tmp = shard.with_name(shard.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr, allow_pickle=False)
+        tmp.replace(shard)
+
+    def flush(self) -> int:
+        """Append vectors added since the last flush as a new shard. Returns rows written."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            keys = list(self._pending.keys())
+            arr = np.vstack([self._pending[k] for k in keys]).astype(np.float32)
+            shards = self._shards()
+            next_index = int(shards[-1].stem.split("-")[1]) + 1 if shards else 0
+            self._write_shard(next_index, keys, arr)
+            self._pending.clear()
+            return len(keys)
+
+    def compact(self, keep: Optional[Iterable[str]] = None):
+        """Drop vectors not in `keep` (all kept if None) and rewrite the cache as one shard."""
+        with self._lock:
+            if keep is not None:
+                keep_set = set(keep)
+                dropped = [k for k in self._vectors if k not in keep_set]
+                for k in dropped:
+                    del self._vectors[k]
+                if dropped:
+                    log.info("Embedding cache: dropped %d stale vectors", len(dropped))
+            self._pending.clear()
+            old_shards = self._shards()
+            keys = list(self._vectors.keys())
+            if keys:
+                arr = np.vstack([self._vectors[k] for k in keys]).astype(np.float32)
+                next_index = int(old_shards[-1].stem.split("-")[1]) + 1 if old_shards else 0
+                self._write_shard(next_index, keys, arr)
+            for shard in old_shards:
+                shard.unlink(missing_ok=True)
+                shard.with_name(shard.stem + ".keys.json").unlink(missing_ok=True)
+
+    # -----------------------------
+    # lookups
+    # -----------------------------
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._vectors
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self._vectors.get(key)
+
+    def missing(self, keys: Sequence[str]) -> List[int]:
+        """Positions of keys that have no cached vector."""
+        return [i for i, k in enumerate(keys) if k not in self._vectors]
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]):
+        with self._lock:
+            for key, vec in zip(keys, vectors):
+                arr = np.asarray(vec, dtype=np.float32)
+                self._vectors[key] = arr
+                self._pending[key] = arr
+
+    def matrix(self, keys: Sequence[str]) -> np.ndarray:
+        """Stack the cached vectors for keys (all must be present)."""
+        return np.vstack([self._vectors[k] for k in keys])
+
+
+# -----------------------------
+# QUERY EMBEDDINGS
+# -----------------------------
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Case/whitespace-insensitive form of a question; trailing ?!. are ignored."""
+    return _WS_RE.sub(" ", (text or "").strip().lower()).rstrip(" ?!.")
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed on (normalized question, model):
+    a bounded LRU in memory and, when db_path is set, a SQLite table on disk.
+    """
+
+    def __init__(self, maxsize: int = 2048, db_path: Optional[Path] = None):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.db_path = Path(db_path) if db_path else None
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if self.db_path is not None:
+            try:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                log.warning("Query embedding disk cache disabled (%s): %s", self.db_path, e)
+                self._db = None
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        return embedding_key(normalize_question(text), model)
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = self.key(text, model)
+        vec = self.memory.get(key)
+        if vec is not None or self._db is None:
+            return vec
+        with self._db_lock:
+            try:
+                row = self._db.execute("SELECT vec FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                log.warning("Query embedding disk lookup failed: %s", e)
+                row = None
+        if row is None:
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        vec = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self.memory.put(key, vec)
+        return vec
+
+    def get_memory(self, text: str, model: str) -> Optional[List[float]]:
+        """Memory tier only: never touches the disk, safe on the event loop."""
+        return self.memory.get(self.key(text, model))
+
+    def put(self, text: str, model: str, vec: Sequence[float]):
+        self.put_many([text], model, [vec])
+
+    def put_many(self, texts: Sequence[str], model: str, vecs: Sequence[Sequence[float]]):
+        """Store several vectors; the disk tier is written in one transaction."""
+        rows = []
+        for text, vec in zip(texts, vecs):
+            key = self.key(text, model)
+            vec = list(vec)
+            self.memory.put(key, vec)
+            rows.append((key, np.asarray(vec, dtype=np.float32).tobytes()))
+        if self._db is None or not rows:
+            return
+        with self._db_lock:
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO query_embeddings (key, vec) VALUES (?, ?)", rows)
+                self._db.commit()
+            except sqlite3.Error as e:
+                log.warning("Query embedding disk write failed: %s", e)
+
+    def stats(self) -> Dict:
+        out = {"memory": self.memory.stats(), "disk": None}
+        if self._db is not None:
+            with self._db_lock:
+                size = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            out["disk"] = {"path": str(self.db_path), "size": size, "hits": self.disk_hits, "misses": self.disk_misses}
+        return out
@@ -0,0 +1,206 @@
+# app/utils/snapshot.py
+"""
+Compiled, memory-mappable snapshot of the data/*_clean.csv tables.
+
+Layout of SNAPSHOT_DIR:
+  manifest.json                 -> format version, per-table schema and source hashes
+  <table>.<dtype>.npy           -> numeric / bool columns of one dtype, shape (n_cols, n_rows),
+                                   loaded with mmap_mode="r"
+  <table>.text.npy              -> all string columns as NUL-separated UTF-8 bytes (column-major)
+  <table>.nulls.npy             -> missing-value mask of the string columns, shape (n_cols, n_rows)
+  <name>.npy                    -> standalone arrays (e.g. knowledge_vectors)
+
+Build it with `python compile_data.py`.
+"""
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger("LearningBuddy.snapshot")
+
+SNAPSHOT_FORMAT = "learningbuddy-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_info(path: Path) -> Dict:
+    st = path.stat()
+    return {
+        "file": path.name,
+        "sha256": file_sha256(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+
+# -----------------------------
+# WRITE
+# -----------------------------
+_SEP = "\x00"
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype)
+
+
+def _write_table(out_dir: Path, key: str, df: pd.DataFrame) -> Dict:
+    columns = []
+    numeric_groups: Dict[str, list] = {}
+    texts, nulls = [], []
+
+    for name in df.columns:
+        series = df[name]
+        if _is_numeric(series):
+            arr = series.to_numpy()
+            group = numeric_groups.setdefault(str(arr.dtype), [])
+            columns.append({"name": str(name), "kind": "numeric",
+                            "file": f"{key}.{arr.dtype}.npy", "slot": len(group)})
+            group.append(arr)
+            continue
+
+        missing = series.isna().to_numpy()
+        values = ["" if m else str(v) for v, m in zip(series.tolist(), missing)]
+        if any(_SEP in v for v in values):
+            raise ValueError(f"{key}.{name} contains NUL characters and cannot be compiled")
+        columns.append({"name": str(name), "kind": "string", "slot": len(texts)})
+        texts.append(_SEP.join(values))
+        nulls.append(missing)
+
+    table = {"rows": int(len(df)), "columns": columns}
+    for dtype, arrays in numeric_groups.items():
+        np.save(out_dir / f"{key}.{dtype}.npy", np.vstack(arrays), allow_pickle=False)
+    if texts:
+        blob = _SEP.join(texts).encode("utf-8")
+        table["text"], table["nulls"] = f"{key}.text.npy", f"{key}.nulls.npy"
+        np.save(out_dir / table["text"], np.frombuffer(blob, dtype=np.uint8), allow_pickle=False)
+        np.save(out_dir / table["nulls"], np.vstack(nulls), allow_pickle=False)
+    return table
+
+
+def write_snapshot(
+    frames: Dict[str, pd.DataFrame],
+    sources: Dict[str, Path],
+    out_dir: Path,
+    arrays: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict:
+    """Write every frame (and optional standalone arrays) to out_dir and return the manifest."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Drop files from a previous build so removed columns/tables don't linger
+    for old in out_dir.glob("*.npy"):
+        old.unlink()
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "tables": {},
+        "arrays": {},
+    }
+    for key, df in frames.items():
+        table = _write_table(out_dir, key, df)
+        src = sources.get(key)
+        if src is not None and src.exists():
+            table["source"] = _source_info(src)
+        manifest["tables"][key] = table
+
+    for name, arr in (arrays or {}).items():
+        arr = np.ascontiguousarray(arr)
+        np.save(out_dir / f"{name}.npy", arr, allow_pickle=False)
+        manifest["arrays"][name] = {"file": f"{name}.npy", "dtype": str(arr.dtype), "shape": list(arr.shape)}
+
+    # Manifest last: a snapshot without one is never picked up half-written
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+# -----------------------------
+# READ
+# -----------------------------
+def read_manifest(snapshot_dir: Path) -> Optional[Dict]:
+    path = snapshot_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        log.warning("Unreadable snapshot manifest %s: %s", path, e)
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("format_version") != SNAPSHOT_VERSION:
+        log.warning("Ignoring snapshot %s: unsupported format %s v%s",
+                    snapshot_dir, manifest.get("format"), manifest.get("format_version"))
+        return None
+    return manifest
+
+
+def is_table_current(table: Dict, csv_path: Path) -> bool:
+    """
+    A compiled table is usable when its source CSV is gone (snapshot-only
+    deploy) or still has the content it was compiled from.
+    """
+    if not csv_path.exists():
+        return True
+    src = table.get("source")
+    if not src:
+        return False
+    st = csv_path.stat()
+    if st.st_size == src.get("size") and st.st_mtime_ns == src.get("mtime_ns"):
+        return True
+    # mtime changes on checkout/copy; fall back to comparing content
+    return st.st_size == src.get("size") and file_sha256(csv_path) == src.get("sha256")
+
+
+def read_table(snapshot_dir: Path, table: Dict) -> pd.DataFrame:
+    rows = table["rows"]
+    if "text" in table and rows:
+        # One C-level split decodes every string column of the table
+        text = np.load(snapshot_dir / table["text"], allow_pickle=False).tobytes().decode("utf-8")
+        values = text.split(_SEP)
+        nulls = np.load(snapshot_dir / table["nulls"], allow_pickle=False)
+
+    groups: Dict[str, np.ndarray] = {}
+    columns = {}
+    for col in table["columns"]:
+        if col["kind"] == "numeric":
+            if col["file"] not in groups:
+                groups[col["file"]] = np.load(snapshot_dir / col["file"], mmap_mode="r", allow_pickle=False)
+            columns[col["name"]] = groups[col["file"]][col["slot"]]
+        elif rows:
+            slot = col["slot"]
+            series = pd.Series(values[slot * rows:(slot + 1) * rows])
+            columns[col["name"]] = series.mask(nulls[slot]) if nulls[slot].any() else series
+        else:
+            columns[col["name"]] = pd.Series([], dtype=object)
+    # copy=False keeps numeric columns backed by the shared, read-only mmap pages
+    return pd.DataFrame(columns, index=pd.RangeIndex(rows), copy=False)
+
+
+def load_array(snapshot_dir: Path, name: str) -> Optional[np.ndarray]:
+    """Memory-map a standalone array stored in the snapshot (None if absent)."""
+    manifest = read_manifest(snapshot_dir)
+    if not manifest or name not in manifest.get("arrays", {}):
+        return None
+    return np.load(snapshot_dir / manifest["arrays"][name]["file"], mmap_mode="r", allow_pickle=False)
+
+
+def manifest_signature(snapshot_dir: Path) -> Tuple:
+    try:
+        st = (snapshot_dir / MANIFEST_NAME).stat()
+        return (MANIFEST_NAME, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (MANIFEST_NAME, None, None)
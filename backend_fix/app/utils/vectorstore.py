@@ -1,10 +1,13 @@
 # app/utils/vectorstore.py
 import json
+import hashlib
 from pathlib import Path
 import numpy as np
-from typing import List, Tuple
-from app.core.gemini_client import embed_texts
+from typing import List, Optional, Tuple
+from app.core.gemini_client import embed_texts, EMBED_MODEL
 from app.core.settings import settings
+from app.utils.embedding_cache import EmbeddingCache, embedding_key
+from app.utils.ann_index import ExactIndex, IVFIndex
 import logging
 
 log = logging.getLogger("LearningBuddy.vectorstore")
@@ -13,27 +16,159 @@ EMB_DIR = Path(settings.EMB_DIR)
 EMB_DIR.mkdir(exist_ok=True, parents=True)
 EMB_FILE = EMB_DIR / "kb_embeddings.npy"
 TEXT_FILE = EMB_DIR / "kb_texts.json"
+# Which data version / embed model kb_embeddings.npy was built from
+MANIFEST_FILE = EMB_DIR / "kb_manifest.json"
+CACHE_DIR = EMB_DIR / "embed_cache"
+# Approximate (IVF) index over kb_embeddings.npy, built by generate_vectors.py
+IVF_FILE = EMB_DIR / "kb_ivf.npz"
 
-def build_or_load_vectorstore(texts: List[str], force_rebuild: bool = False) -> Tuple[np.ndarray, List[str]]:
-    if not force_rebuild and EMB_FILE.exists() and TEXT_FILE.exists():
-        try:
-            log.info("Loading embeddings from disk...")
-            arr = np.load(EMB_FILE, allow_pickle=False)
-            docs = json.load(open(TEXT_FILE, "r", encoding="utf-8"))
-            if not isinstance(arr, np.ndarray) or arr.ndim != 2:
-                raise ValueError("Saved embeddings are not 2D array.")
-            return arr, docs
-        except Exception as e:
-            log.warning("Failed loading embeddings: %s. Rebuilding...", e)
+_CACHE: Optional[EmbeddingCache] = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = EmbeddingCache(CACHE_DIR)
+    return _CACHE
+
+def _texts_digest(texts: List[str]) -> str:
+    h = hashlib.sha256()
+    for t in texts:
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def normalize_rows(arr: np.ndarray) -> np.ndarray:
+    """L2-normalize each row as float32 (zero rows stay zero), so cosine == dot product."""
+    arr = np.asarray(arr, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+def read_manifest() -> Optional[dict]:
+    if not MANIFEST_FILE.exists():
+        return None
+    try:
+        return json.load(open(MANIFEST_FILE, "r", encoding="utf-8"))
+    except Exception as e:
+        log.warning("Unreadable KB manifest: %s", e)
+        return None
+
+def _write_manifest(texts: List[str], data_version: Optional[str]):
+    manifest = {
+        "embed_model": EMBED_MODEL,
+        "data_version": data_version,
+        "doc_count": len(texts),
+        "texts_sha256": _texts_digest(texts),
+        # kb_embeddings.npy holds L2-normalized float32 rows
+        "normalized": True,
+    }
+    json.dump(manifest, open(MANIFEST_FILE, "w", encoding="utf-8"), indent=2)
+
+def load_vectorstore(data_version: Optional[str] = None) -> Optional[Tuple[np.ndarray, List[str]]]:
+    """
+    Saved (embeddings, docs) or None when missing/unreadable. When data_version
+    is given, the saved KB must also have been built from that data version
+    with the current embed model. Embeddings are memory-mapped read-only and
+    are always L2-normalized float32 rows.
+    """
+    if not (EMB_FILE.exists() and TEXT_FILE.exists()):
+        return None
+    manifest = read_manifest() or {}
+    if data_version is not None:
+        if manifest.get("data_version") != data_version or manifest.get("embed_model") != EMBED_MODEL:
+            return None
+    try:
+        log.info("Loading embeddings from disk...")
+        arr = np.load(EMB_FILE, mmap_mode="r", allow_pickle=False)
+        docs = json.load(open(TEXT_FILE, "r", encoding="utf-8"))
+        if not isinstance(arr, np.ndarray) or arr.ndim != 2:
+            raise ValueError("Saved embeddings are not 2D array.")
+        if arr.shape[0] != len(docs):
+            raise ValueError(f"{arr.shape[0]} vectors for {len(docs)} docs.")
+        if arr.dtype != np.float32 or not manifest.get("normalized"):
+            # Older float64 / raw files: normalize in memory until the next rebuild
+            arr = normalize_rows(arr)
+        return arr, docs
+    except Exception as e:
+        log.warning("Failed loading embeddings: %s. Rebuilding...", e)
+        return None
+
+def build_or_load_vectorstore(
+    texts: List[str],
+    force_rebuild: bool = False,
+    data_version: Optional[str] = None,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Return the KB matrix for `texts`. Unless force_rebuild, saved embeddings
+    are reused as-is when they were built from exactly these texts. Otherwise
+    the matrix is assembled from the embedding cache and only new/changed
+    documents are sent to Gemini; vectors of documents that no longer exist
+    are dropped from the cache.
+    """
+    if not force_rebuild:
+        saved = load_vectorstore()
+        manifest = read_manifest() or {}
+        if saved is not None and manifest.get("embed_model") == EMBED_MODEL and saved[1] == texts:
+            if manifest.get("data_version") != data_version:
+                _write_manifest(texts, data_version)
+            return saved
+        if saved is not None:
+            log.info("Saved KB does not match current data; updating incrementally...")
 
     if not texts:
         raise ValueError("No texts to embed.")
 
-    log.info("Generating embeddings via Gemini...")
-    vecs = embed_texts(texts)
-    arr = np.array(vecs, dtype=float)
+    cache = get_embedding_cache()
+    keys = [embedding_key(t, EMBED_MODEL) for t in texts]
+    todo = {}
+    for i in cache.missing(keys):
+        todo.setdefault(keys[i], texts[i])  # identical texts are embedded once
+    log.info("KB: %d docs, %d reused from cache, %d to embed", len(texts), len(texts) - len(todo), len(todo))
+
+    if todo:
+        log.info("Generating embeddings via Gemini...")
+        todo_keys = list(todo.keys())
+        finished = [0]
+
+        def checkpoint(start: int, vectors: List[List[float]]):
+            # Persist progress so an interrupted build resumes from the cache
+            cache.put_many(todo_keys[start:start + len(vectors)], vectors)
+            finished[0] += 1
+            if finished[0] % settings.EMBED_CHECKPOINT_BATCHES == 0:
+                cache.flush()
+
+        try:
+            embed_texts(list(todo.values()), on_batch=checkpoint)
+        finally:
+            cache.flush()
+
+    arr = normalize_rows(cache.matrix(keys))
     if arr.ndim != 2:
         raise ValueError("Embedding error: vectors are not 2D.")
+    cache.compact(keep=keys)
     np.save(EMB_FILE, arr)
     json.dump(texts, open(TEXT_FILE, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
-    return arr, texts
\ No newline at end of file
+    _write_manifest(texts, data_version)
+    return arr, texts
+
+def build_ivf_index(emb: np.ndarray, nlist: Optional[int] = None) -> IVFIndex:
+    """Build the IVF index for the saved KB and store it next to kb_embeddings.npy."""
+    index = IVFIndex.build(emb, nlist=nlist or settings.IVF_NLIST or None, nprobe=settings.IVF_NPROBE)
+    index.save(IVF_FILE, fingerprint=(read_manifest() or {}).get("texts_sha256", ""))
+    return index
+
+def load_search_index(emb: np.ndarray, kind: Optional[str] = None):
+    """
+    Index used by retrieve_similar, per settings.RETRIEVAL_INDEX. Falls back
+    to exact search when the IVF index is missing or was built for other texts.
+    """
+    kind = (kind or settings.RETRIEVAL_INDEX).lower()
+    if kind == "ivf":
+        fingerprint = (read_manifest() or {}).get("texts_sha256", "")
+        index = IVFIndex.load(IVF_FILE, emb, fingerprint=fingerprint, nprobe=settings.IVF_NPROBE)
+        if index is not None:
+            return index
+        log.warning("IVF index unavailable; using exact search.")
+    elif kind != "exact":
+        log.warning("Unknown RETRIEVAL_INDEX %r; using exact search.", kind)
+    return ExactIndex(emb)
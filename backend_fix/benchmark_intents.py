@@ -0,0 +1,87 @@
+# benchmark_intents.py
+"""
+Micro-benchmark of chat intent routing:
+  legacy -> the four is_*_question checks, each lowercasing the question and scanning its keyword list
+  router -> IntentRouter.scores, one scan with the compiled trie regex
+--extra N adds N synthetic keywords per intent to show how both grow with the lists.
+
+Usage: python benchmark_intents.py [--repeat 20000] [--extra 0]
+"""
+import argparse
+import random
+import string
+import timeit
+
+from app.services.intent_router import INTENT_KEYWORDS, INTENT_PRIORITY, IntentRouter
+
+QUESTIONS = [
+    "bagaimana progress saya di kelas ini?",
+    "tolong rangkum hasil belajar saya bulan ini",
+    "skill apa yang paling berkembang dari saya?",
+    "rekomendasikan course berikutnya dong",
+    "apa itu machine learning dan bagaimana cara memulainya?",
+    "saya ingin tahu kelemahan saya dalam membuat aplikasi android dengan kotlin",
+]
+
+
+def legacy_intents(q: str, keywords=INTENT_KEYWORDS):
+    # What /chat/ask did before: one lowercase + any() scan per branch, in branch order
+    out = []
+    for intent in keywords:
+        text = (q or "").strip().lower()
+        if any(k in text for k in keywords[intent]):
+            out.append(intent)
+    return out
+
+
+def with_extra_keywords(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    extra = lambda: " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                             for _ in range(rng.randint(1, 3)))
+    return {intent: words + [extra() for _ in range(n)] for intent, words in INTENT_KEYWORDS.items()}
+
+
+def random_overlapping_case(rng: random.Random):
+    """
+    Keywords over a tiny alphabet (so prefixes, suffixes and repeats are common)
+    spread over a few intents, plus a question built from keywords and noise.
+    """
+    word = lambda: "".join(rng.choices("ab", k=rng.randint(1, 3)))
+    phrase = lambda: " ".join(word() for _ in range(rng.randint(1, 3)))
+    pool = [phrase() for _ in range(rng.randint(2, 8))]
+    pool += [p + " " + phrase() for p in rng.sample(pool, k=min(2, len(pool)))]  # keyword + longer phrase
+    keywords = {f"i{n}": rng.sample(pool, k=rng.randint(1, len(pool))) for n in range(rng.randint(1, 4))}
+    question = " ".join(rng.choice(pool + [word(), "x"]) for _ in range(rng.randint(1, 6)))
+    return keywords, question
+
+
+def check_equivalence(keywords, cases: int = 5000, seed: int = 0):
+    """Router and legacy agree on which intents match: shipped table, then random overlapping tables."""
+    router = IntentRouter(keywords, INTENT_PRIORITY)
+    for q in QUESTIONS:
+        assert set(legacy_intents(q, keywords)) == set(router.scores(q)), q
+    rng = random.Random(seed)
+    for _ in range(cases):
+        kw, q = random_overlapping_case(rng)
+        assert set(legacy_intents(q, kw)) == set(IntentRouter(kw).scores(q)), (kw, q)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--extra", type=int, default=0, help="synthetic keywords added per intent")
+    args = parser.parse_args()
+
+    keywords = with_extra_keywords(args.extra) if args.extra else INTENT_KEYWORDS
+    router = IntentRouter(keywords, INTENT_PRIORITY)
+    check_equivalence(keywords)
+
+    n_keywords = sum(len(v) for v in keywords.values())
+    print(f"{len(QUESTIONS)} questions x {args.repeat} repeats, {n_keywords} keywords")
+    for label, fn in (("legacy", lambda q: legacy_intents(q, keywords)), ("router", router.scores)):
+        seconds = timeit.timeit(lambda: [fn(q) for q in QUESTIONS], number=args.repeat)
+        print(f"{label:>7}: {seconds * 1e6 / (args.repeat * len(QUESTIONS)):.2f} us/question")
+
+
+if __name__ == "__main__":
+    main()
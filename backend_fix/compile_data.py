@@ -0,0 +1,15 @@
+# compile_data.py
+from app.utils.data_loader import compile_snapshot, SNAPSHOT_DIR
+import logging
+
+logging.basicConfig(level="INFO")
+log = logging.getLogger("compile_data")
+
+if __name__ == "__main__":
+    log.info("Compiling data/*_clean.csv into %s ...", SNAPSHOT_DIR)
+    manifest = compile_snapshot()
+    for key, table in manifest["tables"].items():
+        log.info("  %-22s %6d rows, %2d columns", key, table["rows"], len(table["columns"]))
+    for name, arr in manifest["arrays"].items():
+        log.info("  %-22s array %s %s", name, arr["dtype"], arr["shape"])
+    log.info("Done. Restart the API (or wait for the data store reload) to pick it up.")
@@ -1,16 +1,50 @@
 # generate_vectors.py
-from app.utils.vectorstore import build_or_load_vectorstore
-from app.utils.data_loader import load_all_data_texts
+import argparse
+import time
+from app.utils.vectorstore import build_or_load_vectorstore, load_vectorstore, build_ivf_index, IVF_FILE
+from app.utils.ann_index import ExactIndex, recall_at_k, sample_queries
+from app.utils.data_loader import load_all_data_texts, get_data_store
 import logging
 
 logging.basicConfig(level="INFO")
 log = logging.getLogger("generate_vectors")
 
+
+def report_recall(index, emb, k: int = 10, n_queries: int = 200):
+    """Log recall@k and per-query latency of the IVF index against exact search."""
+    queries = sample_queries(emb, n=n_queries)
+    exact = ExactIndex(emb)
+    for label, idx in (("exact", exact), ("ivf", index)):
+        started = time.perf_counter()
+        for q in queries:
+            idx.search(q, k)
+        log.info("%-5s search: %.3f ms/query", label, (time.perf_counter() - started) * 1000 / len(queries))
+    for nprobe in sorted({1, max(1, index.nprobe // 2), index.nprobe, index.nprobe * 2}):
+        index_probe = index.nprobe
+        index.nprobe = nprobe
+        log.info("recall@%d nprobe=%d/%d: %.3f", k, nprobe, index.nlist, recall_at_k(index, emb, queries, k))
+        index.nprobe = index_probe
+
+
 if __name__ == "__main__":
-    log.info("Building embeddings (this will call Gemini embed API).")
-    texts = load_all_data_texts()
-    if not texts:
-        log.error("No KB texts found in data/. Make sure CSVs exist and are not empty.")
+    parser = argparse.ArgumentParser(description="Build KB embeddings and the IVF retrieval index.")
+    parser.add_argument("--index-only", action="store_true", help="only rebuild kb_ivf.npz from the saved embeddings")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: settings.IVF_NLIST or ~sqrt(n))")
+    args = parser.parse_args()
+
+    if args.index_only:
+        saved = load_vectorstore()
+        if saved is None:
+            raise SystemExit("No saved embeddings found; run without --index-only first.")
+        emb, docs = saved
     else:
-        emb, docs = build_or_load_vectorstore(texts, force_rebuild=True)
-        log.info("Done. %d vectors generated.", len(docs))
\ No newline at end of file
+        log.info("Building embeddings (only new/changed docs call the Gemini embed API).")
+        texts = load_all_data_texts()
+        if not texts:
+            raise SystemExit("No KB texts found in data/. Make sure CSVs exist and are not empty.")
+        emb, docs = build_or_load_vectorstore(texts, force_rebuild=True, data_version=get_data_store().version)
+        log.info("Done. %d vectors generated.", len(docs))
+
+    index = build_ivf_index(emb, nlist=args.nlist)
+    log.info("IVF index saved to %s (set RETRIEVAL_INDEX=ivf to use it).", IVF_FILE)
+    report_recall(index, emb)
@@ -0,0 +1,55 @@
+# precompute_recommendations.py
+"""
+Nightly batch: top-N smart and roadmap recommendations of every student,
+written to data/recommendations.json (see app/services/recommendation_store.py).
+The API serves from it while StudentProgress, Courses and SkillKeywords are
+unchanged; requests with an interests override are always computed on the fly.
+
+Usage: python precompute_recommendations.py [--top-n 20]
+"""
+import argparse
+import logging
+import time
+
+from app.services.recommendation_store import (
+    RECORD_KEYS,
+    new_artifact,
+    save_recommendations,
+    user_groups,
+)
+from app.services.roadmap_service import precompute_roadmap_recommendations
+from app.services.smart_recommender import CourseKeywordMatrix, precompute_smart_recommendations
+from app.utils.data_loader import get_data_store
+
+logging.basicConfig(level="INFO")
+log = logging.getLogger("precompute_recommendations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-n", type=int, default=20, help="recommendations kept per user (max top_n served)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = get_data_store()
+    if store.get("student_progress").empty or store.get("courses").empty:
+        raise SystemExit("StudentProgress or Courses CSV missing; nothing to precompute.")
+
+    groups, by_email, by_name = user_groups(store)
+    log.info("%d users (%d emails, %d names) in %d distinct progress groups.",
+             len(set(by_email) | set(by_name)), len(by_email), len(by_name), len(groups))
+
+    smart, smart_default, keywords = precompute_smart_recommendations(store, groups, args.top_n)
+    roadmap, roadmap_default = precompute_roadmap_recommendations(store, groups, args.top_n)
+
+    courses = store.derived("course_keyword_matrix", CourseKeywordMatrix.from_store).courses
+    records = courses[list(RECORD_KEYS)].to_dict(orient="records")
+    artifact = new_artifact(args.top_n, [[r[k] for k in RECORD_KEYS] for r in records], keywords)
+    artifact.update(
+        groups=[{"smart": s, "roadmap": r} for s, r in zip(smart, roadmap)],
+        by_email=by_email,
+        by_name=by_name,
+        default={"smart": smart_default, "roadmap": roadmap_default},
+    )
+    path = save_recommendations(artifact)
+    log.info("Saved %s in %.2fs.", path, time.perf_counter() - started)
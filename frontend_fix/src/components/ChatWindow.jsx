@@ -1,7 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import ChatBubble from './ChatBubble';
 import RecommendationModal from './RecommendationModal';
-import { getBotResponse, getSmartRecommendation, getSkillAnalysis } from '../services/api';
+import { getBotResponse, streamBotResponse, getSmartRecommendation, getSkillAnalysis } from '../services/api';
 
 function ChatWindow({ onClose, currentUserEmail, initialMessage, onInitialMessageSent }) {
   // Helper function to extract number from text (e.g., "berikan 6 rekomendasi" -> 6)
@@ -121,10 +121,25 @@ function ChatWindow({ onClose, currentUserEmail, initialMessage, onInitialMessag
         }
       } else {
         // For all other questions (including follow-up about recommendations),
-        // let the chatbot handle it with full context
-        const botText = await getBotResponse(textToSend, currentUserEmail);
-        const botMessage = { text: botText, isBot: true };
-        setMessages(prev => [...prev, botMessage]);
+        // let the chatbot handle it with full context. The answer is streamed
+        // into the last bot message; fall back to /chat/ask if streaming fails.
+        let started = false;
+        const showPartial = (text) => {
+          setIsTyping(false);
+          setMessages(prev => started
+            ? [...prev.slice(0, -1), { text, isBot: true }]
+            : [...prev, { text, isBot: true }]);
+          started = true;
+        };
+        try {
+          const answer = await streamBotResponse(textToSend, currentUserEmail, {
+            onToken: (_chunk, partial) => showPartial(partial),
+          });
+          if (!started) showPartial(answer);
+        } catch (streamError) {
+          console.error("Streaming failed, falling back:", streamError);
+          showPartial(await getBotResponse(textToSend, currentUserEmail));
+        }
       }
     } catch (error) {
       console.error("Error getting bot response:", error);
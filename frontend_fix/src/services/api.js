@@ -22,6 +22,47 @@ export const getBotResponse = async (message, userEmail) => {
   }
 };
 
+// Streams /chat/ask/stream (server-sent events). onMeta receives the branch
+// metadata once, onToken every chunk of answer text. Resolves to the full answer.
+export const streamBotResponse = async (message, userEmail, { onMeta, onToken } = {}) => {
+  const response = await fetch(`${API_BASE}/chat/ask/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      question: message,
+      user_email: userEmail
+    }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Failed to stream answer: ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let answer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = (raw.match(/^event: (.*)$/m) || [])[1];
+      const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+      if (event === 'meta' && onMeta) onMeta(data);
+      if (event === 'token') {
+        answer += data.text;
+        if (onToken) onToken(data.text, answer);
+      }
+      if (event === 'error') throw new Error(data.detail || 'Stream error');
+    }
+  }
+  return answer || "Maaf, terjadi kesalahan di server.";
+};
+
 export const getSmartRecommendation = async (userIdentifier, topN = 5) => {
   try {
     const id = encodeURIComponent(userIdentifier || '');